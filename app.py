@@ -3,6 +3,8 @@ import pandas as pd
 from streamlit_carousel import carousel
 from social_utils import display_social_media_links
 from auth import get_db_connection
+from data_utils import carregar_tabela
+from file_utils import media_url, public_url
 
 display_social_media_links()
 
@@ -19,7 +21,7 @@ with st.sidebar:
 def carregar_dados_db(table_name):
     conn = get_db_connection()
     try:
-        df = pd.read_sql_query(f"SELECT * FROM {table_name}", conn)
+        df = carregar_tabela(conn, table_name)
         df.columns = [x.lower() for x in df.columns]
         return df
     except Exception as e:
@@ -43,14 +45,29 @@ def carregar_dados_institucionais():
         if conn:
             conn.close()
 
+@st.cache_data
+def carregar_noticia_destaque():
+    conn = get_db_connection()
+    try:
+        query = 'SELECT "ID", "TITULO", "IMAGEM_URL", "DATA", "RESUMO" FROM noticias WHERE "DESTAQUE" = 1 ORDER BY "DATA" DESC LIMIT 1'
+        df = pd.read_sql_query(query, conn)
+        df.columns = [x.lower() for x in df.columns]
+        return df.iloc[0] if not df.empty else None
+    except Exception as e:
+        st.error(f"Erro ao carregar notícia em destaque: {e}")
+        return None
+    finally:
+        if conn:
+            conn.close()
+
 df_convenios = carregar_dados_db('convenios')
-df_noticias = carregar_dados_db('noticias')
+noticia_destaque = carregar_noticia_destaque()
 institucional = carregar_dados_institucionais()
 
 if institucional is not None:
     col_titulo, col_login = st.columns([3, 1])
     with col_titulo:
-        st.image(institucional['logo_url'], width=200)
+        st.image(media_url(institucional['logo_url']), width=200)
     with col_login:
         st.page_link("pages/8_Área_do_Membro.py", label="Login do Associado", icon="👤")
     
@@ -76,7 +93,7 @@ if institucional is not None:
         st.header("Nossos Convênios em Destaque")
         convenios_destaque = df_convenios[df_convenios['destaque'] == 1]
         carousel_items = [
-            dict(img=row.imagem_url, title=row.nome_convenio, text=row.nome_convenio)
+            dict(img=public_url(row.imagem_url), title=row.nome_convenio, text=row.nome_convenio)
             for row in convenios_destaque.itertuples()
         ]
         if carousel_items:
@@ -106,12 +123,14 @@ if institucional is not None:
 
         with col2:
             st.header("Últimas Notícias")
-            noticia_destaque = df_noticias[df_noticias['destaque'] == 1].sort_values(by="data", ascending=False).iloc[0]
-
-            st.subheader(noticia_destaque['titulo'])
-            if pd.notna(noticia_destaque['imagem_url']):
-                st.image(noticia_destaque['imagem_url'])
-            st.markdown(noticia_destaque['conteudo'], unsafe_allow_html=True)
+            if noticia_destaque is not None:
+                st.subheader(noticia_destaque['titulo'])
+                if pd.notna(noticia_destaque['imagem_url']):
+                    st.image(media_url(noticia_destaque['imagem_url']))
+                if pd.notna(noticia_destaque['resumo']):
+                    st.write(noticia_destaque['resumo'])
+            else:
+                st.info("Nenhuma notícia em destaque no momento.")
             st.page_link("pages/3_Notícias.py", label="Ver todas as notícias", icon="📰")
 else:
     st.error("Não foi possível carregar as informações do site.")
\ No newline at end of file
@@ -0,0 +1,33 @@
+import argparse
+import sqlalchemy
+from db_utils import get_postgres_engine
+from classificados_utils import DIAS_EXPIRACAO_ANUNCIO
+from retencao import POLITICAS, arquivar, limite_politica
+
+def main():
+    """Arquiva os anúncios vencidos para manter pequena a tabela consultada pela página.
+
+    É a política "classificados" de retencao.py isolada, para quem agenda só este job.
+    """
+    parser = argparse.ArgumentParser(description="Move os classificados vencidos para classificados_arquivo.")
+    parser.add_argument("--dias", type=int, default=DIAS_EXPIRACAO_ANUNCIO,
+                        help="Idade, em dias, a partir da qual um anúncio ativo é considerado vencido.")
+    parser.add_argument("--lote", type=int, default=1000, help="Anúncios movidos por transação.")
+    args = parser.parse_args()
+
+    engine = get_postgres_engine()
+    if engine is None:
+        print("Não foi possível conectar à base de dados. Verifique o seu ficheiro secrets.toml.")
+        return
+
+    limite = limite_politica(args.dias)
+    with engine.connect() as conn:
+        arquivados = arquivar(conn, "classificados", POLITICAS["classificados"]["condicao"], limite, lote=args.lote)
+        with conn.begin():
+            if arquivados:
+                conn.execute(sqlalchemy.text("ANALYZE classificados"))
+            restantes = conn.execute(sqlalchemy.text('SELECT count(*) FROM classificados')).scalar()
+    print(f"{arquivados} anúncio(s) criado(s) antes de {limite[:10]} arquivado(s). {restantes} continuam em classificados.")
+
+if __name__ == "__main__":
+    main()
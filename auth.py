@@ -1,4 +1,5 @@
 import bcrypt
+import contextlib
 import sqlalchemy
 import streamlit as st
 
@@ -46,26 +47,40 @@ def get_user_by_id(user_id: int):
     finally:
         if conn: conn.close()
 
-def insert_record(table_name, record_dict):
-    """Insere um novo registro em uma tabela."""
-    conn = get_db_connection()
+def _transacao(conn, own_conn):
+    """Transação do próprio helper; com a conexão do chamador, usa a transação corrente dele."""
+    return conn.begin() if own_conn else contextlib.nullcontext()
+
+def insert_record(table_name, record_dict, returning=None, conn=None):
+    """Insere um novo registro em uma tabela.
+
+    Com 'returning' (ex.: '"ID"'), retorna o valor dessa coluna no registro inserido em vez de True.
+    Com 'conn', roda na transação corrente dessa conexão e deixa os erros subirem para o chamador,
+    que decide entre commit e rollback (ex.: notícia e tags gravadas juntas).
+    """
+    own_conn = conn is None
+    conn = conn or get_db_connection()
     if conn is None: return False
     try:
         columns = ', '.join(record_dict.keys())
         sanitized_keys = [key.strip('"') for key in record_dict.keys()]
         placeholders = ', '.join([f":{key}" for key in sanitized_keys])
-        query = sqlalchemy.text(f"INSERT INTO {table_name} ({columns}) VALUES ({placeholders})")
+        returning_clause = f" RETURNING {returning}" if returning else ""
+        query = sqlalchemy.text(f"INSERT INTO {table_name} ({columns}) VALUES ({placeholders}){returning_clause}")
         
         sanitized_dict = {key.strip('"'): value for key, value in record_dict.items()}
         
-        with conn.begin():
-            conn.execute(query, sanitized_dict)
+        with _transacao(conn, own_conn):
+            result = conn.execute(query, sanitized_dict)
+            if returning:
+                return result.scalar()
         return True
     except Exception as e:
+        if not own_conn: raise
         print(f"Erro ao inserir registro: {e}")
         return False
     finally:
-        if conn: conn.close()
+        if own_conn and conn: conn.close()
 
 def get_max_id(table_name, id_column):
     """Pega o ID máximo de uma tabela."""
@@ -81,9 +96,10 @@ def get_max_id(table_name, id_column):
     finally:
         if conn: conn.close()
 
-def update_record(table_name, record_dict, where_clause):
-    """Atualiza um registro em uma tabela."""
-    conn = get_db_connection()
+def update_record(table_name, record_dict, where_clause, conn=None):
+    """Atualiza um registro em uma tabela. Com 'conn', roda na transação corrente dessa conexão."""
+    own_conn = conn is None
+    conn = conn or get_db_connection()
     if conn is None: return False
     try:
         set_clause_list = []
@@ -105,18 +121,20 @@ def update_record(table_name, record_dict, where_clause):
         
         query = sqlalchemy.text(f"UPDATE {table_name} SET {set_clause} WHERE {where_keys}")
         
-        with conn.begin():
+        with _transacao(conn, own_conn):
             conn.execute(query, params)
         return True
     except Exception as e:
+        if not own_conn: raise
         print(f"Erro ao atualizar registro: {e}")
         return False
     finally:
-        if conn: conn.close()
+        if own_conn and conn: conn.close()
 
-def delete_record(table_name, where_clause):
-    """Deleta um registro de uma tabela."""
-    conn = get_db_connection()
+def delete_record(table_name, where_clause, conn=None):
+    """Deleta um registro de uma tabela. Com 'conn', roda na transação corrente dessa conexão."""
+    own_conn = conn is None
+    conn = conn or get_db_connection()
     if conn is None: return False
     try:
         where_clause_list = []
@@ -130,11 +148,12 @@ def delete_record(table_name, where_clause):
         where_keys = " AND ".join(where_clause_list)
         query = sqlalchemy.text(f"DELETE FROM {table_name} WHERE {where_keys}")
         
-        with conn.begin():
+        with _transacao(conn, own_conn):
             conn.execute(query, params)
         return True
     except Exception as e:
+        if not own_conn: raise
         print(f"Erro ao deletar registro: {e}")
         return False
     finally:
-        if conn: conn.close()
\ No newline at end of file
+        if own_conn and conn: conn.close()
\ No newline at end of file
@@ -0,0 +1,205 @@
+import re
+import time
+import random
+import threading
+import unicodedata
+import streamlit as st
+import sqlalchemy
+
+# Índice de autocompletar em memória: uma trie sobre os nomes normalizados (sem acento, minúsculos),
+# consultada por prefixo exato e, se faltar resultado, por prefixo com distância de edição limitada.
+# Cada processo do Streamlit mantém o seu (st.cache_resource); o Admin atualiza as entradas ao salvar.
+LIMITE_SUGESTOES = 8
+
+def normalizar(texto):
+    """Remove acentos, passa para minúsculas e troca pontuação por espaço."""
+    texto = unicodedata.normalize("NFKD", str(texto or ""))
+    texto = "".join(c for c in texto if not unicodedata.combining(c)).casefold()
+    return " ".join(re.sub(r"[^\w]+", " ", texto).split())
+
+def max_erros(consulta):
+    """Erros de digitação tolerados conforme o tamanho do que já foi digitado."""
+    if len(consulta) < 3:
+        return 0
+    return 1 if len(consulta) <= 5 else 2
+
+class _No:
+    __slots__ = ("filhos", "chaves")
+
+    def __init__(self):
+        self.filhos = {}
+        self.chaves = set()
+
+class IndiceAutocomplete:
+    """Trie de prefixos com busca aproximada (Levenshtein limitado), atualizável entrada a entrada."""
+
+    def __init__(self):
+        self.raiz = _No()
+        self.entradas = {}
+        self._lock = threading.RLock()
+
+    def _termos(self, rotulo):
+        """Indexa o nome completo e cada palavra, para que 'fit' encontre 'Academia Fit'."""
+        nome = normalizar(rotulo)
+        return {nome, *(palavra for palavra in nome.split() if len(palavra) >= 2)} - {""}
+
+    def adicionar(self, chave, rotulo, **dados):
+        """Insere ou substitui uma entrada."""
+        with self._lock:
+            self.remover(chave)
+            termos = self._termos(rotulo)
+            self.entradas[chave] = {"rotulo": rotulo, "termos": termos, **dados}
+            for termo in termos:
+                no = self.raiz
+                for c in termo:
+                    no = no.filhos.setdefault(c, _No())
+                no.chaves.add(chave)
+
+    def remover(self, chave):
+        """Remove uma entrada e poda os nós que ficarem vazios."""
+        with self._lock:
+            entrada = self.entradas.pop(chave, None)
+            if entrada is None:
+                return
+            for termo in entrada["termos"]:
+                caminho = [self.raiz]
+                for c in termo:
+                    caminho.append(caminho[-1].filhos[c])
+                caminho[-1].chaves.discard(chave)
+                for i in range(len(termo) - 1, -1, -1):
+                    no = caminho[i + 1]
+                    if no.chaves or no.filhos:
+                        break
+                    del caminho[i].filhos[termo[i]]
+
+    def _coletar(self, no, distancia, melhores, limite):
+        """Junta as entradas abaixo do nó, das palavras mais curtas às mais longas, até completar o limite."""
+        nivel = [no]
+        while nivel and len(melhores) < limite:
+            proximo = []
+            for atual in nivel:
+                for chave in atual.chaves:
+                    if distancia < melhores.get(chave, distancia + 1):
+                        melhores[chave] = distancia
+                        if len(melhores) >= limite:
+                            return
+                proximo.extend(atual.filhos.values())
+            nivel = proximo
+
+    def _busca_aproximada(self, consulta, limite_erros, melhores, limite):
+        """Percorre a trie calculando a linha da matriz de Levenshtein de cada nó e poda quando o mínimo passa do limite.
+
+        A primeira letra precisa estar certa: erros nela são raros e a restrição reduz a busca a um só ramo da raiz.
+        """
+        tamanho = len(consulta)
+        encontrados = []
+        primeiro = self.raiz.filhos.get(consulta[0])
+        pilha = [(primeiro, consulta[0], list(range(tamanho + 1)), 1)] if primeiro else []
+        while pilha:
+            no, c, anterior, profundidade = pilha.pop()
+            linha = [anterior[0] + 1]
+            for j in range(1, tamanho + 1):
+                linha.append(min(linha[j - 1] + 1, anterior[j] + 1, anterior[j - 1] + (consulta[j - 1] != c)))
+            if linha[-1] <= limite_erros:
+                # A consulta inteira casa com este prefixo: as entradas abaixo dele são candidatas.
+                encontrados.append((linha[-1], profundidade, id(no), no))
+            if min(linha) <= limite_erros:
+                pilha.extend((filho, c2, linha, profundidade + 1) for c2, filho in no.filhos.items())
+        for distancia, _, _, no in sorted(encontrados):
+            if len(melhores) >= limite:
+                break
+            self._coletar(no, distancia, melhores, limite)
+
+    def sugerir(self, consulta, limite=LIMITE_SUGESTOES):
+        """Retorna até 'limite' entradas, das mais próximas (prefixo exato) às com erros de digitação."""
+        consulta = normalizar(consulta)
+        if not consulta:
+            return []
+        with self._lock:
+            melhores = {}
+            no = self.raiz
+            for c in consulta:
+                no = no.filhos.get(c)
+                if no is None:
+                    break
+            else:
+                self._coletar(no, 0, melhores, limite)
+            limite_erros = max_erros(consulta)
+            if len(melhores) < limite and limite_erros:
+                self._busca_aproximada(consulta, limite_erros, melhores, limite)
+
+            def ordem(chave):
+                entrada = self.entradas[chave]
+                exato = consulta in entrada["termos"]
+                return (melhores[chave], not exato, len(entrada["rotulo"]), entrada["rotulo"])
+
+            return [{"chave": chave, "distancia": melhores[chave], **self.entradas[chave]}
+                    for chave in sorted(melhores, key=ordem)[:limite]]
+
+# --- ÍNDICE DE CONVÊNIOS E PARCEIROS ---
+def _entradas_convenio(convenio_id, nome, tipo_servico):
+    yield ("convenio", str(convenio_id)), nome, {"tipo": "convenio", "convenio_id": str(convenio_id)}
+    if tipo_servico:
+        yield ("tipo", str(convenio_id)), tipo_servico, {"tipo": "tipo_servico", "convenio_id": str(convenio_id)}
+
+@st.cache_resource
+def indice_convenios():
+    """Monta, uma vez por processo, o índice com nomes de convênios, tipos de serviço e parceiros ativos."""
+    from auth import get_db_connection
+    indice = IndiceAutocomplete()
+    conn = get_db_connection()
+    if conn is None: return indice
+    try:
+        convenios = conn.execute(sqlalchemy.text(
+            'SELECT "CONVENIO_ID", "NOME_CONVENIO", "TIPO_SERVICO" FROM convenios WHERE "STATUS" = \'ATIVO\''
+        )).fetchall()
+        parceiros = conn.execute(sqlalchemy.text(
+            'SELECT * FROM parceiros WHERE "STATUS" = \'ATIVO\''
+        )).mappings().all()
+    except Exception as e:
+        print(f"Erro ao montar o índice de autocompletar: {e}")
+        return indice
+    finally:
+        conn.close()
+    for convenio_id, nome, tipo_servico in convenios:
+        for chave, rotulo, dados in _entradas_convenio(convenio_id, nome, tipo_servico):
+            indice.adicionar(chave, rotulo, **dados)
+    for parceiro in parceiros:
+        atualizar_parceiro_no_indice(parceiro["PARCEIRO_ID"], parceiro["NOME_PARCEIRO"],
+                                     parceiro.get("CONVENIO_ID"), "ATIVO", indice)
+    return indice
+
+def atualizar_convenio_no_indice(convenio_id, nome, tipo_servico, status, indice=None):
+    """Reflete no índice um convênio salvo pelo Admin (convênios inativos saem das sugestões)."""
+    indice = indice or indice_convenios()
+    indice.remover(("convenio", str(convenio_id)))
+    indice.remover(("tipo", str(convenio_id)))
+    if status == "ATIVO" and nome:
+        for chave, rotulo, dados in _entradas_convenio(convenio_id, nome, tipo_servico):
+            indice.adicionar(chave, rotulo, **dados)
+
+def atualizar_parceiro_no_indice(parceiro_id, nome, convenio_id, status, indice=None):
+    """Reflete no índice um parceiro salvo pelo Admin."""
+    indice = indice or indice_convenios()
+    indice.remover(("parceiro", str(parceiro_id)))
+    if status == "ATIVO" and nome:
+        indice.adicionar(("parceiro", str(parceiro_id)), nome, tipo="parceiro",
+                         convenio_id=str(convenio_id) if convenio_id is not None else None)
+
+def _medir(total=5000, consultas=2000):
+    """Mede o tempo médio por consulta em um índice sintético."""
+    palavras = ["academia", "saúde", "odontologia", "farmácia", "ótica", "escola", "idiomas", "clínica",
+                "veterinária", "auto", "escola", "pet", "fisioterapia", "laboratório", "hotel", "seguro"]
+    indice = IndiceAutocomplete()
+    for i in range(total):
+        indice.adicionar(("convenio", str(i)), f"{random.choice(palavras).title()} {random.choice(palavras)} {i}")
+    amostras = [random.choice(palavras)[:random.randint(2, 8)] for _ in range(consultas)]
+    amostras = [a[:1] + a[2:] if len(a) > 4 and random.random() < 0.5 else a for a in amostras]
+    inicio = time.perf_counter()
+    for consulta in amostras:
+        indice.sugerir(consulta)
+    media = (time.perf_counter() - inicio) / consultas * 1000
+    print(f"{total} entradas, {consultas} consultas: {media:.3f} ms por consulta.")
+
+if __name__ == "__main__":
+    _medir()
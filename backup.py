@@ -0,0 +1,402 @@
+import argparse
+import gzip
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+import sqlalchemy
+from db_utils import get_postgres_engine
+
+# Backup e restauração por COPY. Cada tabela vira um arquivo "<tabela>.copy.gz" (formato texto do
+# COPY, uma linha por registro) gravado em streaming: o Postgres entrega blocos, eles passam pelo
+# gzip e pelo sha256 e vão para o disco, sem a tabela inteira em memória. Todas as tabelas são lidas
+# do mesmo snapshot (pg_export_snapshot), então o backup é consistente mesmo com o site no ar.
+# O manifesto.json guarda, por tabela, linhas, sha256 dos dados descomprimidos, os índices e o DDL
+# (colunas, restrições e partições), para que a restauração funcione também numa base vazia.
+MANIFESTO = "manifesto.json"
+DESTINO_PADRAO = "backups"
+BLOCO = 1024 * 1024
+
+TABELAS_QUERY = """
+    SELECT c.relname, c.relkind
+    FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE n.nspname = current_schema() AND c.relkind IN ('r', 'p') AND NOT c.relispartition
+    ORDER BY c.relname
+"""
+
+# Índices que não sustentam restrições (esses somem com a restrição e a acompanham na tabela).
+INDICES_QUERY = """
+    SELECT c.relname, pg_get_indexdef(i.indexrelid)
+    FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+    WHERE i.indrelid = to_regclass(:tabela)
+      AND NOT EXISTS (SELECT 1 FROM pg_constraint k WHERE k.conindid = i.indexrelid)
+    ORDER BY c.relname
+"""
+
+SEQUENCIAS_QUERY = """
+    SELECT a.attname, pg_get_serial_sequence(:tabela, a.attname)
+    FROM pg_attribute a
+    WHERE a.attrelid = to_regclass(:tabela) AND a.attnum > 0 AND NOT a.attisdropped
+      AND pg_get_serial_sequence(:tabela, a.attname) IS NOT NULL
+"""
+
+# Colunas geradas (ex.: BUSCA_TSV da busca textual) ficam de fora: dependem da configuração de texto
+# e são recriadas pelo configurar_busca.py; o COPY também não as inclui.
+COLUNAS_DDL_QUERY = """
+    SELECT a.attname, format_type(a.atttypid, a.atttypmod), a.attnotnull, a.attidentity,
+           pg_get_expr(d.adbin, d.adrelid), pg_get_serial_sequence(:tabela, a.attname)
+    FROM pg_attribute a
+    LEFT JOIN pg_attrdef d ON d.adrelid = a.attrelid AND d.adnum = a.attnum
+    WHERE a.attrelid = to_regclass(:tabela) AND a.attnum > 0 AND NOT a.attisdropped AND a.attgenerated = ''
+    ORDER BY a.attnum
+"""
+
+RESTRICOES_QUERY = """
+    SELECT conname, contype, pg_get_constraintdef(oid)
+    FROM pg_constraint
+    WHERE conrelid = to_regclass(:tabela) AND contype IN ('p', 'u', 'c', 'x', 'f') AND conparentid = 0
+    ORDER BY conname
+"""
+
+PARTICOES_QUERY = """
+    SELECT c.relname, p.relname, pg_get_expr(c.relpartbound, c.oid),
+           CASE WHEN c.relkind = 'p' THEN pg_get_partkeydef(c.oid) END
+    FROM pg_partition_tree(to_regclass(:tabela)) t
+    JOIN pg_class c ON c.oid = t.relid
+    JOIN pg_class p ON p.oid = t.parentrelid
+    ORDER BY t.level, c.relname
+"""
+
+# Chaves estrangeiras que apontam para as tabelas restauradas: o TRUNCATE de cada worker falharia
+# com elas (e o COPY em paralelo poderia carregar a tabela filha antes da mãe).
+REFERENCIAS_QUERY = """
+    SELECT c.conrelid::regclass::text, c.conname, pg_get_constraintdef(c.oid)
+    FROM pg_constraint c
+    WHERE c.contype = 'f' AND c.conparentid = 0
+      AND c.confrelid IN (SELECT to_regclass(t) FROM unnest(CAST(:tabelas AS TEXT[])) t)
+    ORDER BY 1, 2
+"""
+CHAVES_PENDENTES = "chaves_estrangeiras_pendentes.sql"
+
+class _Contador:
+    """Arquivo intermediário que conta linhas e calcula o sha256 do que passa por ele."""
+
+    def __init__(self, arquivo):
+        self.arquivo = arquivo
+        self.hash = hashlib.sha256()
+        self.linhas = 0
+
+    def write(self, dados):
+        if isinstance(dados, str):
+            dados = dados.encode("utf-8")
+        self.hash.update(dados)
+        self.linhas += dados.count(b"\n")
+        return self.arquivo.write(dados)
+
+    def read(self, tamanho=BLOCO):
+        dados = self.arquivo.read(tamanho)
+        self.hash.update(dados)
+        self.linhas += dados.count(b"\n")
+        return dados
+
+def listar_tabelas(conn):
+    return conn.execute(sqlalchemy.text(TABELAS_QUERY)).fetchall()
+
+def ddl_tabela(conn, tabela, particionada):
+    """Comandos que recriam a tabela vazia: {"criar": [...], "chaves_estrangeiras": [...]}.
+
+    As chaves estrangeiras ficam à parte porque só podem ser criadas depois que as tabelas
+    referenciadas existirem e estiverem carregadas.
+    """
+    colunas, sequencias = [], []
+    for nome, tipo, not_null, identidade, padrao, sequencia in conn.execute(
+            sqlalchemy.text(COLUNAS_DDL_QUERY), {"tabela": tabela}):
+        definicao = f'"{nome}" {tipo}'
+        if identidade:
+            definicao += f" GENERATED {'ALWAYS' if identidade == 'a' else 'BY DEFAULT'} AS IDENTITY"
+        elif padrao is not None:
+            if sequencia:
+                sequencias.append((sequencia, nome))
+            definicao += f" DEFAULT {padrao}"
+        if not_null:
+            definicao += " NOT NULL"
+        colunas.append(definicao)
+    estrangeiras = []
+    for nome, tipo, definicao in conn.execute(sqlalchemy.text(RESTRICOES_QUERY), {"tabela": tabela}):
+        if tipo == "f":
+            estrangeiras.append(f'ALTER TABLE {tabela} ADD CONSTRAINT "{nome}" {definicao}')
+        else:
+            colunas.append(f'CONSTRAINT "{nome}" {definicao}')
+
+    criar = [f"CREATE SEQUENCE IF NOT EXISTS {sequencia}" for sequencia, _ in sequencias]
+    chave = ""
+    if particionada:
+        chave = " PARTITION BY " + conn.execute(sqlalchemy.text("SELECT pg_get_partkeydef(to_regclass(:tabela))"),
+                                                {"tabela": tabela}).scalar()
+    corpo = ",\n    ".join(colunas)
+    criar.append(f"CREATE TABLE {tabela} (\n    {corpo}\n){chave}")
+    criar += [f'ALTER SEQUENCE {sequencia} OWNED BY {tabela}."{coluna}"' for sequencia, coluna in sequencias]
+    if particionada:
+        for nome, pai, limite, subchave in conn.execute(sqlalchemy.text(PARTICOES_QUERY), {"tabela": tabela}):
+            criar.append(f"CREATE TABLE {nome} PARTITION OF {pai} {limite}" + (f" PARTITION BY {subchave}" if subchave else ""))
+    return {"criar": criar, "chaves_estrangeiras": estrangeiras}
+
+def colunas_copy(conn, tabela):
+    """Colunas que o COPY grava e lê, na ordem da tabela: todas menos as geradas."""
+    return [linha[0] for linha in conn.execute(sqlalchemy.text(COLUNAS_DDL_QUERY), {"tabela": tabela})]
+
+def _lista_colunas(colunas):
+    return ", ".join(f'"{coluna}"' for coluna in colunas)
+
+def _caminho(pasta, tabela):
+    return os.path.join(pasta, f"{tabela}.copy.gz")
+
+def exportar_tabela(engine, snapshot, pasta, tabela, colunas):
+    """Grava uma tabela no snapshot informado. Roda numa conexão própria (uma por worker)."""
+    conn = engine.raw_connection()
+    try:
+        # Transação aberta à mão: SET TRANSACTION SNAPSHOT precisa ser o primeiro comando dela.
+        conn.autocommit = True
+        cur = conn.cursor()
+        cur.execute("BEGIN ISOLATION LEVEL REPEATABLE READ READ ONLY")
+        cur.execute("SET TRANSACTION SNAPSHOT %s", (snapshot,))
+        # COPY direto de tabela particionada não é permitido; a consulta lê todas as partições. A lista
+        # explícita deixa de fora as colunas geradas, como o COPY ... FROM STDIN da restauração.
+        origem = f"(SELECT {_lista_colunas(colunas)} FROM {tabela})"
+        with gzip.open(_caminho(pasta, tabela), "wb", compresslevel=6) as arquivo:
+            contador = _Contador(arquivo)
+            cur.copy_expert(f"COPY {origem} TO STDOUT", contador, size=BLOCO)
+        cur.execute("ROLLBACK")
+    finally:
+        conn.autocommit = False
+        conn.close()
+    return {"arquivo": os.path.basename(_caminho(pasta, tabela)), "linhas": contador.linhas,
+            "sha256": contador.hash.hexdigest(), "bytes": os.path.getsize(_caminho(pasta, tabela))}
+
+def exportar(engine, pasta, tabelas=None, workers=4):
+    """Exporta as tabelas em paralelo, todas do mesmo snapshot. Retorna o manifesto gravado."""
+    os.makedirs(pasta, exist_ok=True)
+    with engine.connect().execution_options(isolation_level="REPEATABLE READ") as coordenador:
+        with coordenador.begin():
+            # O snapshot só vale enquanto esta transação estiver aberta.
+            snapshot = coordenador.execute(sqlalchemy.text("SELECT pg_export_snapshot()")).scalar()
+            todas = listar_tabelas(coordenador)
+            escolhidas = [(nome, tipo) for nome, tipo in todas if not tabelas or nome in tabelas]
+            manifesto = {"data": datetime.now().isoformat(timespec="seconds"), "tabelas": {}}
+            for nome, tipo in escolhidas:
+                manifesto["tabelas"][nome] = {
+                    "particionada": tipo == "p",
+                    "indices": dict(coordenador.execute(sqlalchemy.text(INDICES_QUERY), {"tabela": nome}).fetchall()),
+                    "ddl": ddl_tabela(coordenador, nome, tipo == "p"),
+                    "colunas": colunas_copy(coordenador, nome),
+                }
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futuros = {executor.submit(exportar_tabela, engine, snapshot, pasta, nome, manifesto["tabelas"][nome]["colunas"]): nome
+                           for nome, tipo in escolhidas}
+                for futuro in as_completed(futuros):
+                    nome = futuros[futuro]
+                    manifesto["tabelas"][nome].update(futuro.result())
+                    info = manifesto["tabelas"][nome]
+                    print(f"  {nome}: {info['linhas']} linha(s), {info['bytes'] / 1024 / 1024:.1f} MB")
+    with open(os.path.join(pasta, MANIFESTO), "w", encoding="utf-8") as f:
+        json.dump(manifesto, f, ensure_ascii=False, indent=2)
+    return manifesto
+
+def ler_manifesto(pasta):
+    with open(os.path.join(pasta, MANIFESTO), encoding="utf-8") as f:
+        return json.load(f)
+
+def verificar_arquivo(pasta, tabela, info):
+    """Relê o arquivo em streaming e confere linhas e sha256 com o manifesto."""
+    with gzip.open(_caminho(pasta, tabela), "rb") as arquivo:
+        contador = _Contador(arquivo)
+        while contador.read(BLOCO):
+            pass
+    return contador.linhas == info["linhas"] and contador.hash.hexdigest() == info["sha256"]
+
+def restaurar_tabela(engine, pasta, tabela, info):
+    """Substitui o conteúdo da tabela pelo do backup, numa única transação.
+
+    Os índices comuns são removidos antes do COPY e recriados no fim (mais rápido do que mantê-los
+    linha a linha); em tabela particionada eles ficam, pois pertencem a cada partição.
+    Retorna (linhas na tabela, arquivo íntegro).
+    """
+    conn = engine.raw_connection()
+    try:
+        cur = conn.cursor()
+        if not info["particionada"]:
+            cur.execute(INDICES_QUERY.replace(":tabela", "%(tabela)s"), {"tabela": tabela})
+            for nome, _ in cur.fetchall():
+                cur.execute(f"DROP INDEX IF EXISTS {nome}")
+        cur.execute(f"TRUNCATE {tabela}")
+        with gzip.open(_caminho(pasta, tabela), "rb") as arquivo:
+            contador = _Contador(arquivo)
+            # Manifestos antigos não têm a lista; o COPY usa então as colunas não geradas da tabela.
+            destino = f"{tabela} ({_lista_colunas(info['colunas'])})" if info.get("colunas") else tabela
+            cur.copy_expert(f"COPY {destino} FROM STDIN", contador, size=BLOCO)
+        integro = contador.linhas == info["linhas"] and contador.hash.hexdigest() == info["sha256"]
+        if not integro:
+            conn.rollback()
+            return None, False
+        if not info["particionada"]:
+            for definicao in info["indices"].values():
+                cur.execute(definicao.replace(" INDEX ", " INDEX IF NOT EXISTS ", 1))
+        cur.execute(SEQUENCIAS_QUERY.replace(":tabela", "%(tabela)s"), {"tabela": tabela})
+        for coluna, sequencia in cur.fetchall():
+            cur.execute(f'SELECT setval(%s, coalesce(max("{coluna}"), 0) + 1, false) FROM {tabela}', (sequencia,))
+        cur.execute(f"ANALYZE {tabela}")
+        cur.execute(f"SELECT count(*) FROM {tabela}")
+        linhas = cur.fetchone()[0]
+        if linhas != info["linhas"]:
+            conn.rollback()
+            return linhas, True
+        conn.commit()
+        return linhas, True
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+def criar_tabelas(engine, escolhidas):
+    """Cria, numa transação, as tabelas do backup que não existem na base (com partições). Retorna os nomes criados.
+
+    Manifestos antigos não têm o DDL; nesse caso a tabela precisa existir antes da restauração.
+    """
+    criadas = []
+    with engine.connect() as conn:
+        with conn.begin():
+            for nome, info in sorted(escolhidas.items()):
+                if "ddl" not in info or conn.execute(sqlalchemy.text("SELECT to_regclass(:tabela) IS NOT NULL"),
+                                                     {"tabela": nome}).scalar():
+                    continue
+                # exec_driver_sql: o DDL pode ter ':' em literais, que o text() tomaria por parâmetros.
+                for comando in info["ddl"]["criar"]:
+                    conn.exec_driver_sql(comando)
+                # Em tabela particionada os índices não são recriados por restaurar_tabela.
+                if info["particionada"]:
+                    for definicao in info["indices"].values():
+                        conn.exec_driver_sql(definicao)
+                criadas.append(nome)
+    return criadas
+
+def remover_referencias(engine, pasta, escolhidas):
+    """Remove, numa transação, as chaves estrangeiras que apontam para as tabelas escolhidas.
+
+    Retorna [(tabela, comando que a recria)]. Os comandos ficam também em CHAVES_PENDENTES na pasta
+    do backup, para recriá-las à mão se a restauração for interrompida.
+    """
+    with engine.connect() as conn:
+        with conn.begin():
+            referencias = conn.execute(sqlalchemy.text(REFERENCIAS_QUERY), {"tabelas": sorted(escolhidas)}).fetchall()
+            if not referencias:
+                return []
+            comandos = [(tabela, f'ALTER TABLE {tabela} ADD CONSTRAINT "{nome}" {definicao}')
+                        for tabela, nome, definicao in referencias]
+            with open(os.path.join(pasta, CHAVES_PENDENTES), "w", encoding="utf-8") as f:
+                f.writelines(f"{comando};\n" for _, comando in comandos)
+            for tabela, nome, _ in referencias:
+                conn.exec_driver_sql(f'ALTER TABLE {tabela} DROP CONSTRAINT "{nome}"')
+    return comandos
+
+def criar_chaves_estrangeiras(engine, comandos, resultados):
+    """Cria as chaves estrangeiras [(tabela, comando)] depois de todas as tabelas carregadas, uma por transação.
+
+    Retorna quantas não puderam ser criadas.
+    """
+    falhas = 0
+    with engine.connect() as conn:
+        for tabela, comando in comandos:
+            try:
+                with conn.begin():
+                    conn.exec_driver_sql(comando)
+            except sqlalchemy.exc.DBAPIError as e:
+                erro = f"ERRO: chave estrangeira não criada ({comando}): {str(e.orig).strip().splitlines()[0]}"
+                resultados[tabela] = f"{resultados[tabela]}; {erro}" if tabela in resultados else erro
+                print(f"  {tabela}: {erro}")
+                falhas += 1
+    return falhas
+
+def restaurar(engine, pasta, tabelas=None, workers=4):
+    """Restaura as tabelas do backup em paralelo. Retorna {tabela: mensagem}; tabelas com erro não são alteradas.
+
+    As tabelas ausentes na base são criadas antes a partir do DDL do manifesto.
+    """
+    manifesto = ler_manifesto(pasta)
+    escolhidas = {nome: info for nome, info in manifesto["tabelas"].items() if not tabelas or nome in tabelas}
+    criadas = criar_tabelas(engine, escolhidas)
+    if criadas:
+        print(f"  Tabela(s) criada(s) a partir do manifesto: {', '.join(criadas)}.")
+    removidas = remover_referencias(engine, pasta, escolhidas)
+    if removidas:
+        print(f"  {len(removidas)} chave(s) estrangeira(s) removida(s) durante a carga (cópia em {CHAVES_PENDENTES}).")
+    resultados = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futuros = {executor.submit(restaurar_tabela, engine, pasta, nome, info): nome for nome, info in escolhidas.items()}
+        for futuro in as_completed(futuros):
+            nome = futuros[futuro]
+            esperado = escolhidas[nome]["linhas"]
+            try:
+                linhas, integro = futuro.result()
+            except Exception as e:
+                resultados[nome] = f"ERRO: {str(getattr(e, 'pgerror', None) or e).strip().splitlines()[0]}"
+                continue
+            if not integro:
+                resultados[nome] = "ERRO: arquivo corrompido (checksum ou linhas não conferem); tabela não alterada."
+            elif linhas != esperado:
+                resultados[nome] = f"ERRO: {linhas} linha(s) carregada(s), {esperado} esperada(s); tabela não alterada."
+            else:
+                resultados[nome] = f"{linhas} linha(s) restaurada(s)"
+            print(f"  {nome}: {resultados[nome]}")
+    novas = [(nome, comando) for nome in criadas for comando in escolhidas[nome]["ddl"]["chaves_estrangeiras"]]
+    if not criar_chaves_estrangeiras(engine, removidas + novas, resultados) and removidas:
+        os.remove(os.path.join(pasta, CHAVES_PENDENTES))
+    if criadas:
+        print("  Colunas geradas (busca textual) não fazem parte do DDL; rode configurar_busca.py depois da restauração.")
+    return resultados
+
+def main():
+    """Backup consistente de todas as tabelas por COPY, e restauração a partir dele."""
+    parser = argparse.ArgumentParser(description="Backup e restauração da base por COPY, em paralelo.")
+    parser.add_argument("acao", choices=["exportar", "restaurar", "verificar"])
+    parser.add_argument("pasta", nargs="?", help=f"Pasta do backup (padrão para exportar: {DESTINO_PADRAO}/AAAAMMDD_HHMM).")
+    parser.add_argument("--tabelas", help="Limita às tabelas indicadas, separadas por vírgula.")
+    parser.add_argument("--workers", type=int, default=4, help="Tabelas processadas ao mesmo tempo (uma conexão cada).")
+    args = parser.parse_args()
+    tabelas = {t.strip() for t in args.tabelas.split(",") if t.strip()} if args.tabelas else None
+
+    if args.acao == "verificar":
+        if not args.pasta:
+            print("Informe a pasta do backup.")
+            return
+        manifesto = ler_manifesto(args.pasta)
+        falhas = [nome for nome, info in manifesto["tabelas"].items()
+                  if (not tabelas or nome in tabelas) and not verificar_arquivo(args.pasta, nome, info)]
+        print(f"Backup de {manifesto['data']}: " + (f"arquivo(s) corrompido(s): {', '.join(falhas)}." if falhas else "todos os arquivos conferem."))
+        return
+
+    engine = get_postgres_engine()
+    if engine is None:
+        print("Não foi possível conectar à base de dados. Verifique o seu ficheiro secrets.toml.")
+        return
+    # Uma conexão por worker, mais a do coordenador do snapshot.
+    engine = sqlalchemy.create_engine(engine.url, pool_size=args.workers + 1)
+
+    if args.acao == "exportar":
+        pasta = args.pasta or os.path.join(DESTINO_PADRAO, datetime.now().strftime("%Y%m%d_%H%M"))
+        print(f"--- EXPORTANDO PARA {pasta} ---")
+        manifesto = exportar(engine, pasta, tabelas, workers=args.workers)
+        total = sum(info["linhas"] for info in manifesto["tabelas"].values())
+        print(f"{len(manifesto['tabelas'])} tabela(s), {total} linha(s). Manifesto em {os.path.join(pasta, MANIFESTO)}.")
+    else:
+        if not args.pasta:
+            print("Informe a pasta do backup.")
+            return
+        print(f"--- RESTAURANDO DE {args.pasta} ---")
+        resultados = restaurar(engine, args.pasta, tabelas, workers=args.workers)
+        erros = [nome for nome, msg in resultados.items() if "ERRO" in msg]
+        print(f"{len(resultados) - len(erros)} tabela(s) restaurada(s)" + (f"; com erro: {', '.join(sorted(erros))}." if erros else "."))
+
+if __name__ == "__main__":
+    main()
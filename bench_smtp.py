@@ -0,0 +1,84 @@
+import argparse
+import socketserver
+import threading
+import time
+from email.message import EmailMessage
+from email_utils import SMTPPool
+
+class _SinkHandler(socketserver.StreamRequestHandler):
+    """Servidor SMTP mínimo que aceita e descarta as mensagens (sem TLS nem autenticação)."""
+
+    def responder(self, linha):
+        self.wfile.write(linha.encode("ascii") + b"\r\n")
+
+    def handle(self):
+        self.responder("220 sink ESMTP")
+        while True:
+            linha = self.rfile.readline()
+            if not linha:
+                return
+            comando = linha.decode("ascii", "replace").strip().upper()
+            if comando.startswith("EHLO"):
+                self.wfile.write(b"250-sink\r\n250 8BITMIME\r\n")
+            elif comando.startswith(("HELO", "MAIL", "RCPT", "RSET", "NOOP")):
+                self.responder("250 OK")
+            elif comando == "DATA":
+                self.responder("354 End data with <CR><LF>.<CR><LF>")
+                while self.rfile.readline() not in (b".\r\n", b".\n", b""):
+                    pass
+                self.server.recebidas += 1
+                self.responder("250 OK")
+            elif comando == "QUIT":
+                self.responder("221 Bye")
+                return
+            else:
+                self.responder("502 Command not implemented")
+
+class _Sink(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    recebidas = 0
+
+def _mensagens(total):
+    for i in range(total):
+        msg = EmailMessage()
+        msg['Subject'] = f"Teste {i}"
+        msg['To'] = f"membro{i}@example.com"
+        msg.add_alternative(f"<p>Mensagem {i}</p>", subtype='html')
+        yield msg
+
+def medir(nome, creds, total, pool_size, max_mensagens_por_conexao):
+    """Envia 'total' mensagens e imprime a taxa obtida."""
+    inicio = time.perf_counter()
+    with SMTPPool(creds, pool_size=pool_size, max_por_segundo=0,
+                  max_mensagens_por_conexao=max_mensagens_por_conexao) as pool:
+        falhas = sum(1 for _, erro in pool.send_many(list(_mensagens(total))) if erro)
+    duracao = time.perf_counter() - inicio
+    print(f"{nome}: {total} mensagens em {duracao:.2f}s ({total / duracao:.0f} msg/s), {falhas} falha(s).")
+
+def main():
+    """Compara o envio com conexões reaproveitadas contra uma conexão por mensagem."""
+    parser = argparse.ArgumentParser(description="Mede a vazão do envio de emails contra um servidor SMTP de testes.")
+    parser.add_argument("--mensagens", type=int, default=500)
+    parser.add_argument("--conexoes", type=int, default=4, help="Tamanho do pool.")
+    parser.add_argument("--host", help="Servidor SMTP externo (ex.: aiosmtpd, MailHog). Padrão: sink embutido.")
+    parser.add_argument("--port", type=int, default=1025)
+    args = parser.parse_args()
+
+    sink = None
+    if args.host is None:
+        sink = _Sink(("127.0.0.1", 0), _SinkHandler)
+        threading.Thread(target=sink.serve_forever, daemon=True).start()
+        args.host, args.port = sink.server_address
+
+    creds = {"email_address": "bench@example.com", "smtp_host": args.host, "smtp_port": args.port, "smtp_ssl": False}
+    try:
+        medir("Uma conexão por mensagem", creds, args.mensagens, args.conexoes, max_mensagens_por_conexao=1)
+        medir("Conexões reaproveitadas", creds, args.mensagens, args.conexoes, max_mensagens_por_conexao=100)
+    finally:
+        if sink is not None:
+            print(f"O sink recebeu {sink.recebidas} mensagem(ns).")
+            sink.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+LIMITE_ANUNCIOS_POR_MEMBRO = 3
+DIAS_EXPIRACAO_ANUNCIO = 30
+
+# A cota e a listagem usam os índices parciais da migração 006 (migracoes.py): a cota conta só os
+# anúncios ativos/pendentes de um membro e a listagem percorre só os ativos, já na ordem de exibição.
+# Um índice parcial não pode depender de now(), então quem mantém fora dele os anúncios vencidos é o
+# arquivamento noturno (retencao.py).
+# "DATA_CRIACAO" é timestamp e "DESTAQUE" é boolean (migrar_tipos.py).
+COTA_QUERY = """
+    SELECT count(*) FROM classificados
+    WHERE "USER_ID" = %(user_id)s AND "STATUS" IN ('ATIVO', 'PENDENTE')
+"""
+
+def filtro_busca(categoria=None):
+    """Restrição da busca textual (search_utils.buscar) equivalente à da listagem: não vencidos e da categoria."""
+    filtro = 't."DATA_CRIACAO" >= :limite'
+    return filtro + ' AND t."CATEGORIA" = :categoria' if categoria else filtro
+
+def consulta_anuncios(categoria=None, ids=None, destaque=False):
+    """Monta a consulta dos anúncios ativos e não vencidos, já filtrada e ordenada no banco.
+
+    Com 'ids' (uma página da busca textual), mantém a ordem de relevância; sem eles, os mais recentes
+    primeiro. 'destaque' None traz destacados e normais juntos.
+    """
+    condicoes = ['"STATUS" = \'ATIVO\'', '"DATA_CRIACAO" >= %(limite)s']
+    if destaque is not None:
+        condicoes.append('"DESTAQUE"' if destaque else 'NOT coalesce("DESTAQUE", false)')
+    if categoria:
+        condicoes.append('"CATEGORIA" = %(categoria)s')
+    ordem = '"DATA_CRIACAO" DESC'
+    if ids is not None:
+        condicoes.append('"CLASSIFICADO_ID" = ANY(CAST(%(ids)s AS INTEGER[]))')
+        ordem = 'array_position(CAST(%(ids)s AS INTEGER[]), "CLASSIFICADO_ID"), ' + ordem
+    return f"""
+        SELECT *, count(*) OVER () AS total FROM classificados
+        WHERE {' AND '.join(condicoes)}
+        ORDER BY {ordem}
+        LIMIT %(limite_linhas)s OFFSET %(offset)s
+    """
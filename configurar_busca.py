@@ -0,0 +1,22 @@
+import argparse
+from db_utils import get_postgres_engine
+from search_utils import configurar_busca
+
+def main():
+    """Prepara o banco para a busca textual (unaccent, configuração pt_unaccent, colunas tsvector e índices GIN)."""
+    parser = argparse.ArgumentParser(description="Configura a busca textual do site.")
+    parser.add_argument("--recriar", action="store_true",
+                        help="Recria as colunas tsvector (necessário após mudar as colunas indexadas).")
+    args = parser.parse_args()
+
+    engine = get_postgres_engine()
+    if engine is None:
+        print("Não foi possível conectar à base de dados. Verifique o seu ficheiro secrets.toml.")
+        return
+
+    with engine.connect() as conn:
+        tabelas = configurar_busca(conn, recriar=args.recriar)
+    print(f"Busca textual configurada em: {', '.join(tabelas) or 'nenhuma tabela'}.")
+
+if __name__ == "__main__":
+    main()
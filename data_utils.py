@@ -0,0 +1,105 @@
+import argparse
+import numpy as np
+import pandas as pd
+import sqlalchemy
+import toml
+from db_utils import get_postgres_engine, SECRETS_PATH
+
+# Carregamento compacto das tabelas que as páginas guardam em cache. Textos vão para strings em
+# Arrow (um buffer contíguo em vez de um objeto Python por célula), colunas com poucos valores
+# distintos (STATUS, CATEGORIA, TIPO_SERVICO...) viram categóricas e inteiros são reduzidos ao
+# menor tipo que os comporta. Os nulos continuam NaN, como nas colunas object de antes, para que
+# o código das páginas que testa pd.notna/fillna siga funcionando igual.
+TEXTO = pd.StringDtype("pyarrow", na_value=np.nan)
+PROPORCAO_CATEGORIAS = 0.5
+MIN_LINHAS_CATEGORIA = 20
+
+def formatar_data(valor, formato="%d/%m/%Y", padrao="data não informada"):
+    """Formata uma data vinda do banco; nulos (NaT/None, ex.: valores que o migrar_tipos.py não converteu) viram 'padrao'."""
+    if pd.isna(valor):
+        return padrao
+    return pd.Timestamp(valor).strftime(formato)
+
+def memoria_mb(df):
+    """Memória ocupada pelo DataFrame, contando o conteúdo das strings."""
+    return df.memory_usage(deep=True).sum() / 1024 / 1024
+
+def compactar(df, proporcao_categorias=PROPORCAO_CATEGORIAS):
+    """Converte as colunas do DataFrame para os tipos compactos (altera e devolve o próprio df)."""
+    for coluna in df.columns:
+        serie = df[coluna]
+        if serie.dtype == object:
+            valores = serie.dropna()
+            # Só colunas inteiramente de texto; bytes, JSON e Decimal ficam como estão.
+            if valores.empty or pd.api.types.infer_dtype(valores, skipna=True) != "string":
+                continue
+            if len(serie) >= MIN_LINHAS_CATEGORIA and valores.nunique() <= len(serie) * proporcao_categorias:
+                df[coluna] = serie.astype("category")
+            else:
+                df[coluna] = serie.astype(TEXTO)
+        elif pd.api.types.is_integer_dtype(serie) and not pd.api.types.is_bool_dtype(serie):
+            df[coluna] = pd.to_numeric(serie, downcast="integer")
+    return df
+
+def tabelas_arrow():
+    """Tabelas lidas pelo caminho ADBC, listadas em [dados] tabelas_arrow = [...] no secrets.toml."""
+    try:
+        secrets = toml.load(SECRETS_PATH)
+    except Exception:
+        return set(), None
+    return set(secrets.get("dados", {}).get("tabelas_arrow", [])), secrets.get("database", {}).get("url")
+
+def ler_tabela_adbc(db_url, tabela):
+    """Lê a tabela pelo driver ADBC do Postgres, que usa COPY binário e entrega colunas Arrow prontas.
+
+    O DataFrame fica apoiado nos próprios buffers Arrow (pd.ArrowDtype, sem cópia); nesse caminho os
+    nulos são pd.NA. Requer o pacote opcional 'adbc-driver-postgresql'.
+    """
+    try:
+        import adbc_driver_postgresql.dbapi
+    except ImportError as e:
+        raise RuntimeError("A leitura por ADBC requer o pacote 'adbc-driver-postgresql'.") from e
+    # O ADBC usa a URL libpq, sem o prefixo de driver do SQLAlchemy (postgresql+psycopg2://).
+    uri = sqlalchemy.engine.make_url(db_url).set(drivername="postgresql").render_as_string(hide_password=False)
+    with adbc_driver_postgresql.dbapi.connect(uri) as conn:
+        with conn.cursor() as cur:
+            cur.execute(f'SELECT * FROM "{tabela}"')
+            tabela_arrow = cur.fetch_arrow_table()
+    return tabela_arrow.to_pandas(types_mapper=pd.ArrowDtype)
+
+def carregar_tabela(conn, tabela):
+    """Carrega a tabela inteira em tipos compactos; as configuradas em tabelas_arrow vêm por ADBC."""
+    arrow, db_url = tabelas_arrow()
+    if tabela in arrow and db_url:
+        try:
+            return ler_tabela_adbc(db_url, tabela)
+        except RuntimeError as e:
+            print(f"{e} Lendo {tabela} pelo caminho padrão.")
+    return compactar(pd.read_sql_query(f'SELECT * FROM "{tabela}"', conn))
+
+def main():
+    """Relata a memória de cada tabela carregada do jeito antigo e do jeito compacto."""
+    parser = argparse.ArgumentParser(description="Memória das tabelas em cache, antes e depois da compactação.")
+    parser.add_argument("--tabelas", default="usuarios,convenios,noticias,parceiros,servicos,financas,classificados",
+                        help="Tabelas a medir, separadas por vírgula.")
+    args = parser.parse_args()
+
+    engine = get_postgres_engine()
+    if engine is None:
+        print("Não foi possível conectar à base de dados. Verifique o seu ficheiro secrets.toml.")
+        return
+
+    _, db_url = tabelas_arrow()
+    print(f"{'tabela':<16}{'linhas':>9}{'antes MB':>11}{'depois MB':>11}{'ADBC MB':>10}")
+    with engine.connect() as conn:
+        for tabela in [t.strip() for t in args.tabelas.split(",") if t.strip()]:
+            antes = pd.read_sql_query(f'SELECT * FROM "{tabela}"', conn)
+            depois = compactar(antes.copy())
+            try:
+                adbc = f"{memoria_mb(ler_tabela_adbc(db_url, tabela)):>10.2f}"
+            except RuntimeError:
+                adbc = f"{'-':>10}"
+            print(f"{tabela:<16}{len(antes):>9}{memoria_mb(antes):>11.2f}{memoria_mb(depois):>11.2f}{adbc}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,16 @@
+import sqlalchemy
+import toml
+
+SECRETS_PATH = '.streamlit/secrets.toml'
+
+def get_postgres_engine():
+    """Cria um engine de conexão com o PostgreSQL usando as credenciais dos secrets."""
+    try:
+        secrets = toml.load(SECRETS_PATH)
+        db_url = secrets["database"]["url"]
+        if 'sslmode' not in db_url:
+            db_url += "?sslmode=require"
+        return sqlalchemy.create_engine(db_url)
+    except Exception as e:
+        print(f"Erro ao ler secrets ou criar engine: {e}")
+        return None
@@ -0,0 +1,93 @@
+import argparse
+import hashlib
+import os
+import sqlalchemy
+from db_utils import get_postgres_engine
+from file_utils import store_blob, blob_path, ensure_upload_blobs_table, existing_upload_columns, PRIVATE_SUBFOLDERS
+
+LEGACY_UPLOADS_DIR = 'uploads'
+
+def listar_uploads_legados(base_dir=LEGACY_UPLOADS_DIR):
+    """Percorre a pasta de uploads antiga e retorna os caminhos dos arquivos."""
+    for root, _, files in os.walk(base_dir):
+        for name in files:
+            yield os.path.join(root, name).replace("\\", "/")
+
+def migrar_para_blobs(conn, mapeamento):
+    """Reescreve as URLs antigas no banco para apontar aos blobs deduplicados."""
+    atualizadas = 0
+    with conn.begin():
+        for table, column in existing_upload_columns(conn):
+            query = sqlalchemy.text(f'UPDATE {table} SET "{column}" = :novo WHERE "{column}" = :antigo')
+            for antigo, novo in mapeamento.items():
+                atualizadas += conn.execute(query, {"novo": novo, "antigo": antigo}).rowcount
+    return atualizadas
+
+def recalcular_referencias(conn, blobs):
+    """Recalcula a contagem de referências de cada blob a partir das linhas do banco."""
+    query = sqlalchemy.text("""
+        INSERT INTO upload_blobs ("HASH", "CAMINHO", "TAMANHO", "REFERENCIAS", "ORIGEM")
+        VALUES (:hash, :caminho, :tamanho, :referencias, :origem)
+        ON CONFLICT ("HASH") DO UPDATE SET "REFERENCIAS" = EXCLUDED."REFERENCIAS"
+    """)
+    with conn.begin():
+        union = " UNION ALL ".join(
+            f'SELECT "{column}" AS url FROM {table}' for table, column in existing_upload_columns(conn)
+        )
+        contagens = dict(conn.execute(sqlalchemy.text(
+            f"SELECT url, COUNT(*) FROM ({union}) refs WHERE url IS NOT NULL GROUP BY url"
+        )).fetchall())
+        for caminho, (digest, tamanho, origem) in blobs.items():
+            conn.execute(query, {"hash": digest, "caminho": caminho, "tamanho": tamanho,
+                                 "referencias": contagens.get(caminho, 0), "origem": origem})
+
+def main():
+    """Deduplica os arquivos da pasta 'uploads' no armazenamento por conteúdo."""
+    parser = argparse.ArgumentParser(description="Deduplica os uploads existentes por hash de conteúdo.")
+    parser.add_argument("--aplicar", action="store_true", help="Grava os blobs e reescreve as URLs no banco.")
+    parser.add_argument("--remover-originais", action="store_true", help="Apaga os arquivos antigos após a migração.")
+    args = parser.parse_args()
+
+    mapeamento, blobs = {}, {}
+    bytes_totais = 0
+    for antigo in listar_uploads_legados():
+        with open(antigo, "rb") as f:
+            data = f.read()
+        bytes_totais += len(data)
+        extension = os.path.splitext(antigo)[1]
+        origem = antigo.split("/")[1] if "/" in antigo else None
+        # Contratos continuam fora da pasta estática: vão para o armazenamento privado.
+        privado = origem in PRIVATE_SUBFOLDERS
+        if args.aplicar:
+            caminho, digest, tamanho = store_blob(data, extension, privado=privado)
+        else:
+            digest = hashlib.sha256(data).hexdigest()
+            caminho, tamanho = blob_path(digest, extension, privado), len(data)
+        mapeamento[antigo] = caminho
+        blobs.setdefault(caminho, (digest, tamanho, origem))
+
+    bytes_unicos = sum(tamanho for _, tamanho, _ in blobs.values())
+    print(f"{len(mapeamento)} arquivos encontrados, {len(blobs)} blobs únicos.")
+    print(f"Espaço atual: {bytes_totais / 1024 / 1024:.1f} MB; após deduplicação: {bytes_unicos / 1024 / 1024:.1f} MB.")
+
+    if not args.aplicar:
+        print("Execução de simulação. Use --aplicar para gravar as alterações.")
+        return
+
+    engine = get_postgres_engine()
+    if engine is None:
+        print("Não foi possível conectar à base de dados. Verifique o seu ficheiro secrets.toml.")
+        return
+
+    with engine.connect() as conn:
+        ensure_upload_blobs_table(conn)
+        print(f"{migrar_para_blobs(conn, mapeamento)} referências reescritas no banco.")
+        recalcular_referencias(conn, blobs)
+
+    if args.remover_originais:
+        for antigo in mapeamento:
+            os.remove(antigo)
+        print("Arquivos originais removidos.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+import argparse
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+import sqlalchemy
+import toml
+from db_utils import get_postgres_engine, SECRETS_PATH
+from email_utils import SMTPPool, build_tag_digest_email
+from tag_utils import STATUS_PUBLICADA
+
+DIAS_RETROATIVOS_PADRAO = 7
+
+# Cada notícia chega uma única vez a cada membro: os pares (membro, notícia) são reservados em
+# digest_entregas antes do envio e liberados se o email daquele membro falhar, para que a próxima
+# execução tente de novo só para ele. digest_noticias é o registro antigo, por notícia: as notícias
+# que ele já tem foram enviadas a todos e continuam fora. Tabelas e o índice tag_follows_tag_idx
+# vêm das migrações 004 e 011 (migracoes.py).
+
+NOVAS_NOTICIAS_QUERY = """
+    SELECT n."ID"::text AS id, n."TITULO", n."RESUMO",
+           ARRAY(SELECT t."TAG" FROM noticia_tags t WHERE t."NOTICIA_ID" = n."ID" ORDER BY t."TAG") AS tags
+    FROM noticias n
+    WHERE n."STATUS" = :status
+      AND n."DATA" >= :desde
+      AND EXISTS (SELECT 1 FROM noticia_tags t WHERE t."NOTICIA_ID" = n."ID")
+      AND NOT EXISTS (SELECT 1 FROM digest_noticias d WHERE d."NOTICIA_ID" = n."ID"::text)
+    ORDER BY n."DATA"
+"""
+
+RESERVAR_QUERY = """
+    INSERT INTO digest_entregas ("USER_ID", "NOTICIA_ID")
+    SELECT * FROM unnest(CAST(:usuarios AS TEXT[]), CAST(:noticias AS TEXT[]))
+    ON CONFLICT DO NOTHING
+    RETURNING "USER_ID", "NOTICIA_ID"
+"""
+
+ENTREGUES_QUERY = """
+    SELECT "USER_ID", "NOTICIA_ID" FROM digest_entregas
+    WHERE ("USER_ID", "NOTICIA_ID") IN (
+        SELECT * FROM unnest(CAST(:usuarios AS TEXT[]), CAST(:noticias AS TEXT[]))
+    )
+"""
+
+LIBERAR_QUERY = """
+    DELETE FROM digest_entregas
+    WHERE ("USER_ID", "NOTICIA_ID") IN (
+        SELECT * FROM unnest(CAST(:usuarios AS TEXT[]), CAST(:noticias AS TEXT[]))
+    )
+"""
+
+# Índice invertido tag -> seguidores, restrito às tags que aparecem nas notícias desta execução.
+SEGUIDORES_QUERY = """
+    SELECT "TAG_NAME", array_agg(DISTINCT "USER_ID")
+    FROM tag_follows
+    WHERE "TAG_NAME" = ANY(:tags)
+    GROUP BY "TAG_NAME"
+"""
+
+DESTINATARIOS_QUERY = """
+    SELECT "ID", "NOME", "EMAIL" FROM usuarios
+    WHERE "ID" = ANY(CAST(:ids AS INTEGER[])) AND "STATUS" = 'ATIVO' AND "EMAIL" IS NOT NULL
+"""
+
+def montar_digests(conn, noticias):
+    """Distribui as notícias para os seguidores das suas tags. Retorna {user_id: [notícias]}."""
+    todas_tags = sorted({tag for noticia in noticias for tag in noticia["tags"]})
+    indice = dict(conn.execute(sqlalchemy.text(SEGUIDORES_QUERY), {"tags": todas_tags}).fetchall())
+
+    digests = defaultdict(dict)
+    for noticia in noticias:
+        for tag in noticia["tags"]:
+            for user_id in indice.get(tag, ()):
+                entrada = digests[user_id].setdefault(noticia["id"], {**noticia, "tags_seguidas": []})
+                entrada["tags_seguidas"].append(tag)
+    return {user_id: list(por_noticia.values()) for user_id, por_noticia in digests.items()}
+
+def _pares(digests):
+    pares = [(str(user_id), noticia["id"]) for user_id, itens in digests.items() for noticia in itens]
+    return {"usuarios": [u for u, _ in pares], "noticias": [n for _, n in pares]}
+
+def _filtrar(digests, pares, manter):
+    filtrados = {user_id: [n for n in itens if ((str(user_id), n["id"]) in pares) == manter]
+                 for user_id, itens in digests.items()}
+    return {user_id: itens for user_id, itens in filtrados.items() if itens}
+
+def reservar(conn, digests):
+    """Grava as entregas (membro, notícia) que serão enviadas. Retorna os digests só com as que esta execução reservou."""
+    if not digests:
+        return {}
+    with conn.begin():
+        reservadas = set(map(tuple, conn.execute(sqlalchemy.text(RESERVAR_QUERY), _pares(digests)).fetchall()))
+    return _filtrar(digests, reservadas, manter=True)
+
+def nao_entregues(conn, digests):
+    """Os digests sem as entregas já registradas, sem gravar nada (usado na simulação)."""
+    if not digests:
+        return {}
+    with conn.begin():
+        entregues = set(map(tuple, conn.execute(sqlalchemy.text(ENTREGUES_QUERY), _pares(digests)).fetchall()))
+    return _filtrar(digests, entregues, manter=False)
+
+def liberar(conn, digests):
+    """Remove do registro as entregas cujo email falhou, para que a próxima execução tente de novo."""
+    if not digests:
+        return
+    with conn.begin():
+        conn.execute(sqlalchemy.text(LIBERAR_QUERY), _pares(digests))
+
+def main():
+    """Envia a cada membro um único email com as notícias novas das tags que ele segue."""
+    parser = argparse.ArgumentParser(description="Digest por email das notícias nas tags seguidas.")
+    parser.add_argument("--dias", type=int, default=DIAS_RETROATIVOS_PADRAO,
+                        help="Considera apenas notícias publicadas nos últimos N dias.")
+    parser.add_argument("--conexoes", type=int, default=3, help="Conexões SMTP simultâneas.")
+    parser.add_argument("--max-por-segundo", type=float, default=5, help="Limite de envios por segundo.")
+    parser.add_argument("--simular", action="store_true", help="Apenas mostra os digests, sem enviar nem registrar.")
+    args = parser.parse_args()
+
+    engine = get_postgres_engine()
+    if engine is None:
+        print("Não foi possível conectar à base de dados. Verifique o seu ficheiro secrets.toml.")
+        return
+
+    inicio = time.monotonic()
+    secrets = toml.load(SECRETS_PATH)
+    email_creds = secrets["email_credentials"]
+    base_url = secrets["app_config"]["url"]
+    desde = (datetime.now() - timedelta(days=args.dias)).strftime("%Y-%m-%d %H:%M:%S")
+
+    with engine.connect() as conn:
+        with conn.begin():
+            if not conn.execute(sqlalchemy.text("SELECT to_regclass('digest_entregas') IS NOT NULL")).scalar():
+                print("A tabela digest_entregas não existe. Rode antes: python migracoes.py")
+                return
+            noticias = [
+                {"id": row.id, "titulo": row.TITULO, "resumo": row.RESUMO, "tags": row.tags}
+                for row in conn.execute(sqlalchemy.text(NOVAS_NOTICIAS_QUERY), {"status": STATUS_PUBLICADA, "desde": desde})
+            ]
+            digests = montar_digests(conn, noticias) if noticias else {}
+            destinatarios = conn.execute(
+                sqlalchemy.text(DESTINATARIOS_QUERY), {"ids": list(digests)}
+            ).mappings().all() if digests else []
+        digests = {user["ID"]: digests[user["ID"]] for user in destinatarios}
+        digests = nao_entregues(conn, digests) if args.simular else reservar(conn, digests)
+        if not digests:
+            print("Nenhuma notícia nova com tags seguidas.")
+            return
+
+        usuarios = {user["ID"]: user for user in destinatarios if user["ID"] in digests}
+        mensagens = []
+        for user_id, user in usuarios.items():
+            itens = [{**n, "tags": n["tags_seguidas"]} for n in digests[user_id]]
+            mensagens.append(build_tag_digest_email(user["EMAIL"], user["NOME"], itens, base_url, email_creds["email_address"]))
+
+        falhas = {}
+        if args.simular:
+            for msg in mensagens:
+                print(f"  {msg['To']}: {msg['Subject']}")
+        else:
+            with SMTPPool(email_creds, pool_size=args.conexoes, max_por_segundo=args.max_por_segundo) as pool:
+                for user_id, (msg, erro) in zip(usuarios, pool.send_many(mensagens)):
+                    if erro:
+                        falhas[user_id] = digests[user_id]
+                        print(f"ERRO: Falha ao enviar digest para {msg['To']}. Detalhes: {erro}")
+            liberar(conn, falhas)
+
+    entregas = sum(len(itens) for itens in digests.values())
+    print("--- RESUMO DO DIGEST ---")
+    print(f"{len(noticias)} notícia(s) nova(s), {entregas} entrega(s) notícia→membro em {len(mensagens)} email(s).")
+    print(f"{len(mensagens) - len(falhas)} enviado(s), {len(falhas)} falha(s) liberada(s) para a próxima execução, "
+          f"{time.monotonic() - inicio:.1f}s"
+          + (" (simulação)" if args.simular else ""))
+
+if __name__ == "__main__":
+    main()
@@ -1,102 +1,276 @@
 import streamlit as st
 import smtplib
+import threading
+import time
+import queue
+from concurrent.futures import ThreadPoolExecutor
 from email.message import EmailMessage
+from jinja2 import Environment, DictLoader, select_autoescape
 import pandas as pd
 
-def send_recovery_email(recipient_email: str, token: str, email_config: dict):
-    """
-    Envia um email de recuperação de senha para o usuário.
-    Agora recebe as credenciais e a URL base como um dicionário.
-    """
-    try:
-        # Carrega as credenciais e a URL do dicionário
-        sender_email = email_config["email_address"]
-        sender_password = email_config["email_password"]
-        base_url = email_config["base_url"]
-
-        # Cria a mensagem do email
-        msg = EmailMessage()
-        msg['Subject'] = "Recuperação de Senha - Associação de Benefícios"
-        msg['From'] = sender_email
-        msg['To'] = recipient_email
-        
-        # Monta o link de recuperação
-        recovery_link = f"{base_url}/Recuperar_Senha?token={token}"
-
-        # Corpo do email em HTML para melhor formatação
-        html_content = f"""
+SMTP_HOST = 'smtp.gmail.com'
+SMTP_PORT = 465
+
+# --- TEMPLATES ---
+TEMPLATES = {
+    "base.html": """
         <html>
         <body>
-            <h2>Recuperação de Senha</h2>
-            <p>Olá,</p>
-            <p>Você solicitou a recuperação de sua senha. Clique no link abaixo para redefinir sua senha:</p>
-            <p style="font-size: 16px; font-weight: bold;"><a href="{recovery_link}">{recovery_link}</a></p>
-            <p>Este link é válido por 15 minutos.</p>
-            <p>Se você não solicitou esta recuperação, por favor, ignore este email.</p>
+            {% block conteudo %}{% endblock %}
             <br>
             <p>Atenciosamente,</p>
             <p>Equipe da Associação</p>
         </body>
         </html>
-        """
-        msg.add_alternative(html_content, subtype='html')
-
-        with smtplib.SMTP_SSL('smtp.gmail.com', 465) as smtp:
-            smtp.login(sender_email, sender_password)
-            smtp.send_message(msg)
-        return True
-    except Exception as e:
-        # Verifica se o erro é de autenticação SMTP
-        if isinstance(e, smtplib.SMTPAuthenticationError):
-            st.error("Falha na autenticação com o servidor de email. Verifique as credenciais de email no arquivo de segredos (secrets.toml).")
-            st.error("Para contas do Gmail, é recomendável usar uma 'Senha de App'.")
-        else:
-            st.error(f"Erro ao enviar email: {e}")
-        return False
-
-def send_due_date_reminder_email(recipient_email: str, charge_details: dict, email_creds: dict):
-    """
-    Envia um email de lembrete de vencimento de cobrança.
-    Agora recebe as credenciais como um dicionário.
-    """
-    try:
-        sender_email = email_creds["email_address"]
-        sender_password = email_creds["email_password"]
-
-        msg = EmailMessage()
-        msg['Subject'] = f"Lembrete de Vencimento: {charge_details['DESCRICAO']}"
-        msg['From'] = sender_email
-        msg['To'] = recipient_email
-        
-        nome_membro = charge_details.get('NOME', 'Membro').split(' ')[0]
-        valor_formatado = f"R$ {charge_details['VALOR']:.2f}".replace('.', ',')
-        # A data pode vir como string ou objeto date, então garantimos a conversão
-        data_vencimento_formatada = pd.to_datetime(charge_details['DATA_VENCIMENTO']).strftime('%d/%m/%Y') 
-
-        html_content = f"""
-        <html>
-        <body>
+    """,
+    "recuperacao_senha.html": """{% extends "base.html" %}{% block conteudo %}
+            <h2>Recuperação de Senha</h2>
+            <p>Olá,</p>
+            <p>Você solicitou a recuperação de sua senha. Clique no link abaixo para redefinir sua senha:</p>
+            <p style="font-size: 16px; font-weight: bold;"><a href="{{ recovery_link }}">{{ recovery_link }}</a></p>
+            <p>Este link é válido por 15 minutos.</p>
+            <p>Se você não solicitou esta recuperação, por favor, ignore este email.</p>
+    {% endblock %}""",
+    "lembrete_vencimento.html": """{% extends "base.html" %}{% block conteudo %}
             <h2>Lembrete de Vencimento</h2>
-            <p>Olá, {nome_membro},</p>
+            <p>Olá, {{ nome_membro }},</p>
             <p>Este é um lembrete amigável sobre a sua cobrança que está próxima do vencimento:</p>
             <ul>
-                <li><strong>Descrição:</strong> {charge_details['DESCRICAO']}</li>
-                <li><strong>Valor:</strong> {valor_formatado}</li>
-                <li><strong>Data de Vencimento:</strong> {data_vencimento_formatada}</li>
+                <li><strong>Descrição:</strong> {{ descricao }}</li>
+                <li><strong>Valor:</strong> {{ valor_formatado }}</li>
+                <li><strong>Data de Vencimento:</strong> {{ data_vencimento }}</li>
             </ul>
             <p>Por favor, realize o pagamento para evitar inconvenientes. Você pode ver mais detalhes em sua área de membro.</p>
-            <br>
-            <p>Atenciosamente,</p>
-            <p>Equipe da Associação</p>
-        </body>
-        </html>
-        """
-        msg.add_alternative(html_content, subtype='html')
+    {% endblock %}""",
+    "lembrete_renovacao.html": """{% extends "base.html" %}{% block conteudo %}
+            <h2>Feliz Aniversário de Associação, {{ nome_membro }}!</h2>
+            <p>Olá,</p>
+            <p>Gostaríamos de parabenizá-lo pelo seu aniversário em nossa associação! Agradecemos por fazer parte da nossa comunidade.</p>
+            <p>Este é um lembrete amigável para a renovação da sua anuidade, que ajuda a manter todos os benefícios que você já conhece.</p>
+            <p>Para qualquer dúvida, entre em contato conosco.</p>
+    {% endblock %}""",
+    "digest_tags.html": """{% extends "base.html" %}{% block conteudo %}
+            <h2>Novidades nas suas tags</h2>
+            <p>Olá, {{ nome_membro }},</p>
+            <p>Publicamos {{ noticias|length }} notícia(s) sobre assuntos que você acompanha:</p>
+            {% for noticia in noticias %}
+            <h3><a href="{{ noticias_url }}">{{ noticia.titulo }}</a></h3>
+            {% if noticia.resumo %}<p>{{ noticia.resumo }}</p>{% endif %}
+            <p style="color: #666;">{% for tag in noticia.tags %}#{{ tag }} {% endfor %}</p>
+            {% endfor %}
+            <p>Você pode mudar as tags que segue na página de Notícias.</p>
+    {% endblock %}""",
+}
+
+_env = Environment(loader=DictLoader(TEMPLATES), autoescape=select_autoescape(["html"]))
+# Compila os templates uma única vez, na importação do módulo.
+_COMPILED_TEMPLATES = {nome: _env.get_template(nome) for nome in TEMPLATES}
 
-                
-        with smtplib.SMTP_SSL('smtp.gmail.com', 465) as smtp:
-            smtp.login(sender_email, sender_password)
-            smtp.send_message(msg)
+def render_template(nome, **contexto):
+    """Renderiza um template de email pré-compilado."""
+    return _COMPILED_TEMPLATES[nome].render(**contexto)
+
+# --- ENVIO EM POOL ---
+class RateLimiter:
+    """Limita a taxa de envio (token bucket) para respeitar os limites do provedor."""
+
+    def __init__(self, max_por_segundo):
+        self.intervalo = 1.0 / max_por_segundo if max_por_segundo else 0
+        self.proximo = time.monotonic()
+        self.lock = threading.Lock()
+
+    def aguardar(self):
+        if not self.intervalo:
+            return
+        with self.lock:
+            agora = time.monotonic()
+            espera = self.proximo - agora
+            self.proximo = max(agora, self.proximo) + self.intervalo
+        if espera > 0:
+            time.sleep(espera)
+
+class SMTPPool:
+    """Mantém conexões SMTP autenticadas abertas e as reutiliza para enviar várias mensagens.
+
+    As credenciais podem trazer 'smtp_host', 'smtp_port' e 'smtp_ssl' para apontar para outro
+    servidor (por exemplo, um servidor local de testes sem TLS).
+    """
+
+    def __init__(self, email_creds, pool_size=3, max_por_segundo=5, max_mensagens_por_conexao=100, timeout=30):
+        self.sender_email = email_creds["email_address"]
+        self.sender_password = email_creds.get("email_password")
+        self.host = email_creds.get("smtp_host", SMTP_HOST)
+        self.port = int(email_creds.get("smtp_port", SMTP_PORT))
+        self.use_ssl = email_creds.get("smtp_ssl", True)
+        self.pool_size = pool_size
+        self.max_mensagens_por_conexao = max_mensagens_por_conexao
+        self.timeout = timeout
+        self.rate_limiter = RateLimiter(max_por_segundo)
+        self._livres = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(pool_size)
+        self._todas = []
+        self._lock = threading.Lock()
+
+    def _conectar(self):
+        if self.use_ssl:
+            smtp = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+        else:
+            smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.sender_password:
+            smtp.login(self.sender_email, self.sender_password)
+        with self._lock:
+            self._todas.append(smtp)
+        return [smtp, 0]
+
+    def _fechar(self, conexao):
+        with self._lock:
+            if conexao[0] in self._todas:
+                self._todas.remove(conexao[0])
+        try:
+            conexao[0].quit()
+        except OSError:
+            # smtplib.SMTPException também é um OSError; a conexão já pode estar encerrada.
+            pass
+
+    def _reenviar(self, conexao, msg):
+        """Descarta a conexão quebrada, abre outra e reenvia a mensagem uma única vez."""
+        self._fechar(conexao)
+        conexao = self._conectar()
+        try:
+            conexao[0].send_message(msg)
+        except BaseException:
+            self._fechar(conexao)
+            raise
+        return conexao
+
+    def send(self, msg):
+        """Envia uma mensagem usando uma conexão do pool; reconecta uma vez se o servidor tiver desconectado."""
+        if not msg['From']:
+            msg['From'] = self.sender_email
+        with self._slots:
+            try:
+                conexao = self._livres.get_nowait()
+            except queue.Empty:
+                conexao = self._conectar()
+            self.rate_limiter.aguardar()
+            try:
+                conexao[0].send_message(msg)
+            except smtplib.SMTPServerDisconnected:
+                conexao = self._reenviar(conexao, msg)
+            except smtplib.SMTPResponseException as e:
+                # 421: o servidor encerrou a sessão (ex.: limite de mensagens por conexão).
+                if e.smtp_code != 421:
+                    self._fechar(conexao)
+                    raise
+                conexao = self._reenviar(conexao, msg)
+            except smtplib.SMTPException:
+                self._fechar(conexao)
+                raise
+            except OSError:
+                conexao = self._reenviar(conexao, msg)
+            conexao[1] += 1
+            if conexao[1] >= self.max_mensagens_por_conexao:
+                self._fechar(conexao)
+            else:
+                self._livres.put(conexao)
+
+    def send_many(self, mensagens, max_workers=None):
+        """Envia várias mensagens em paralelo. Retorna uma lista de (mensagem, erro ou None)."""
+        def enviar(msg):
+            try:
+                self.send(msg)
+                return msg, None
+            except Exception as e:
+                return msg, e
+        with ThreadPoolExecutor(max_workers=max_workers or self.pool_size) as executor:
+            return list(executor.map(enviar, mensagens))
+
+    def close(self):
+        """Encerra todas as conexões abertas."""
+        while True:
+            try:
+                self._fechar(self._livres.get_nowait())
+            except queue.Empty:
+                break
+        with self._lock:
+            restantes = list(self._todas)
+        for smtp in restantes:
+            self._fechar([smtp, 0])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# --- MENSAGENS ---
+def build_recovery_email(recipient_email: str, token: str, base_url: str, sender_email: str = None):
+    """Monta o email de recuperação de senha."""
+    msg = EmailMessage()
+    msg['Subject'] = "Recuperação de Senha - Associação de Benefícios"
+    if sender_email: msg['From'] = sender_email
+    msg['To'] = recipient_email
+    recovery_link = f"{base_url}/Recuperar_Senha?token={token}"
+    msg.add_alternative(render_template("recuperacao_senha.html", recovery_link=recovery_link), subtype='html')
+    return msg
+
+def build_due_date_reminder_email(recipient_email: str, charge_details: dict, sender_email: str = None):
+    """Monta o email de lembrete de vencimento de cobrança."""
+    msg = EmailMessage()
+    msg['Subject'] = f"Lembrete de Vencimento: {charge_details['DESCRICAO']}"
+    if sender_email: msg['From'] = sender_email
+    msg['To'] = recipient_email
+    # A data pode vir como string ou objeto date, então garantimos a conversão
+    html_content = render_template(
+        "lembrete_vencimento.html",
+        nome_membro=(charge_details.get('NOME') or 'Membro').split(' ')[0],
+        descricao=charge_details['DESCRICAO'],
+        valor_formatado=f"R$ {charge_details['VALOR']:.2f}".replace('.', ','),
+        data_vencimento=pd.to_datetime(charge_details['DATA_VENCIMENTO']).strftime('%d/%m/%Y'),
+    )
+    msg.add_alternative(html_content, subtype='html')
+    return msg
+
+def build_renewal_reminder_email(recipient_email: str, member_details: dict, sender_email: str = None):
+    """Monta o email de lembrete de renovação de anuidade."""
+    msg = EmailMessage()
+    msg['Subject'] = "Lembrete de Aniversário de Associação!"
+    if sender_email: msg['From'] = sender_email
+    msg['To'] = recipient_email
+    msg.add_alternative(render_template("lembrete_renovacao.html", nome_membro=member_details['NOME'].split(' ')[0]), subtype='html')
+    return msg
+
+def build_tag_digest_email(recipient_email: str, nome: str, noticias: list, base_url: str, sender_email: str = None):
+    """Monta o email com o resumo das notícias novas nas tags seguidas pelo membro."""
+    msg = EmailMessage()
+    msg['Subject'] = f"{len(noticias)} novidade(s) nas suas tags seguidas"
+    if sender_email: msg['From'] = sender_email
+    msg['To'] = recipient_email
+    html_content = render_template(
+        "digest_tags.html",
+        nome_membro=(nome or 'Membro').split(' ')[0],
+        noticias=noticias,
+        noticias_url=f"{base_url}/Notícias",
+    )
+    msg.add_alternative(html_content, subtype='html')
+    return msg
+
+def _send_single(msg, email_creds: dict, pool=None):
+    """Envia uma mensagem pelo pool informado ou, na falta dele, por uma conexão avulsa."""
+    if pool is not None:
+        pool.send(msg)
+        return
+    with SMTPPool(email_creds, pool_size=1, max_por_segundo=0) as avulso:
+        avulso.send(msg)
+
+def send_recovery_email(recipient_email: str, token: str, email_config: dict, pool=None):
+    """
+    Envia um email de recuperação de senha para o usuário.
+    Agora recebe as credenciais e a URL base como um dicionário.
+    """
+    try:
+        msg = build_recovery_email(recipient_email, token, email_config["base_url"], email_config["email_address"])
+        _send_single(msg, email_config, pool)
         return True
     except Exception as e:
         # Verifica se o erro é de autenticação SMTP
@@ -107,89 +281,29 @@ def send_due_date_reminder_email(recipient_email: str, charge_details: dict, ema
             st.error(f"Erro ao enviar email: {e}")
         return False
 
-def send_due_date_reminder_email(recipient_email: str, charge_details: dict, email_creds: dict):
+def send_due_date_reminder_email(recipient_email: str, charge_details: dict, email_creds: dict, pool=None):
     """
     Envia um email de lembrete de vencimento de cobrança.
     Agora recebe as credenciais como um dicionário.
     """
     try:
-        sender_email = email_creds["email_address"]
-        sender_password = email_creds["email_password"]
-
-        msg = EmailMessage()
-        msg['Subject'] = f"Lembrete de Vencimento: {charge_details['DESCRICAO']}"
-        msg['From'] = sender_email
-        msg['To'] = recipient_email
-        
-        nome_membro = charge_details.get('NOME', 'Membro').split(' ')[0]
-        valor_formatado = f"R$ {charge_details['VALOR']:.2f}".replace('.', ',')
-        # A data pode vir como string ou objeto date, então garantimos a conversão
-        data_vencimento_formatada = pd.to_datetime(charge_details['DATA_VENCIMENTO']).strftime('%d/%m/%Y') 
-
-        html_content = f"""
-        <html>
-        <body>
-            <h2>Lembrete de Vencimento</h2>
-            <p>Olá, {nome_membro},</p>
-            <p>Este é um lembrete amigável sobre a sua cobrança que está próxima do vencimento:</p>
-            <ul>
-                <li><strong>Descrição:</strong> {charge_details['DESCRICAO']}</li>
-                <li><strong>Valor:</strong> {valor_formatado}</li>
-                <li><strong>Data de Vencimento:</strong> {data_vencimento_formatada}</li>
-            </ul>
-            <p>Por favor, realize o pagamento para evitar inconvenientes. Você pode ver mais detalhes em sua área de membro.</p>
-            <br>
-            <p>Atenciosamente,</p>
-            <p>Equipe da Associação</p>
-        </body>
-        </html>
-        """
-        msg.add_alternative(html_content, subtype='html')
-
-        with smtplib.SMTP_SSL('smtp.gmail.com', 465) as smtp:
-            smtp.login(sender_email, sender_password)
-            smtp.send_message(msg)
+        msg = build_due_date_reminder_email(recipient_email, charge_details, email_creds["email_address"])
+        _send_single(msg, email_creds, pool)
         return True
     except Exception as e:
         # Usamos print para que o erro apareça no console/log da tarefa agendada
         print(f"ERRO: Falha ao enviar email de lembrete para {recipient_email}. Detalhes: {e}")
         return False
 
-def send_renewal_reminder_email(recipient_email: str, member_details: dict, email_creds: dict):
+def send_renewal_reminder_email(recipient_email: str, member_details: dict, email_creds: dict, pool=None):
     """
     Envia um email de lembrete de renovação de anuidade.
     Agora recebe as credenciais como um dicionário.
     """
     try:
-        sender_email = email_creds["email_address"]
-        sender_password = email_creds["email_password"]
-
-        msg = EmailMessage()
-        msg['Subject'] = "Lembrete de Aniversário de Associação!"
-        msg['From'] = sender_email
-        msg['To'] = recipient_email
-
-        html_content = f"""
-        <html>
-        <body>
-            <h2>Feliz Aniversário de Associação, {member_details['NOME'].split(' ')[0]}!</h2>
-            <p>Olá,</p>
-            <p>Gostaríamos de parabenizá-lo pelo seu aniversário em nossa associação! Agradecemos por fazer parte da nossa comunidade.</p>
-            <p>Este é um lembrete amigável para a renovação da sua anuidade, que ajuda a manter todos os benefícios que você já conhece.</p>
-            <p>Para qualquer dúvida, entre em contato conosco.</p>
-            <br>
-            <p>Atenciosamente,</p>
-            <p>Equipe da Associação</p>
-        </body>
-        </html>
-        """
-        msg.add_alternative(html_content, subtype='html')
-
-        with smtplib.SMTP_SSL('smtp.gmail.com', 465) as smtp:
-            smtp.login(sender_email, sender_password)
-            smtp.send_message(msg)
+        msg = build_renewal_reminder_email(recipient_email, member_details, email_creds["email_address"])
+        _send_single(msg, email_creds, pool)
         return True
     except Exception as e:
         st.error(f"Erro ao enviar email de renovação: {e}")
         return False
-
@@ -1,7 +1,52 @@
 import pandas as pd
 from io import BytesIO
 import os
-from datetime import datetime
+import hashlib
+import tempfile
+import functools
+import contextlib
+import sqlalchemy
+import toml
+from storage import get_storage
+
+# Os uploads são armazenados por conteúdo (SHA-256): arquivos idênticos viram um único blob,
+# com uma URL estável e cacheável pelo navegador. O destino (disco local ou S3) é definido em storage.py.
+SECRETS_PATH = '.streamlit/secrets.toml'
+CHUNK_SIZE = 1024 * 1024
+SPOOL_MAX_SIZE = 1024 * 1024
+
+# Limites padrão por subpasta, em MB. Podem ser sobrescritos na seção [uploads] do secrets.toml
+# (ex.: max_mb_contratos = 5, max_mb_padrao = 8).
+UPLOAD_LIMITS_MB = {
+    "contratos": 10,
+    "galeria": 20,
+    "padrao": 10,
+}
+
+# Subpastas com documentos pessoais (CPF, endereço, assinatura). Vão para o armazenamento privado,
+# fora da pasta estática, e só são lidas pela área administrativa (ver read_private_file).
+PRIVATE_SUBFOLDERS = ("contratos",)
+
+# Colunas que guardam caminhos/URLs de arquivos enviados.
+UPLOAD_URL_COLUMNS = {
+    "convenios": ["IMAGEM_URL", "ICON_URL"],
+    "noticias": ["IMAGEM_URL"],
+    "eventos": ["IMAGEM_URL"],
+    "galeria_fotos": ["IMAGEM_URL", "MINIATURA_URL"],
+    "usuarios": ["CONTRATO_ASSINADO_URL"],
+    "institucional": ["LOGO_URL"],
+}
+
+UPLOAD_BLOBS_DDL = """
+CREATE TABLE IF NOT EXISTS upload_blobs (
+    "HASH" TEXT PRIMARY KEY,
+    "CAMINHO" TEXT NOT NULL,
+    "TAMANHO" BIGINT NOT NULL,
+    "REFERENCIAS" INTEGER NOT NULL DEFAULT 0,
+    "ORIGEM" TEXT,
+    "DATA_CRIACAO" TIMESTAMP NOT NULL DEFAULT now()
+)
+"""
 
 def dataframe_to_excel_bytes(df):
     """Converte um pandas DataFrame para um arquivo Excel em memória (bytes)."""
@@ -12,20 +57,213 @@ def dataframe_to_excel_bytes(df):
     processed_data = output.getvalue()
     return processed_data
 
-def save_uploaded_file(uploaded_file, subfolder="convenios"):
-    """Salva um arquivo enviado em uma subpasta de 'uploads' e retorna o caminho."""
-    upload_dir = os.path.join("uploads", subfolder)
-    if not os.path.exists(upload_dir):
-        os.makedirs(upload_dir)
-    
-    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-    filename, extension = os.path.splitext(uploaded_file.name)
-    unique_filename = f"{filename}_{timestamp}{extension}"
-    
-    filepath = os.path.join(upload_dir, unique_filename)
-    with open(filepath, "wb") as f:
-        f.write(uploaded_file.getbuffer())
-    return filepath.replace("\\", "/")
+def _get_connection():
+    """Importa a conexão sob demanda para que scripts possam usar o módulo passando a própria conexão."""
+    from auth import get_db_connection
+    return get_db_connection()
+
+def blob_key(digest, extension):
+    """Retorna a chave do blob no armazenamento para um hash de conteúdo."""
+    return f"{digest[:2]}/{digest}{extension.lower()}"
+
+def blob_path(digest, extension, privado=False):
+    """Retorna a referência gravada no banco para um hash de conteúdo."""
+    return get_storage(privado).reference(blob_key(digest, extension))
+
+def locate_blob(path):
+    """Retorna (armazenamento, chave) da referência, procurando no público e no privado, ou (None, None)."""
+    for privado in (False, True):
+        storage = get_storage(privado)
+        key = storage.key_from_reference(path)
+        if key is not None:
+            return storage, key
+    return None, None
+
+def is_blob_path(path):
+    """Indica se a referência aponta para o armazenamento por conteúdo (público ou privado)."""
+    return locate_blob(path)[1] is not None
+
+def read_private_file(path):
+    """Lê um arquivo do armazenamento privado (para download na área administrativa), ou None.
+
+    Aceita também os caminhos antigos em 'uploads/', que nunca foram servidos pelo static serving.
+    """
+    if not isinstance(path, str):
+        return None
+    storage = get_storage(privado=True)
+    key = storage.key_from_reference(path)
+    if key is not None:
+        if not storage.exists(key):
+            return None
+        f = storage.open(key)
+        try:
+            return f.read()
+        finally:
+            f.close()
+    path = os.path.normpath(path).replace("\\", "/")
+    if path.startswith("uploads/") and os.path.isfile(path):
+        with open(path, "rb") as f:
+            return f.read()
+    return None
+
+def public_url(path):
+    """Converte a referência salva no banco em uma URL acessível pelo navegador (para uso em HTML)."""
+    key = get_storage().key_from_reference(path)
+    return get_storage().url(key) if key is not None else path
+
+def blob_reference(url):
+    """Inverso de public_url: converte uma URL de blob (estática ou pré-assinada) na referência gravada no banco."""
+    key = get_storage().key_from_reference(url)
+    return get_storage().reference(key) if key is not None else url
+
+def media_url(path):
+    """Converte a referência salva no banco no valor esperado pelo st.image."""
+    key = get_storage().key_from_reference(path)
+    return get_storage().media_url(key) if key is not None else path
+
+class UploadTooLargeError(ValueError):
+    """Erro lançado quando um upload excede o limite de tamanho configurado."""
+
+class UploadReferenceError(RuntimeError):
+    """Erro lançado quando não é possível registrar a referência de um upload em upload_blobs."""
+
+@functools.lru_cache(maxsize=None)
+def get_upload_limit(subfolder):
+    """Retorna o tamanho máximo, em bytes, aceito para uploads de uma subpasta."""
+    try:
+        config = toml.load(SECRETS_PATH).get("uploads", {})
+    except (FileNotFoundError, toml.TomlDecodeError):
+        config = {}
+    default_mb = config.get("max_mb_padrao", UPLOAD_LIMITS_MB["padrao"])
+    limit_mb = config.get(f"max_mb_{subfolder}", UPLOAD_LIMITS_MB.get(subfolder, default_mb))
+    return int(limit_mb * 1024 * 1024)
+
+def store_blob(source, extension, max_bytes=None, privado=False):
+    """Grava bytes ou um arquivo no armazenamento por conteúdo, em blocos, e retorna (referência, hash, tamanho).
+
+    O conteúdo passa por um arquivo temporário (em memória até 1 MB) enquanto o hash é calculado;
+    só então é enviado ao armazenamento, que grava o destino de forma atômica. Com privado=True o
+    blob vai para o armazenamento privado, que não é servido por URL.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = BytesIO(source)
+    elif hasattr(source, "seek"):
+        source.seek(0)
+
+    hasher = hashlib.sha256()
+    size = 0
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as spool:
+        while chunk := source.read(CHUNK_SIZE):
+            size += len(chunk)
+            if max_bytes is not None and size > max_bytes:
+                raise UploadTooLargeError(f"O arquivo excede o limite de {max_bytes / 1024 / 1024:.0f} MB.")
+            hasher.update(chunk)
+            spool.write(chunk)
+        digest = hasher.hexdigest()
+        storage = get_storage(privado)
+        key = blob_key(digest, extension)
+        if storage.exists(key):
+            # Reaproveitado: renova a data para o gc_uploads não apagá-lo antes de a referência ser gravada.
+            storage.touch(key)
+        else:
+            spool.seek(0)
+            storage.put(key, spool)
+    return storage.reference(key), digest, size
+
+def existing_upload_columns(conn):
+    """Retorna os pares (tabela, coluna) de UPLOAD_URL_COLUMNS que existem no banco."""
+    query = sqlalchemy.text("""
+        SELECT table_name, column_name FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = ANY(:tables)
+    """)
+    existentes = set(map(tuple, conn.execute(query, {"tables": list(UPLOAD_URL_COLUMNS)}).fetchall()))
+    return [(table, column) for table, columns in UPLOAD_URL_COLUMNS.items()
+            for column in columns if (table, column) in existentes]
+
+def _transacao(conn):
+    """Transação própria, ou a corrente do chamador, se ele já estiver numa."""
+    return contextlib.nullcontext() if conn.in_transaction() else conn.begin()
+
+def ensure_upload_blobs_table(conn):
+    """Cria a tabela de contagem de referências dos blobs, se necessário."""
+    with _transacao(conn):
+        conn.execute(sqlalchemy.text(UPLOAD_BLOBS_DDL))
+
+def add_blob_references(blobs, conn=None):
+    """Incrementa, em uma única transação, as referências de vários blobs (caminho, hash, tamanho, origem).
+
+    Se a conexão do chamador já estiver numa transação, participa dela e propaga os erros, para que
+    as referências e as linhas que as usam sejam gravadas (ou descartadas) juntas.
+    """
+    if not blobs: return True
+    own_conn = conn is None
+    conn = conn or _get_connection()
+    if conn is None: return False
+    do_chamador = conn.in_transaction()
+    try:
+        ensure_upload_blobs_table(conn)
+        query = sqlalchemy.text("""
+            INSERT INTO upload_blobs ("HASH", "CAMINHO", "TAMANHO", "REFERENCIAS", "ORIGEM")
+            VALUES (:hash, :caminho, :tamanho, 1, :origem)
+            ON CONFLICT ("HASH") DO UPDATE SET "REFERENCIAS" = upload_blobs."REFERENCIAS" + 1
+        """)
+        params = [{"caminho": caminho, "hash": digest, "tamanho": size, "origem": origem}
+                  for caminho, digest, size, origem in blobs]
+        with _transacao(conn):
+            conn.execute(query, params)
+        return True
+    except Exception as e:
+        if do_chamador:
+            raise
+        print(f"Erro ao registrar referências de blobs: {e}")
+        return False
+    finally:
+        if own_conn: conn.close()
+
+def add_blob_reference(filepath, digest, size, origem=None, conn=None):
+    """Incrementa a contagem de referências de um blob."""
+    return add_blob_references([(filepath, digest, size, origem)], conn=conn)
+
+def release_uploaded_file(filepath, conn=None):
+    """Decrementa as referências de um blob e remove o arquivo quando não houver mais nenhuma."""
+    storage, key = locate_blob(filepath)
+    if key is None:
+        return False
+    own_conn = conn is None
+    conn = conn or _get_connection()
+    if conn is None: return False
+    try:
+        with conn.begin():
+            result = conn.execute(sqlalchemy.text("""
+                UPDATE upload_blobs SET "REFERENCIAS" = "REFERENCIAS" - 1
+                WHERE "CAMINHO" = :caminho
+                RETURNING "REFERENCIAS"
+            """), {"caminho": filepath}).first()
+            if result is None or result[0] > 0:
+                return False
+            conn.execute(sqlalchemy.text('DELETE FROM upload_blobs WHERE "CAMINHO" = :caminho'), {"caminho": filepath})
+        storage.delete(key)
+        return True
+    except Exception as e:
+        print(f"Erro ao liberar o blob {filepath}: {e}")
+        return False
+    finally:
+        if own_conn: conn.close()
+
+def save_uploaded_file(uploaded_file, subfolder="convenios", max_bytes=None, atual=None):
+    """Salva um arquivo enviado no armazenamento por conteúdo e retorna o caminho do blob.
+
+    'atual' é o caminho que o registro já guarda: se o conteúdo enviado for o mesmo, o caminho não
+    muda e a referência não é contada de novo (o chamador também não libera a antiga).
+    """
+    _, extension = os.path.splitext(uploaded_file.name)
+    filepath, digest, size = store_blob(uploaded_file, extension, max_bytes or get_upload_limit(subfolder),
+                                        privado=subfolder in PRIVATE_SUBFOLDERS)
+    if filepath == atual:
+        return filepath
+    if not add_blob_reference(filepath, digest, size, origem=subfolder):
+        raise UploadReferenceError("Não foi possível registrar o arquivo enviado. Tente novamente.")
+    return filepath
 
 def get_convenios_df():
     """Lê o arquivo de convênios e o retorna como um DataFrame."""
@@ -0,0 +1,161 @@
+import os
+import shutil
+import hashlib
+import multiprocessing
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from PIL import Image, ImageOps
+import sqlalchemy
+from file_utils import store_blob, add_blob_references, get_upload_limit, CHUNK_SIZE
+
+EXTENSOES_IMAGEM = {'.jpg', '.jpeg', '.png', '.webp', '.gif'}
+TAMANHO_MINIATURA = (400, 400)
+MAX_PIXELS = 40_000_000
+MAX_WORKERS = 4
+
+# As fotos nunca ficam inteiras na memória do servidor: cada uma é copiada em blocos para uma pasta
+# temporária (calculando o hash no caminho) e os processos do pool recebem só os caminhos. A coluna
+# MINIATURA_URL vem da migração 012 (migracoes.py).
+
+def _copiar(origem, pasta, max_bytes):
+    """Copia o arquivo em blocos para a pasta e retorna (caminho, hash), ou None se passar do limite."""
+    hasher = hashlib.sha256()
+    tamanho = 0
+    destino = tempfile.NamedTemporaryFile(dir=pasta, delete=False)
+    with destino:
+        while chunk := origem.read(CHUNK_SIZE):
+            tamanho += len(chunk)
+            if tamanho > max_bytes:
+                break
+            hasher.update(chunk)
+            destino.write(chunk)
+    if tamanho > max_bytes:
+        os.remove(destino.name)
+        return None
+    return destino.name, hasher.hexdigest()
+
+def expandir_arquivos(arquivos, pasta, max_bytes):
+    """Gera (nome, caminho, hash) para cada imagem enviada, abrindo os arquivos ZIP. Imagens acima do limite vêm com caminho None."""
+    for arquivo in arquivos:
+        nome = os.path.basename(arquivo.name)
+        if nome.lower().endswith('.zip'):
+            with zipfile.ZipFile(arquivo) as zf:
+                for info in zf.infolist():
+                    nome_interno = os.path.basename(info.filename)
+                    if info.is_dir() or info.filename.startswith('__MACOSX/') or nome_interno.startswith('.'):
+                        continue
+                    if os.path.splitext(nome_interno)[1].lower() not in EXTENSOES_IMAGEM:
+                        continue
+                    if info.file_size > max_bytes:
+                        yield nome_interno, None, None
+                        continue
+                    with zf.open(info) as membro:
+                        copia = _copiar(membro, pasta, max_bytes)
+                    yield (nome_interno, *copia) if copia else (nome_interno, None, None)
+        elif os.path.splitext(nome)[1].lower() in EXTENSOES_IMAGEM:
+            arquivo.seek(0)
+            copia = _copiar(arquivo, pasta, max_bytes)
+            yield (nome, *copia) if copia else (nome, None, None)
+
+def processar_imagem(nome, caminho):
+    """Decodifica e valida uma imagem e grava sua miniatura em JPEG ao lado dela. Executado no pool de processos."""
+    try:
+        with Image.open(caminho) as img:
+            img.verify()
+        with Image.open(caminho) as img:
+            if img.width * img.height > MAX_PIXELS:
+                return {"nome": nome, "erro": "imagem grande demais"}
+            img = ImageOps.exif_transpose(img)
+            img.thumbnail(TAMANHO_MINIATURA)
+            miniatura = f"{caminho}.miniatura.jpg"
+            img.convert("RGB").save(miniatura, format="JPEG", quality=85, optimize=True)
+        return {"nome": nome, "miniatura": miniatura, "erro": None}
+    except Exception as e:
+        return {"nome": nome, "erro": str(e)}
+
+def _processar_todas(pendentes, max_workers):
+    """Gera (hash, resultado) de cada imagem pelo pool; se o pool quebrar, processa as restantes aqui mesmo."""
+    restantes = dict(pendentes)
+    try:
+        # spawn: os processos não herdam a memória (nem as threads) do servidor Streamlit.
+        with ProcessPoolExecutor(max_workers=max_workers or MAX_WORKERS,
+                                 mp_context=multiprocessing.get_context("spawn")) as executor:
+            futures = {executor.submit(processar_imagem, nome, caminho): digest
+                       for digest, (nome, caminho) in pendentes.items()}
+            for future in as_completed(futures):
+                digest = futures[future]
+                resultado = future.result()
+                del restantes[digest]
+                yield digest, resultado
+    except BrokenProcessPool as e:
+        # Um processo morreu (ex.: sem memória numa imagem patológica); o resto segue sem o pool.
+        print(f"Pool de processos da galeria interrompido ({e}); processando {len(restantes)} imagem(ns) em série.")
+    for digest, (nome, caminho) in list(restantes.items()):
+        yield digest, processar_imagem(nome, caminho)
+
+def ingerir_galeria(conn, noticia_id, arquivos, legenda=None, progress_callback=None, max_workers=None):
+    """Importa várias fotos (ou ZIPs) para a galeria de uma notícia, em paralelo e com inserção em lote."""
+    with conn.begin():
+        existentes = {row[0] for row in conn.execute(
+            sqlalchemy.text('SELECT "IMAGEM_URL" FROM galeria_fotos WHERE "NOTICIA_ID" = :noticia_id'),
+            {"noticia_id": noticia_id}
+        )}
+
+    pasta = tempfile.mkdtemp(prefix="galeria_")
+    try:
+        # Deduplica pelo hash antes de decodificar: o SHA-256 é calculado durante a cópia, bem mais barato que abrir a imagem.
+        pendentes, duplicadas, erros = {}, 0, []
+        max_bytes = get_upload_limit("galeria")
+        for nome, caminho, digest in expandir_arquivos(arquivos, pasta, max_bytes):
+            if caminho is None:
+                erros.append(f"{nome}: excede o limite de {max_bytes / 1024 / 1024:.0f} MB")
+                continue
+            if digest in pendentes:
+                os.remove(caminho)
+                duplicadas += 1
+                continue
+            pendentes[digest] = (nome, caminho)
+
+        total = len(pendentes)
+        resultado = {"importadas": 0, "duplicadas": duplicadas, "erros": erros}
+        blobs, linhas = [], []
+
+        for concluidas, (digest, processada) in enumerate(_processar_todas(pendentes, max_workers), start=1):
+            nome, caminho = pendentes[digest]
+            if processada["erro"]:
+                resultado["erros"].append(f"{nome}: {processada['erro']}")
+            else:
+                with open(caminho, "rb") as origem:
+                    imagem_url, _, tamanho = store_blob(origem, os.path.splitext(nome)[1])
+                if imagem_url in existentes:
+                    resultado["duplicadas"] += 1
+                else:
+                    with open(processada["miniatura"], "rb") as origem:
+                        miniatura_url, miniatura_hash, miniatura_tamanho = store_blob(origem, ".jpg")
+                    blobs.append((imagem_url, digest, tamanho, "galeria"))
+                    blobs.append((miniatura_url, miniatura_hash, miniatura_tamanho, "galeria"))
+                    linhas.append({
+                        "noticia_id": noticia_id,
+                        "imagem_url": imagem_url,
+                        "miniatura_url": miniatura_url,
+                        "legenda": legenda or os.path.splitext(nome)[0],
+                    })
+                    existentes.add(imagem_url)
+            if progress_callback:
+                progress_callback(concluidas, total)
+    finally:
+        shutil.rmtree(pasta, ignore_errors=True)
+
+    if linhas:
+        query = sqlalchemy.text("""
+            INSERT INTO galeria_fotos ("NOTICIA_ID", "IMAGEM_URL", "MINIATURA_URL", "LEGENDA")
+            VALUES (:noticia_id, :imagem_url, :miniatura_url, :legenda)
+        """)
+        # Referências e linhas na mesma transação: se o INSERT falhar, as contagens não sobem à toa.
+        with conn.begin():
+            add_blob_references(blobs, conn=conn)
+            conn.execute(query, linhas)
+        resultado["importadas"] = len(linhas)
+    return resultado
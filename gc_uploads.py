@@ -0,0 +1,164 @@
+import argparse
+import html as html_lib
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import sqlalchemy
+from db_utils import get_postgres_engine
+from file_utils import existing_upload_columns
+from html_utils import RICH_TEXT_COLUMNS, CONTEUDO_PROCESSADO_COLUMNS, IMG_SRC_RE
+from storage import get_storage
+
+LEGACY_UPLOADS_DIR = 'uploads'
+DIAS_CARENCIA_PADRAO = 7
+
+def _stream(conn, query):
+    """Executa a consulta com cursor no servidor, sem carregar o resultado inteiro na memória."""
+    return conn.execution_options(stream_results=True, yield_per=1000).execute(sqlalchemy.text(query))
+
+def coletar_referencias(conn):
+    """Monta o conjunto de caminhos e chaves de blobs referenciados por alguma linha do banco."""
+    storage, privado = get_storage(), get_storage(privado=True)
+    referencias = set()
+
+    def registrar(valor):
+        valor = valor.replace("\\", "/")
+        key = storage.key_from_reference(valor)
+        if key is not None:
+            referencias.add(("blob", key))
+        elif (key := privado.key_from_reference(valor)) is not None:
+            referencias.add(("privado", key))
+        else:
+            referencias.add(("legado", valor))
+
+    with conn.begin():
+        for table, column in existing_upload_columns(conn):
+            for (valor,) in _stream(conn, f'SELECT DISTINCT "{column}" FROM {table} WHERE "{column}" IS NOT NULL'):
+                registrar(valor)
+
+        colunas_html = [(table, column) for table, _, column in RICH_TEXT_COLUMNS]
+        colunas_html += [(table, col_html) for table, _, col_html, _, _ in CONTEUDO_PROCESSADO_COLUMNS]
+        existentes = set(map(tuple, conn.execute(sqlalchemy.text(
+            "SELECT table_name, column_name FROM information_schema.columns WHERE table_schema = current_schema()"
+        )).fetchall()))
+        for table, column in colunas_html:
+            if (table, column) not in existentes:
+                continue
+            query = f'SELECT "{column}" FROM {table} WHERE "{column}" LIKE \'%<img%\''
+            for (html,) in _stream(conn, query):
+                for _, _, src in IMG_SRC_RE.findall(html):
+                    registrar(html_lib.unescape(src))
+    return referencias
+
+def _varrer_diretorio(path):
+    """Lista recursivamente os arquivos de um diretório com os.scandir (tamanho e mtime)."""
+    arquivos = []
+    pilha = [path]
+    while pilha:
+        with os.scandir(pilha.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    pilha.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    stat = entry.stat()
+                    arquivos.append((entry.path.replace("\\", "/"), stat.st_size, stat.st_mtime))
+    return arquivos
+
+def listar_arquivos(max_workers=8):
+    """Percorre em paralelo a pasta de uploads antiga e os armazenamentos de blobs (público e privado)."""
+    storage, privado = get_storage(), get_storage(privado=True)
+    subdirs = []
+    if os.path.isdir(LEGACY_UPLOADS_DIR):
+        subdirs = [entry.path for entry in os.scandir(LEGACY_UPLOADS_DIR) if entry.is_dir()]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futuro_blobs = executor.submit(lambda: list(storage.iter_keys()))
+        futuro_privados = executor.submit(lambda: list(privado.iter_keys()))
+        for arquivos in executor.map(_varrer_diretorio, subdirs):
+            for path, size, mtime in arquivos:
+                yield ("legado", path), size, mtime
+        for key, size, mtime in futuro_blobs.result():
+            yield ("blob", key), size, mtime
+        for key, size, mtime in futuro_privados.result():
+            yield ("privado", key), size, mtime
+
+def remover(conn, candidatos, limite):
+    """Apaga os arquivos órfãos e as respectivas linhas de contagem de referências. Retorna quantos apagou.
+
+    Entre a coleta das referências e este ponto um upload pode ter reaproveitado o blob. Por isso cada
+    blob é conferido de novo, com a linha de upload_blobs travada: se voltou a ter referências ou foi
+    modificado depois do limite de carência (store_blob renova a data ao reaproveitar), é mantido.
+    """
+    armazenamentos = {"blob": get_storage(), "privado": get_storage(privado=True)}
+    with conn.begin():
+        tem_contagem = conn.execute(sqlalchemy.text("SELECT to_regclass('upload_blobs') IS NOT NULL")).scalar()
+    removidos = 0
+    for (tipo, valor), _, _ in candidatos:
+        if tipo not in armazenamentos:
+            if os.path.exists(valor) and os.path.getmtime(valor) <= limite:
+                os.remove(valor)
+                removidos += 1
+            continue
+        storage = armazenamentos[tipo]
+        caminho = storage.reference(valor)
+        with conn.begin():
+            if tem_contagem:
+                referencias = conn.execute(sqlalchemy.text(
+                    'SELECT "REFERENCIAS" FROM upload_blobs WHERE "CAMINHO" = :caminho FOR UPDATE'
+                ), {"caminho": caminho}).scalar()
+                if referencias:
+                    continue
+            mtime = storage.mtime(valor)
+            if mtime is not None and mtime > limite:
+                continue
+            storage.delete(valor)
+            if tem_contagem:
+                conn.execute(sqlalchemy.text('DELETE FROM upload_blobs WHERE "CAMINHO" = :caminho'), {"caminho": caminho})
+        removidos += 1
+    return removidos
+
+def main():
+    """Identifica (e opcionalmente remove) os uploads que nenhuma linha do banco referencia mais."""
+    parser = argparse.ArgumentParser(description="Coleta de lixo dos arquivos enviados.")
+    parser.add_argument("--remover", action="store_true", help="Apaga os arquivos órfãos (padrão: apenas relatório).")
+    parser.add_argument("--dias-carencia", type=int, default=DIAS_CARENCIA_PADRAO,
+                        help="Ignora arquivos modificados há menos dias que isso.")
+    parser.add_argument("--workers", type=int, default=8, help="Número de threads na varredura.")
+    args = parser.parse_args()
+
+    engine = get_postgres_engine()
+    if engine is None:
+        print("Não foi possível conectar à base de dados. Verifique o seu ficheiro secrets.toml.")
+        return
+
+    limite = time.time() - args.dias_carencia * 86400
+    with engine.connect() as conn:
+        referencias = coletar_referencias(conn)
+        print(f"{len(referencias)} arquivo(s) referenciado(s) no banco.")
+
+        total = orfaos_recentes = 0
+        candidatos = []
+        for identificador, size, mtime in listar_arquivos(args.workers):
+            total += 1
+            if identificador in referencias:
+                continue
+            if mtime > limite:
+                orfaos_recentes += 1
+            else:
+                candidatos.append((identificador, size, mtime))
+
+        bytes_orfaos = sum(size for _, size, _ in candidatos)
+        print(f"{total} arquivo(s) encontrado(s).")
+        print(f"{orfaos_recentes} órfão(s) dentro do período de carência de {args.dias_carencia} dia(s) (mantidos).")
+        print(f"{len(candidatos)} órfão(s) elegível(is), {bytes_orfaos / 1024 / 1024:.1f} MB.")
+        for (_, valor), size, _ in sorted(candidatos, key=lambda c: -c[1])[:20]:
+            print(f"  - {valor} ({size / 1024:.0f} KB)")
+
+        if args.remover:
+            removidos = remover(conn, candidatos, limite)
+            print(f"{removidos} arquivo(s) removido(s); {len(candidatos) - removidos} mantido(s) por terem voltado a ser usados.")
+        else:
+            print("Execução de simulação. Use --remover para apagar os arquivos.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+import re
+import base64
+import binascii
+import html as html_lib
+from html.parser import HTMLParser
+from file_utils import store_blob, add_blob_references, get_upload_limit, public_url, blob_reference, is_blob_path
+
+# Colunas com HTML produzido pelo editor rico (st_quill): (tabela, chave primária, coluna).
+RICH_TEXT_COLUMNS = [
+    ("noticias", "ID", "CONTEUDO"),
+    ("convenios", "CONVENIO_ID", "DESCRICAO"),
+    ("eventos", "EVENTO_ID", "DESCRICAO"),
+    ("parceiros", "PARCEIRO_ID", "DETALHES"),
+    ("servicos", "SERVICO_ID", "DESCRICAO_SERVICO"),
+    ("beneficios", "BENEFICIO_ID", "DESCRICAO_BENEFICIO"),
+]
+
+# Colunas derivadas gravadas junto ao HTML de origem: (tabela, coluna de origem, html, texto, resumo).
+CONTEUDO_PROCESSADO_COLUMNS = [
+    ("noticias", "CONTEUDO", "CONTEUDO_HTML", "CONTEUDO_TEXTO", "RESUMO"),
+    ("faq", "RESPOSTA", "RESPOSTA_HTML", "RESPOSTA_TEXTO", "RESUMO"),
+]
+
+RESUMO_LIMITE = 240
+
+TAGS_PERMITIDAS = {
+    "p", "br", "strong", "b", "em", "i", "u", "s", "a", "ul", "ol", "li", "blockquote", "pre", "code",
+    "h1", "h2", "h3", "h4", "h5", "h6", "img", "span", "div", "sub", "sup", "hr",
+}
+TAGS_VAZIAS = {"br", "img", "hr"}
+TAGS_DESCARTADAS = {"script", "style", "iframe", "object", "embed", "noscript", "template"}
+TAGS_BLOCO = {"p", "div", "li", "br", "blockquote", "pre", "h1", "h2", "h3", "h4", "h5", "h6", "hr"}
+ATRIBUTOS_PERMITIDOS = {
+    "a": {"href", "target"},
+    "img": {"src", "alt", "width", "height"},
+    "*": {"class"},
+}
+# "s3://" aparece nas imagens extraídas para um bucket: a referência é trocada por uma URL em resolver_imagens.
+ESQUEMAS_PERMITIDOS = ("http://", "https://", "mailto:", "tel:", "app/static/", "s3://", "/", "#")
+
+EXTENSOES_DATA_URI = {"png": ".png", "jpeg": ".jpg", "jpg": ".jpg", "gif": ".gif", "webp": ".webp"}
+
+IMG_SRC_RE = re.compile(r'(<img\b[^>]*?\bsrc\s*=\s*)(["\'])(.*?)\2', re.IGNORECASE)
+
+DATA_URI_IMG_RE = re.compile(
+    r'(<img\b[^>]*?\bsrc\s*=\s*)(["\'])data:image/(png|jpe?g|gif|webp);base64,([A-Za-z0-9+/=\s]+)\2',
+    re.IGNORECASE,
+)
+
+def extrair_imagens_base64(html, subfolder="conteudo", conn=None):
+    """Move as imagens embutidas como data URI para o armazenamento de uploads.
+
+    O src passa a ser a referência do blob (a mesma gravada nas colunas de upload), não uma URL: com
+    S3 a URL pode ser pré-assinada e expirar. A URL é gerada na exibição, por resolver_imagens.
+    Retorna (html reescrito, número de imagens extraídas, bytes economizados no HTML).
+    """
+    if not isinstance(html, str) or "data:image/" not in html:
+        return html, 0, 0
+
+    blobs = []
+    max_bytes = get_upload_limit(subfolder)
+
+    def substituir(match):
+        prefixo, aspas, formato, dados = match.groups()
+        try:
+            conteudo = base64.b64decode(re.sub(r"\s+", "", dados), validate=True)
+        except (binascii.Error, ValueError):
+            return match.group(0)
+        if len(conteudo) > max_bytes:
+            return match.group(0)
+        caminho, digest, tamanho = store_blob(conteudo, EXTENSOES_DATA_URI[formato.lower()])
+        blobs.append((caminho, digest, tamanho, subfolder))
+        return f"{prefixo}{aspas}{caminho}{aspas}"
+
+    novo_html = DATA_URI_IMG_RE.sub(substituir, html)
+    if blobs:
+        add_blob_references(blobs, conn=conn)
+    return novo_html, len(blobs), len(html) - len(novo_html)
+
+def resolver_imagens(html):
+    """Troca as referências de blobs nos src das imagens pelas URLs atuais do armazenamento.
+
+    Deve ser chamada na exibição, fora do st.cache_data, para que URLs pré-assinadas não expirem no cache.
+    """
+    if not isinstance(html, str):
+        return ""
+    if "<img" not in html.lower():
+        return html
+
+    def substituir(match):
+        prefixo, aspas, src = match.groups()
+        return f"{prefixo}{aspas}{html_lib.escape(public_url(html_lib.unescape(src)), quote=True)}{aspas}"
+
+    return IMG_SRC_RE.sub(substituir, html)
+
+def referenciar_imagens(html):
+    """Inverso de resolver_imagens: volta as URLs de blobs do HTML editado para as referências.
+
+    Usada ao salvar o HTML que foi aberto no editor já com as URLs resolvidas.
+    """
+    if not isinstance(html, str) or "<img" not in html.lower():
+        return html
+
+    def substituir(match):
+        prefixo, aspas, src = match.groups()
+        return f"{prefixo}{aspas}{html_lib.escape(blob_reference(html_lib.unescape(src)), quote=True)}{aspas}"
+
+    return IMG_SRC_RE.sub(substituir, html)
+
+def imagens_referenciadas(html):
+    """Referências de blobs nos src das imagens do HTML, uma por ocorrência (como contadas por extrair_imagens_base64).
+
+    Usada para liberar os blobs quando o registro é excluído ou a imagem sai do texto.
+    """
+    if not isinstance(html, str) or "<img" not in html.lower():
+        return []
+    return [src for _, _, valor in IMG_SRC_RE.findall(html) if is_blob_path(src := html_lib.unescape(valor))]
+
+def _url_segura(url):
+    """Aceita apenas URLs relativas ou de esquemas conhecidos (bloqueia javascript:, data:, etc.)."""
+    # Navegadores ignoram espaços e caracteres de controle dentro do esquema ("java\tscript:").
+    url = re.sub(r"[\x00-\x20]", "", url or "")
+    return url.lower().startswith(ESQUEMAS_PERMITIDOS) or (url != "" and ":" not in url.split("/")[0])
+
+class _Sanitizador(HTMLParser):
+    """Reconstrói o HTML mantendo apenas tags e atributos da lista de permissões."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.partes = []
+        self.descartando = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in TAGS_DESCARTADAS:
+            self.descartando += 1
+            return
+        if self.descartando or tag not in TAGS_PERMITIDAS:
+            return
+        permitidos = ATRIBUTOS_PERMITIDOS.get(tag, set()) | ATRIBUTOS_PERMITIDOS["*"]
+        atributos = []
+        for nome, valor in attrs:
+            if nome not in permitidos or valor is None:
+                continue
+            if nome in ("href", "src") and not _url_segura(valor):
+                continue
+            atributos.append(f' {nome}="{html_lib.escape(valor, quote=True)}"')
+        if tag == "a":
+            atributos.append(' rel="noopener noreferrer"')
+        self.partes.append(f"<{tag}{''.join(atributos)}>")
+
+    def handle_endtag(self, tag):
+        if tag in TAGS_DESCARTADAS:
+            self.descartando = max(0, self.descartando - 1)
+            return
+        if self.descartando or tag not in TAGS_PERMITIDAS or tag in TAGS_VAZIAS:
+            return
+        self.partes.append(f"</{tag}>")
+
+    def handle_data(self, data):
+        if not self.descartando:
+            self.partes.append(html_lib.escape(data, quote=False))
+
+class _ExtratorTexto(HTMLParser):
+    """Extrai o texto puro do HTML, quebrando linhas nos elementos de bloco."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.partes = []
+        self.descartando = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in TAGS_DESCARTADAS:
+            self.descartando += 1
+        elif tag in TAGS_BLOCO:
+            self.partes.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in TAGS_DESCARTADAS:
+            self.descartando = max(0, self.descartando - 1)
+        elif tag in TAGS_BLOCO:
+            self.partes.append("\n")
+
+    def handle_data(self, data):
+        if not self.descartando:
+            self.partes.append(data)
+
+def sanitizar_html(html):
+    """Remove scripts, atributos de eventos e URLs perigosas do HTML do editor."""
+    if not isinstance(html, str) or not html:
+        return ""
+    parser = _Sanitizador()
+    parser.feed(html)
+    parser.close()
+    return "".join(parser.partes)
+
+def html_para_texto(html):
+    """Converte o HTML em texto puro, com espaços normalizados."""
+    if not isinstance(html, str) or not html:
+        return ""
+    parser = _ExtratorTexto()
+    parser.feed(html)
+    parser.close()
+    linhas = (re.sub(r"[ \t\xa0]+", " ", linha).strip() for linha in "".join(parser.partes).split("\n"))
+    return "\n".join(linha for linha in linhas if linha)
+
+def gerar_resumo(texto, limite=RESUMO_LIMITE):
+    """Gera um resumo de tamanho fixo, cortando na última palavra inteira."""
+    texto = " ".join((texto or "").split())
+    if len(texto) <= limite:
+        return texto
+    corte = texto[:limite].rsplit(" ", 1)[0]
+    return corte.rstrip(" ,.;:") + "…"
+
+def processar_conteudo_rico(html):
+    """Pré-processa o HTML do editor: retorna o HTML sanitizado, o texto puro e o resumo."""
+    texto = html_para_texto(html)
+    return {"html": sanitizar_html(html), "texto": texto, "resumo": gerar_resumo(texto)}
@@ -1,19 +1,190 @@
+import argparse
+import json
+from datetime import date, datetime, timedelta
 import sqlalchemy
-import toml
+from db_utils import get_postgres_engine
+from tag_utils import STATUS_PUBLICADA
 
-SECRETS_PATH = '.streamlit/secrets.toml'
+TABELAS_APP = ['usuarios', 'institucional', 'convenios', 'noticias', 'eventos', 'receitas', 'despesas', 'parceiros', 'servicos', 'beneficios', 'comentarios', 'contatos', 'log_atividades', 'faq', 'classificados', 'financas']
 
-def get_postgres_engine():
-    """Cria um engine de conexão com o PostgreSQL usando as credenciais dos secrets."""
+# Limiares do diagnóstico. Tabelas menores que MIN_LINHAS são lidas inteiras mais rápido do que por índice.
+MIN_LINHAS = 1000
+PROPORCAO_SEQ_SCAN = 0.5
+PROPORCAO_BLOAT = 0.2
+CONSULTA_LENTA_MS = 50
+
+TABELAS_QUERY = """
+    SELECT s.relname AS tabela,
+           s.n_live_tup AS linhas,
+           s.n_dead_tup AS mortas,
+           pg_table_size(s.relid) AS bytes_tabela,
+           pg_indexes_size(s.relid) AS bytes_indices,
+           coalesce(s.seq_scan, 0) AS seq_scan,
+           coalesce(s.seq_tup_read, 0) AS seq_tup_read,
+           coalesce(s.idx_scan, 0) AS idx_scan,
+           greatest(s.last_autovacuum, s.last_vacuum) AS ultimo_vacuum
+    FROM pg_stat_user_tables s
+    WHERE s.schemaname = current_schema()
+"""
+
+# Índices nunca usados desde o último reset das estatísticas; chaves primárias e índices
+# únicos ficam de fora porque garantem regras mesmo sem serem lidos.
+INDICES_SEM_USO_QUERY = """
+    SELECT s.relname AS tabela, s.indexrelname AS indice, pg_relation_size(s.indexrelid) AS bytes, s.idx_scan
+    FROM pg_stat_user_indexes s
+    JOIN pg_index i ON i.indexrelid = s.indexrelid
+    WHERE s.schemaname = current_schema() AND s.idx_scan = 0 AND NOT i.indisunique AND NOT i.indisprimary
+    ORDER BY pg_relation_size(s.indexrelid) DESC
+"""
+
+INDICES_INVALIDOS_QUERY = """
+    SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE n.nspname = current_schema() AND NOT i.indisvalid
+"""
+
+ESTATISTICAS_DESDE_QUERY = "SELECT stats_reset FROM pg_stat_database WHERE datname = current_database()"
+
+def _registro_consultas():
+    """Consultas reais do app, com parâmetros montados a partir de amostras da base.
+
+    As que ficam em módulos são importadas de lá; as que vivem dentro das páginas são reproduzidas
+    aqui (o nome indica a origem). Estilo 'pyformat' usa %(x)s, como o pandas; 'sqlalchemy' usa :x.
+    """
+    from send_reminders import VENCIMENTOS_QUERY, ANIVERSARIOS_QUERY
+    from digest_tags import NOVAS_NOTICIAS_QUERY, SEGUIDORES_QUERY
+    from classificados_utils import COTA_QUERY, consulta_anuncios
+    hoje = date.today()
+    return [
+        ("auth: login por email", "sqlalchemy", 'SELECT * FROM usuarios WHERE "EMAIL" = :email',
+         lambda a: {"email": a["email"]}),
+        ("9_Recuperar_Senha: usuário pelo token", "sqlalchemy", 'SELECT * FROM usuarios WHERE "TOKEN_RECUPERACAO" = :token',
+         lambda a: {"token": a["token"]}),
+        ("8_Área_do_Membro: histórico financeiro", "pyformat", 'SELECT * FROM financas WHERE "USER_ID" = %(user_id)s',
+         lambda a: {"user_id": a["user_id"]}),
+        ("3_Notícias: tags seguidas", "pyformat",
+         'SELECT "TAG_NAME" FROM tag_follows WHERE "USER_ID" = %(user_id)s ORDER BY "TAG_NAME"',
+         lambda a: {"user_id": a["user_id"]}),
+        ("8_Área_do_Membro: notificações de tags", "pyformat",
+         'SELECT n."ID", n."TITULO", n."DATA" FROM noticias n WHERE n."STATUS" = %(status)s AND n."DATA" > %(desde)s '
+         'AND EXISTS (SELECT 1 FROM noticia_tags t JOIN tag_follows f ON f."TAG_NAME" = t."TAG" '
+         'WHERE t."NOTICIA_ID" = n."ID" AND f."USER_ID" = %(user_id)s) ORDER BY n."DATA" DESC',
+         lambda a: {"status": STATUS_PUBLICADA, "user_id": a["user_id"], "desde": datetime.now() - timedelta(days=30)}),
+        ("3_Notícias: likes da página", "pyformat",
+         'SELECT "NOTICIA_ID", "USER_ID" FROM noticia_likes WHERE "NOTICIA_ID" = ANY(%(ids)s)',
+         lambda a: {"ids": a["noticias"]}),
+        ("3_Notícias: comentários da página", "pyformat",
+         'SELECT * FROM comentarios WHERE "NOTICIA_ID" = ANY(%(ids)s) AND "STATUS" = \'APROVADO\' ORDER BY "TIMESTAMP"',
+         lambda a: {"ids": a["noticias"]}),
+        ("12_Classificados: cota do membro", "pyformat", COTA_QUERY, lambda a: {"user_id": a["user_id"]}),
+        ("12_Classificados: primeira página", "pyformat", consulta_anuncios(),
+         lambda a: {"limite": datetime.now() - timedelta(days=30), "categoria": None, "ids": None,
+                    "limite_linhas": 20, "offset": 0}),
+        ("send_reminders: vencimentos", "sqlalchemy", VENCIMENTOS_QUERY,
+         lambda a: {"inicio": hoje.isoformat(), "fim": (hoje + timedelta(days=3)).isoformat()}),
+        ("send_reminders: aniversários", "sqlalchemy", ANIVERSARIOS_QUERY,
+         lambda a: {"ano": str(hoje.year), "dias_mes": [hoje.month * 100 + hoje.day], "inicio_ano": f"{hoje.year}-01-01"}),
+        ("digest_tags: notícias novas", "sqlalchemy", NOVAS_NOTICIAS_QUERY,
+         lambda a: {"desde": datetime.now() - timedelta(days=7)}),
+        ("digest_tags: seguidores por tag", "sqlalchemy", SEGUIDORES_QUERY, lambda a: {"tags": a["tags"]}),
+    ]
+
+def amostras(conn):
+    """Valores reais para os parâmetros das consultas, para que os planos reflitam o uso normal."""
+    usuario = conn.execute(sqlalchemy.text(
+        'SELECT "ID", "EMAIL", "TOKEN_RECUPERACAO" FROM usuarios ORDER BY "TOKEN_RECUPERACAO" NULLS LAST LIMIT 1'
+    )).mappings().first() or {}
     try:
-        secrets = toml.load(SECRETS_PATH)
-        db_url = secrets["database"]["url"]
-        if 'sslmode' not in db_url:
-            db_url += "?sslmode=require"
-        return sqlalchemy.create_engine(db_url)
-    except Exception as e:
-        print(f"Erro ao ler secrets ou criar engine: {e}")
-        return None
+        tags = conn.execute(sqlalchemy.text('SELECT DISTINCT "TAG" FROM noticia_tags LIMIT 20')).scalars().all()
+    except sqlalchemy.exc.DBAPIError:
+        tags = []
+    noticias = conn.execute(sqlalchemy.text(
+        'SELECT "ID" FROM noticias WHERE "STATUS" = :status ORDER BY "DATA" DESC LIMIT 5'
+    ), {"status": STATUS_PUBLICADA}).scalars().all()
+    return {"user_id": usuario.get("ID"), "email": usuario.get("EMAIL"),
+            "token": usuario.get("TOKEN_RECUPERACAO") or "", "tags": tags, "noticias": list(noticias)}
+
+def _nos_do_plano(no):
+    yield no
+    for filho in no.get("Plans", []):
+        yield from _nos_do_plano(filho)
+
+def explicar(conn, sql, estilo, params, timeout_ms=30000):
+    """Roda EXPLAIN (ANALYZE, BUFFERS) numa transação desfeita ao final. Retorna (ms, blocos lidos, seq scans)."""
+    trans = conn.begin()
+    try:
+        conn.execute(sqlalchemy.text(f"SET LOCAL statement_timeout = {int(timeout_ms)}"))
+        explain = "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + sql
+        if estilo == "pyformat":
+            resultado = conn.exec_driver_sql(explain, params).scalar()
+        else:
+            resultado = conn.execute(sqlalchemy.text(explain), params).scalar()
+    finally:
+        trans.rollback()
+    plano = (json.loads(resultado) if isinstance(resultado, str) else resultado)[0]
+    raiz = plano["Plan"]
+    blocos = raiz.get("Shared Hit Blocks", 0) + raiz.get("Shared Read Blocks", 0)
+    seq_scans = sorted({f"{no['Relation Name']} ({no.get('Actual Rows', 0)} linhas)"
+                        for no in _nos_do_plano(raiz) if no["Node Type"] == "Seq Scan"})
+    return plano["Execution Time"], blocos, seq_scans
+
+def _mb(bytes_):
+    return bytes_ / 1024 / 1024
+
+def diagnosticar_tabelas(conn):
+    """Achados por tabela: leitura sequencial frequente em tabela grande e excesso de linhas mortas."""
+    achados = []
+    tabelas = conn.execute(sqlalchemy.text(TABELAS_QUERY)).mappings().all()
+    for t in tabelas:
+        varreduras = t["seq_scan"] + t["idx_scan"]
+        proporcao_seq = t["seq_scan"] / varreduras if varreduras else 0
+        if t["linhas"] >= MIN_LINHAS and proporcao_seq >= PROPORCAO_SEQ_SCAN and t["seq_scan"] > 0:
+            media = t["seq_tup_read"] // t["seq_scan"]
+            # Peso ~ milissegundos de leitura acumulados (ordem de 100 mil linhas por ms).
+            achados.append((t["seq_tup_read"] / 100_000, "índice ausente",
+                            f"{t['tabela']}: {proporcao_seq:.0%} das leituras são sequenciais "
+                            f"({t['seq_scan']} varreduras, ~{media} linhas cada).",
+                            "Veja nas consultas abaixo qual filtra esta tabela sem índice."))
+        total = t["linhas"] + t["mortas"]
+        if total >= MIN_LINHAS and t["mortas"] / total >= PROPORCAO_BLOAT:
+            desperdicio = _mb(t["bytes_tabela"]) * t["mortas"] / total
+            achados.append((desperdicio * 10, "bloat",
+                            f"{t['tabela']}: {t['mortas'] / total:.0%} de linhas mortas (~{desperdicio:.1f} MB), "
+                            f"último vacuum {t['ultimo_vacuum'] or 'nunca'}.",
+                            f"VACUUM (ANALYZE) {t['tabela']}; se persistir, ajuste o autovacuum da tabela."))
+    return tabelas, achados
+
+def diagnosticar_indices(conn):
+    """Achados por índice: inválidos (build concorrente interrompido) e nunca usados."""
+    achados = []
+    for nome in conn.execute(sqlalchemy.text(INDICES_INVALIDOS_QUERY)).scalars():
+        achados.append((1000, "índice inválido", f"{nome} está inválido e não é usado por nenhuma consulta.",
+                        "Rode python migracoes.py novamente ou DROP INDEX CONCURRENTLY."))
+    for idx in conn.execute(sqlalchemy.text(INDICES_SEM_USO_QUERY)).mappings():
+        if idx["bytes"] >= 1024 * 1024:
+            achados.append((_mb(idx["bytes"]), "índice sem uso",
+                            f"{idx['indice']} em {idx['tabela']} ({_mb(idx['bytes']):.1f} MB) nunca foi usado.",
+                            "Confirme em produção e remova para aliviar as escritas."))
+    return achados
+
+def diagnosticar_consultas(conn):
+    """Roda o registro de consultas com EXPLAIN ANALYZE e devolve os achados e a tabela de tempos."""
+    achados, tempos = [], []
+    with conn.begin():
+        valores = amostras(conn)
+    for nome, estilo, sql, montar_params in _registro_consultas():
+        try:
+            ms, blocos, seq_scans = explicar(conn, sql, estilo, montar_params(valores))
+        except sqlalchemy.exc.DBAPIError as e:
+            tempos.append((nome, None, None, str(e.orig).splitlines()[0]))
+            continue
+        tempos.append((nome, ms, blocos, ", ".join(seq_scans)))
+        if ms >= CONSULTA_LENTA_MS or seq_scans:
+            achados.append((ms, "consulta lenta" if ms >= CONSULTA_LENTA_MS else "seq scan",
+                            f"{nome}: {ms:.1f} ms, {blocos} blocos"
+                            + (f", leitura sequencial de {', '.join(seq_scans)}" if seq_scans else "") + ".",
+                            "Crie o índice para o filtro (declare-o em migracoes.py) ou pagine a consulta."))
+    return tempos, achados
 
 def inspect_postgres_table_schema(engine, table_name):
     """Inspeciona o esquema de uma tabela no PostgreSQL."""
@@ -32,11 +203,57 @@ def inspect_postgres_table_schema(engine, table_name):
     except Exception as e:
         print(f"Erro ao inspecionar o esquema no PostgreSQL: {e}")
 
+def main():
+    """Diagnóstico de desempenho da base: tamanhos, bloat, índices e planos das consultas do app."""
+    parser = argparse.ArgumentParser(description="Diagnóstico de desempenho do PostgreSQL do app.")
+    parser.add_argument("--esquema", action="store_true", help="Apenas lista as colunas das tabelas do app.")
+    parser.add_argument("--sem-explain", action="store_true", help="Não executa as consultas do app (só estatísticas).")
+    parser.add_argument("--top", type=int, default=15, help="Quantos achados mostrar na lista priorizada.")
+    args = parser.parse_args()
+
+    engine = get_postgres_engine()
+    if engine is None:
+        print("Não foi possível conectar à base de dados. Verifique o seu ficheiro secrets.toml.")
+        return
+
+    if args.esquema:
+        print("--- INSPECIONANDO ESQUEMA DO POSTGRESQL ---")
+        for table in TABELAS_APP:
+            inspect_postgres_table_schema(engine, table)
+            print("\n")
+        print("--- INSPEÇÃO CONCLUÍDA ---")
+        return
+
+    with engine.connect() as conn:
+        with conn.begin():
+            desde = conn.execute(sqlalchemy.text(ESTATISTICAS_DESDE_QUERY)).scalar()
+            tabelas, achados = diagnosticar_tabelas(conn)
+            achados += diagnosticar_indices(conn)
+        tempos = []
+        if not args.sem_explain:
+            tempos, achados_consultas = diagnosticar_consultas(conn)
+            achados += achados_consultas
+
+    print(f"--- TABELAS (estatísticas desde {desde or 'a criação do banco'}) ---")
+    print(f"{'tabela':<24}{'linhas':>10}{'mortas':>9}{'tabela MB':>11}{'índices MB':>12}{'% seq':>8}")
+    for t in sorted(tabelas, key=lambda t: t["bytes_tabela"] + t["bytes_indices"], reverse=True):
+        varreduras = t["seq_scan"] + t["idx_scan"]
+        seq = f"{t['seq_scan'] / varreduras:.0%}" if varreduras else "-"
+        print(f"{t['tabela']:<24}{t['linhas']:>10}{t['mortas']:>9}{_mb(t['bytes_tabela']):>11.1f}{_mb(t['bytes_indices']):>12.1f}{seq:>8}")
+
+    if tempos:
+        print("\n--- CONSULTAS DO APP (EXPLAIN ANALYZE) ---")
+        for nome, ms, blocos, detalhe in sorted(tempos, key=lambda t: -(t[1] or 0)):
+            if ms is None:
+                print(f"{nome:<45} ERRO: {detalhe}")
+            else:
+                print(f"{nome:<45}{ms:>9.1f} ms{blocos:>9} blocos  {detalhe}")
+
+    print("\n--- CAMINHOS LENTOS, DO MAIS CARO AO MENOS ---")
+    if not achados:
+        print("Nenhum problema encontrado.")
+    for posicao, (_, tipo, descricao, acao) in enumerate(sorted(achados, key=lambda a: -a[0])[:args.top], start=1):
+        print(f"{posicao:>2}. [{tipo}] {descricao}\n    → {acao}")
+
 if __name__ == "__main__":
-    print("--- INSPECIONANDO ESQUEMA DO POSTGRESQL ---")
-    pg_engine = get_postgres_engine()
-    tables = ['usuarios', 'institucional', 'convenios', 'noticias', 'eventos', 'receitas', 'despesas', 'parceiros', 'servicos', 'beneficios', 'comentarios', 'contatos', 'log_atividades', 'faq', 'classificados', 'financas']
-    for table in tables:
-        inspect_postgres_table_schema(pg_engine, table)
-        print("\n")
-    print("--- INSPEÇÃO CONCLUÍDA ---")
\ No newline at end of file
+    main()
@@ -0,0 +1,133 @@
+import json
+import random
+import sqlalchemy
+
+# Fila de tarefas em segundo plano guardada no próprio PostgreSQL. As páginas apenas enfileiram
+# (de preferência na mesma transação que grava os dados, como um outbox) e o worker.py executa.
+# A tabela jobs e o índice da fila vêm da migração 008 (migracoes.py).
+STATUS_PENDENTE = 'PENDENTE'
+STATUS_EXECUTANDO = 'EXECUTANDO'
+STATUS_CONCLUIDO = 'CONCLUIDO'
+STATUS_FALHOU = 'FALHOU'
+
+BACKOFF_BASE_SEGUNDOS = 30
+BACKOFF_MAX_SEGUNDOS = 6 * 3600
+# Tarefas em execução há mais tempo que isso são consideradas abandonadas (worker caiu) e voltam à fila.
+TIMEOUT_EXECUCAO_SEGUNDOS = 15 * 60
+
+class JobPermanenteError(Exception):
+    """Falha que não adianta repetir (ex.: destinatário inválido): a tarefa é encerrada sem novas tentativas."""
+
+def enqueue_job(conn, tipo, payload=None, chave_idempotencia=None, executar_em=None, max_tentativas=5):
+    """Enfileira uma tarefa na transação corrente da conexão.
+
+    Se já existir uma tarefa com a mesma chave de idempotência, nada é inserido e retorna None;
+    caso contrário, retorna o ID da nova tarefa.
+    """
+    query = sqlalchemy.text("""
+        INSERT INTO jobs ("TIPO", "PAYLOAD", "CHAVE_IDEMPOTENCIA", "EXECUTAR_EM", "MAX_TENTATIVAS")
+        VALUES (:tipo, CAST(:payload AS JSONB), :chave, COALESCE(:executar_em, now()), :max_tentativas)
+        ON CONFLICT ("CHAVE_IDEMPOTENCIA") DO NOTHING
+        RETURNING "ID"
+    """)
+    return conn.execute(query, {
+        "tipo": tipo,
+        "payload": json.dumps(payload or {}, default=str),
+        "chave": chave_idempotencia,
+        "executar_em": executar_em,
+        "max_tentativas": max_tentativas,
+    }).scalar()
+
+def claim_jobs(conn, worker_id, limite=10, tipos=None):
+    """Reserva até 'limite' tarefas prontas para este worker.
+
+    Usa FOR UPDATE SKIP LOCKED, então vários workers podem consultar a fila ao mesmo tempo sem
+    disputar as mesmas linhas. Tarefas presas em execução além do timeout também são retomadas,
+    desde que ainda tenham tentativas; as que já esgotaram (ex.: derrubam o worker a cada execução)
+    são marcadas como FALHOU em vez de voltarem à fila para sempre.
+    """
+    filtro_tipo = 'AND "TIPO" = ANY(:tipos)' if tipos else ''
+    abandonadas = sqlalchemy.text(f"""
+        UPDATE jobs SET
+            "STATUS" = '{STATUS_FALHOU}',
+            "ULTIMO_ERRO" = 'Execução abandonada (worker interrompido) após esgotar as tentativas.',
+            "BLOQUEADO_EM" = NULL,
+            "BLOQUEADO_POR" = NULL,
+            "DATA_CONCLUSAO" = now()
+        WHERE "STATUS" = '{STATUS_EXECUTANDO}' AND "BLOQUEADO_EM" < now() - make_interval(secs => :timeout)
+          AND "TENTATIVAS" >= "MAX_TENTATIVAS" {filtro_tipo}
+    """)
+    query = sqlalchemy.text(f"""
+        UPDATE jobs SET
+            "STATUS" = '{STATUS_EXECUTANDO}',
+            "TENTATIVAS" = "TENTATIVAS" + 1,
+            "BLOQUEADO_EM" = now(),
+            "BLOQUEADO_POR" = :worker_id
+        WHERE "ID" IN (
+            SELECT "ID" FROM jobs
+            WHERE (
+                ("STATUS" = '{STATUS_PENDENTE}' AND "EXECUTAR_EM" <= now())
+                OR ("STATUS" = '{STATUS_EXECUTANDO}' AND "BLOQUEADO_EM" < now() - make_interval(secs => :timeout)
+                    AND "TENTATIVAS" < "MAX_TENTATIVAS")
+            ) {filtro_tipo}
+            ORDER BY "EXECUTAR_EM"
+            LIMIT :limite
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING "ID", "TIPO", "PAYLOAD", "TENTATIVAS", "MAX_TENTATIVAS"
+    """)
+    params = {
+        "worker_id": worker_id,
+        "timeout": TIMEOUT_EXECUCAO_SEGUNDOS,
+        "limite": limite,
+        "tipos": list(tipos) if tipos else None,
+    }
+    with conn.begin():
+        conn.execute(abandonadas, params)
+        result = conn.execute(query, params)
+        return [dict(row) for row in result.mappings()]
+
+def complete_job(conn, job_id):
+    """Marca a tarefa como concluída."""
+    query = sqlalchemy.text(f"""
+        UPDATE jobs SET "STATUS" = '{STATUS_CONCLUIDO}', "DATA_CONCLUSAO" = now(), "ULTIMO_ERRO" = NULL
+        WHERE "ID" = :id
+    """)
+    with conn.begin():
+        conn.execute(query, {"id": job_id})
+
+def backoff_segundos(tentativas):
+    """Espera exponencial com jitter antes da próxima tentativa."""
+    espera = min(BACKOFF_MAX_SEGUNDOS, BACKOFF_BASE_SEGUNDOS * 2 ** max(0, tentativas - 1))
+    return espera * random.uniform(0.5, 1.0)
+
+def fail_job(conn, job, erro, permanente=False):
+    """Registra a falha: reagenda com backoff ou, esgotadas as tentativas, marca como FALHOU."""
+    esgotada = permanente or job["TENTATIVAS"] >= job["MAX_TENTATIVAS"]
+    query = sqlalchemy.text("""
+        UPDATE jobs SET
+            "STATUS" = :status,
+            "ULTIMO_ERRO" = :erro,
+            "EXECUTAR_EM" = now() + make_interval(secs => :espera),
+            "BLOQUEADO_EM" = NULL,
+            "BLOQUEADO_POR" = NULL,
+            "DATA_CONCLUSAO" = CASE WHEN :status = 'FALHOU' THEN now() END
+        WHERE "ID" = :id
+    """)
+    with conn.begin():
+        conn.execute(query, {
+            "id": job["ID"],
+            "status": STATUS_FALHOU if esgotada else STATUS_PENDENTE,
+            "erro": str(erro)[:2000],
+            "espera": 0 if esgotada else backoff_segundos(job["TENTATIVAS"]),
+        })
+    return not esgotada
+
+def purge_jobs(conn, dias=30):
+    """Remove as tarefas concluídas há mais de 'dias' dias. Retorna quantas foram apagadas."""
+    query = sqlalchemy.text(f"""
+        DELETE FROM jobs
+        WHERE "STATUS" = '{STATUS_CONCLUIDO}' AND "DATA_CONCLUSAO" < now() - make_interval(days => :dias)
+    """)
+    with conn.begin():
+        return conn.execute(query, {"dias": dias}).rowcount
@@ -0,0 +1,299 @@
+import argparse
+import sqlalchemy
+from db_utils import get_postgres_engine
+from tag_utils import STATUS_PUBLICADA
+
+# Migrações versionadas do esquema. Cada versão é aplicada uma única vez por base e registrada em
+# schema_migrations, então todos os ambientes convergem rodando o mesmo comando. Os índices são
+# criados com CONCURRENTLY (fora de transação, sem bloquear escritas); por isso cada passo é
+# idempotente e uma versão só é registrada depois que todos os seus passos terminaram.
+SCHEMA_MIGRATIONS_DDL = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    "VERSAO" TEXT PRIMARY KEY,
+    "DESCRICAO" TEXT NOT NULL,
+    "DATA_APLICACAO" TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+"""
+
+def indice(nome, tabela, colunas, unico=False, onde=None, deduplicar=False):
+    """Passo que cria um índice. Com 'deduplicar', apaga antes as linhas repetidas (mantém a primeira)."""
+    return {"tipo": "indice", "nome": nome, "tabela": tabela, "colunas": colunas,
+            "unico": unico, "onde": onde, "deduplicar": deduplicar}
+
+def remover_indice(nome):
+    """Passo que remove um índice substituído por outro."""
+    return {"tipo": "remover_indice", "nome": nome}
+
+def sql(nome, comando, requer=None):
+    """Passo com comandos SQL idempotentes (CREATE TABLE IF NOT EXISTS, ADD COLUMN IF NOT EXISTS, DO ...).
+
+    Os comandos do passo rodam juntos, como uma transação implícita. Com 'requer', o passo é
+    ignorado se a tabela indicada não existir. Índices vão em passos 'indice', nunca aqui.
+    """
+    return {"tipo": "sql", "nome": nome, "comando": comando, "requer": requer}
+
+# noticia_tags."NOTICIA_ID" acompanha o tipo de noticias."ID" (lido do catálogo), para que as junções
+# usem a chave primária sem conversão. Bases que já tinham a tabela com a coluna em texto têm as
+# linhas órfãs apagadas e a coluna convertida; a tabela é pequena, então a reescrita é rápida.
+NOTICIA_TAGS_DDL = """
+DO $$
+DECLARE
+    tipo text := (SELECT format_type(atttypid, atttypmod) FROM pg_attribute
+                  WHERE attrelid = 'noticias'::regclass AND attname = 'ID' AND NOT attisdropped);
+BEGIN
+    IF to_regclass('noticia_tags') IS NULL THEN
+        EXECUTE format('CREATE TABLE noticia_tags ("NOTICIA_ID" %s NOT NULL, "TAG" TEXT NOT NULL, '
+                       'PRIMARY KEY ("NOTICIA_ID", "TAG"))', tipo);
+    ELSIF (SELECT format_type(atttypid, atttypmod) FROM pg_attribute
+           WHERE attrelid = 'noticia_tags'::regclass AND attname = 'NOTICIA_ID') <> tipo THEN
+        DELETE FROM noticia_tags t WHERE NOT EXISTS (SELECT 1 FROM noticias n WHERE n."ID"::text = t."NOTICIA_ID"::text);
+        EXECUTE format('ALTER TABLE noticia_tags ALTER COLUMN "NOTICIA_ID" TYPE %s USING "NOTICIA_ID"::text::%s', tipo, tipo);
+    END IF;
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'noticia_tags_noticia_fk') THEN
+        DELETE FROM noticia_tags t WHERE NOT EXISTS (SELECT 1 FROM noticias n WHERE n."ID" = t."NOTICIA_ID");
+        ALTER TABLE noticia_tags ADD CONSTRAINT noticia_tags_noticia_fk
+            FOREIGN KEY ("NOTICIA_ID") REFERENCES noticias ("ID") ON DELETE CASCADE;
+    END IF;
+END $$
+"""
+
+MIGRACOES = [
+    ("001", "Busca de usuários por email e por token de recuperação", [
+        indice("usuarios_email_unico_idx", "usuarios", '"EMAIL"', unico=True),
+        indice("usuarios_token_unico_idx", "usuarios", '"TOKEN_RECUPERACAO"', unico=True,
+               onde='"TOKEN_RECUPERACAO" IS NOT NULL'),
+    ]),
+    ("002", "Cobranças por membro, likes, parceiros por convênio e comentários por notícia", [
+        indice("financas_usuario_idx", "financas", '"USER_ID"'),
+        indice("noticia_likes_unico_idx", "noticia_likes", '"NOTICIA_ID", "USER_ID"', unico=True, deduplicar=True),
+        indice("parceiros_convenio_idx", "parceiros", '"CONVENIO_ID"'),
+        indice("comentarios_noticia_status_idx", "comentarios", '"NOTICIA_ID", "STATUS"'),
+    ]),
+    ("003", "Tag seguida uma única vez por membro", [
+        indice("tag_follows_unico_idx", "tag_follows", '"USER_ID", "TAG_NAME"', unico=True, deduplicar=True),
+        remover_indice("tag_follows_usuario_tag_idx"),
+    ]),
+    ("004", "Registro do digest de tags e seguidores por tag", [
+        sql("digest_noticias", """
+            CREATE TABLE IF NOT EXISTS digest_noticias (
+                "NOTICIA_ID" TEXT PRIMARY KEY,
+                "DATA_PROCESSAMENTO" TIMESTAMPTZ NOT NULL DEFAULT now()
+            )
+        """),
+        indice("tag_follows_tag_idx", "tag_follows", '"TAG_NAME"'),
+    ]),
+    ("005", "Notícias ativas por data (notificações de tags na Área do Membro)", [
+        indice("noticias_ativas_data_idx", "noticias", '"DATA"', onde=f'"STATUS" = \'{STATUS_PUBLICADA}\''),
+    ]),
+    ("006", "Cota e listagem de classificados (índices parciais)", [
+        indice("classificados_cota_idx", "classificados", '"USER_ID"', onde='"STATUS" IN (\'ATIVO\', \'PENDENTE\')'),
+        indice("classificados_ativos_idx", "classificados", '"DATA_CRIACAO" DESC', onde='"STATUS" = \'ATIVO\''),
+        indice("classificados_ativos_categoria_idx", "classificados", '"CATEGORIA", "DATA_CRIACAO" DESC',
+               onde='"STATUS" = \'ATIVO\''),
+    ]),
+    ("007", "Registro de lembretes enviados, vencimentos pendentes e aniversários de cadastro", [
+        sql("lembretes_enviados", """
+            CREATE TABLE IF NOT EXISTS lembretes_enviados (
+                "TIPO" TEXT NOT NULL,
+                "REFERENCIA_ID" TEXT NOT NULL,
+                "PERIODO" TEXT NOT NULL,
+                "EMAIL" TEXT,
+                "DATA_ENVIO" TIMESTAMPTZ NOT NULL DEFAULT now(),
+                PRIMARY KEY ("TIPO", "REFERENCIA_ID", "PERIODO")
+            )
+        """),
+        indice("financas_pendentes_vencimento_idx", "financas", '"DATA_VENCIMENTO"', onde='"STATUS" = \'PENDENTE\''),
+        indice("usuarios_ativos_aniversario_dia_idx", "usuarios",
+               '(date_part(\'month\', "DATA_CADASTRO") * 100 + date_part(\'day\', "DATA_CADASTRO"))',
+               onde='"STATUS" = \'ATIVO\''),
+    ]),
+    ("008", "Fila de tarefas em segundo plano (jobs.py / worker.py)", [
+        sql("jobs", """
+            CREATE TABLE IF NOT EXISTS jobs (
+                "ID" BIGSERIAL PRIMARY KEY,
+                "TIPO" TEXT NOT NULL,
+                "PAYLOAD" JSONB NOT NULL DEFAULT '{}',
+                "CHAVE_IDEMPOTENCIA" TEXT UNIQUE,
+                "STATUS" TEXT NOT NULL DEFAULT 'PENDENTE',
+                "TENTATIVAS" INTEGER NOT NULL DEFAULT 0,
+                "MAX_TENTATIVAS" INTEGER NOT NULL DEFAULT 5,
+                "EXECUTAR_EM" TIMESTAMPTZ NOT NULL DEFAULT now(),
+                "BLOQUEADO_EM" TIMESTAMPTZ,
+                "BLOQUEADO_POR" TEXT,
+                "ULTIMO_ERRO" TEXT,
+                "DATA_CRIACAO" TIMESTAMPTZ NOT NULL DEFAULT now(),
+                "DATA_CONCLUSAO" TIMESTAMPTZ
+            )
+        """),
+        indice("jobs_pendentes_idx", "jobs", '"EXECUTAR_EM"', onde='"STATUS" = \'PENDENTE\''),
+    ]),
+    ("009", "Tags normalizadas das notícias no tipo de noticias.ID, com chave estrangeira", [
+        sql("noticia_tags", NOTICIA_TAGS_DDL, requer="noticias"),
+        indice("noticia_tags_tag_idx", "noticia_tags", '"TAG", "NOTICIA_ID"'),
+    ]),
+    ("010", "Chave ID na FAQ (atualizações por linha sem depender do ctid)", [
+        sql("faq_id", 'ALTER TABLE faq ADD COLUMN IF NOT EXISTS "ID" BIGINT GENERATED BY DEFAULT AS IDENTITY', requer="faq"),
+        indice("faq_id_unico_idx", "faq", '"ID"', unico=True),
+    ]),
+    ("011", "Registro de entregas do digest de tags por membro", [
+        sql("digest_entregas", """
+            CREATE TABLE IF NOT EXISTS digest_entregas (
+                "USER_ID" TEXT NOT NULL,
+                "NOTICIA_ID" TEXT NOT NULL,
+                "DATA_ENVIO" TIMESTAMPTZ NOT NULL DEFAULT now(),
+                PRIMARY KEY ("USER_ID", "NOTICIA_ID")
+            )
+        """),
+    ]),
+    ("012", "Miniaturas da galeria de fotos", [
+        sql("galeria_miniatura", 'ALTER TABLE galeria_fotos ADD COLUMN IF NOT EXISTS "MINIATURA_URL" TEXT', requer="galeria_fotos"),
+    ]),
+    # As colunas de html_utils.CONTEUDO_PROCESSADO_COLUMNS; o preenchimento das linhas antigas fica
+    # com o preprocessar_conteudo.py.
+    ("013", "Conteúdo pré-processado (HTML sanitizado, texto e resumo) de notícias e FAQ", [
+        sql("noticias_conteudo_processado", """
+            ALTER TABLE noticias ADD COLUMN IF NOT EXISTS "CONTEUDO_HTML" TEXT;
+            ALTER TABLE noticias ADD COLUMN IF NOT EXISTS "CONTEUDO_TEXTO" TEXT;
+            ALTER TABLE noticias ADD COLUMN IF NOT EXISTS "RESUMO" TEXT;
+        """, requer="noticias"),
+        sql("faq_conteudo_processado", """
+            ALTER TABLE faq ADD COLUMN IF NOT EXISTS "RESPOSTA_HTML" TEXT;
+            ALTER TABLE faq ADD COLUMN IF NOT EXISTS "RESPOSTA_TEXTO" TEXT;
+            ALTER TABLE faq ADD COLUMN IF NOT EXISTS "RESUMO" TEXT;
+        """, requer="faq"),
+    ]),
+]
+
+DUPLICADOS_QUERY = """
+    SELECT count(*) FROM (
+        SELECT 1 FROM {tabela} WHERE {onde} AND ({colunas}) IS NOT NULL GROUP BY {colunas} HAVING count(*) > 1
+    ) d
+"""
+
+# Linhas com NULL em alguma coluna não conflitam no índice único (e o "=" abaixo não as casa).
+DEDUPLICAR_QUERY = """
+    DELETE FROM {tabela} t
+    USING {tabela} o
+    WHERE ({colunas_t}) = ({colunas_o}) AND o.ctid < t.ctid
+"""
+
+def _existe(conn, nome):
+    return conn.execute(sqlalchemy.text("SELECT to_regclass(:nome) IS NOT NULL"), {"nome": nome}).scalar()
+
+def _remover_se_invalido(conn, nome):
+    """Um CREATE INDEX CONCURRENTLY interrompido deixa um índice inválido com o nome; ele é refeito."""
+    invalido = conn.execute(sqlalchemy.text(
+        "SELECT NOT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:nome)"
+    ), {"nome": nome}).scalar()
+    if invalido:
+        conn.execute(sqlalchemy.text(f"DROP INDEX CONCURRENTLY IF EXISTS {nome}"))
+
+def _particoes(conn, tabela):
+    return conn.execute(sqlalchemy.text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass(:tabela) ORDER BY c.relname"
+    ), {"tabela": tabela}).scalars().all()
+
+def criar_indice(conn, passo):
+    """Cria o índice com CONCURRENTLY. Em tabela particionada, cria o índice pai vazio (ON ONLY),
+    constrói cada partição concorrentemente e as anexa, o que também torna o pai válido."""
+    tabela, nome, colunas = passo["tabela"], passo["nome"], passo["colunas"]
+    if not _existe(conn, tabela):
+        return f"tabela {tabela} inexistente, ignorado"
+    unico = "UNIQUE " if passo["unico"] else ""
+    onde = f" WHERE {passo['onde']}" if passo["onde"] else ""
+
+    if passo["unico"]:
+        duplicados = conn.execute(sqlalchemy.text(
+            DUPLICADOS_QUERY.format(tabela=tabela, onde=passo["onde"] or "true", colunas=colunas)
+        )).scalar()
+        if duplicados and passo["deduplicar"]:
+            lista = [c.strip() for c in colunas.split(",")]
+            conn.execute(sqlalchemy.text(DEDUPLICAR_QUERY.format(
+                tabela=tabela,
+                colunas_t=", ".join(f"t.{c}" for c in lista),
+                colunas_o=", ".join(f"o.{c}" for c in lista),
+            )))
+        elif duplicados:
+            raise RuntimeError(f"{tabela} tem {duplicados} valor(es) repetido(s) em ({colunas}); corrija antes de criar {nome}.")
+
+    relkind = conn.execute(sqlalchemy.text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:t)"), {"t": tabela}).scalar()
+    if relkind != "p":
+        _remover_se_invalido(conn, nome)
+        conn.execute(sqlalchemy.text(f"CREATE {unico}INDEX CONCURRENTLY IF NOT EXISTS {nome} ON {tabela} ({colunas}){onde}"))
+        return "criado"
+
+    conn.execute(sqlalchemy.text(f"CREATE {unico}INDEX IF NOT EXISTS {nome} ON ONLY {tabela} ({colunas}){onde}"))
+    for particao in _particoes(conn, tabela):
+        filho = f"{particao}_{nome}"[:63]
+        _remover_se_invalido(conn, filho)
+        conn.execute(sqlalchemy.text(f"CREATE {unico}INDEX CONCURRENTLY IF NOT EXISTS {filho} ON {particao} ({colunas}){onde}"))
+        anexado = conn.execute(sqlalchemy.text(
+            "SELECT EXISTS (SELECT 1 FROM pg_inherits WHERE inhrelid = to_regclass(:filho) AND inhparent = to_regclass(:pai))"
+        ), {"filho": filho, "pai": nome}).scalar()
+        if not anexado:
+            conn.execute(sqlalchemy.text(f"ALTER INDEX {nome} ATTACH PARTITION {filho}"))
+    return f"criado em {len(_particoes(conn, tabela))} partição(ões)"
+
+def aplicar_passo(conn, passo):
+    if passo["tipo"] == "indice":
+        return criar_indice(conn, passo)
+    if passo["tipo"] == "sql":
+        if passo["requer"] and not _existe(conn, passo["requer"]):
+            return f"tabela {passo['requer']} inexistente, ignorado"
+        conn.execute(sqlalchemy.text(passo["comando"]))
+        return "aplicado"
+    conn.execute(sqlalchemy.text(f"DROP INDEX CONCURRENTLY IF EXISTS {passo['nome']}"))
+    return "removido"
+
+def versoes_aplicadas(conn, simular=False):
+    """Versões já registradas. Na simulação não cria schema_migrations (uma base nova não tem nenhuma)."""
+    if simular and not _existe(conn, "schema_migrations"):
+        return set()
+    conn.execute(sqlalchemy.text(SCHEMA_MIGRATIONS_DDL))
+    return set(conn.execute(sqlalchemy.text('SELECT "VERSAO" FROM schema_migrations')).scalars().all())
+
+def migrar(engine, simular=False):
+    """Aplica, em ordem, as versões ainda não registradas. Retorna as versões aplicadas."""
+    aplicadas = []
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        ja_aplicadas = versoes_aplicadas(conn, simular)
+        for versao, descricao, passos in MIGRACOES:
+            if versao in ja_aplicadas:
+                continue
+            print(f"{versao} - {descricao}")
+            for passo in passos:
+                resultado = "pendente" if simular else aplicar_passo(conn, passo)
+                print(f"    {passo['nome']}: {resultado}")
+            if not simular:
+                conn.execute(sqlalchemy.text(
+                    'INSERT INTO schema_migrations ("VERSAO", "DESCRICAO") VALUES (:versao, :descricao) ON CONFLICT DO NOTHING'
+                ), {"versao": versao, "descricao": descricao})
+            aplicadas.append(versao)
+    return aplicadas
+
+def main():
+    """Leva o esquema da base à última versão declarada em MIGRACOES."""
+    parser = argparse.ArgumentParser(description="Aplica as migrações de esquema pendentes.")
+    parser.add_argument("--simular", action="store_true", help="Lista as migrações pendentes sem aplicá-las.")
+    args = parser.parse_args()
+
+    engine = get_postgres_engine()
+    if engine is None:
+        print("Não foi possível conectar à base de dados. Verifique o seu ficheiro secrets.toml.")
+        return
+
+    try:
+        aplicadas = migrar(engine, simular=args.simular)
+    except Exception as e:
+        print(f"ERRO: {e}\nA versão em andamento não foi registrada; rode novamente depois de corrigir.")
+        return
+    if not aplicadas:
+        print("Esquema atualizado, nenhuma migração pendente.")
+    elif args.simular:
+        print(f"\n{len(aplicadas)} migração(ões) pendente(s). Rode sem --simular para aplicar.")
+    else:
+        print(f"\n{len(aplicadas)} migração(ões) aplicada(s).")
+
+if __name__ == "__main__":
+    main()
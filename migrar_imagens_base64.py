@@ -0,0 +1,56 @@
+import argparse
+import sqlalchemy
+from db_utils import get_postgres_engine
+from html_utils import RICH_TEXT_COLUMNS, extrair_imagens_base64
+
+def migrar_coluna(conn, table, key, column, aplicar):
+    """Extrai as imagens base64 de uma coluna de HTML, linha a linha, e retorna (linhas, imagens, bytes)."""
+    select = sqlalchemy.text(
+        f'SELECT "{key}", "{column}" FROM {table} WHERE "{column}" LIKE \'%data:image/%\' ORDER BY "{key}"'
+    )
+    update = sqlalchemy.text(f'UPDATE {table} SET "{column}" = :html WHERE "{key}" = :key')
+    linhas = imagens = economizados = 0
+    with conn.begin():
+        rows = conn.execute(select).fetchall()
+    for row_key, html in rows:
+        if aplicar:
+            novo_html, extraidas, bytes_economizados = extrair_imagens_base64(html, table, conn=conn)
+            if extraidas:
+                with conn.begin():
+                    conn.execute(update, {"html": novo_html, "key": row_key})
+        else:
+            extraidas = html.count("data:image/")
+            bytes_economizados = len(html)
+        linhas += 1
+        imagens += extraidas
+        economizados += bytes_economizados
+    return linhas, imagens, economizados
+
+def main():
+    """Migra as imagens coladas no editor rico que ainda estão embutidas no banco."""
+    parser = argparse.ArgumentParser(description="Extrai imagens base64 do HTML salvo no banco.")
+    parser.add_argument("--aplicar", action="store_true", help="Grava os arquivos e reescreve o HTML no banco.")
+    args = parser.parse_args()
+
+    engine = get_postgres_engine()
+    if engine is None:
+        print("Não foi possível conectar à base de dados. Verifique o seu ficheiro secrets.toml.")
+        return
+
+    total_economizado = 0
+    with engine.connect() as conn:
+        for table, key, column in RICH_TEXT_COLUMNS:
+            linhas, imagens, economizados = migrar_coluna(conn, table, key, column, args.aplicar)
+            total_economizado += economizados
+            if args.aplicar:
+                print(f"{table}.{column}: {linhas} linha(s), {imagens} imagem(ns) extraída(s), {economizados / 1024:.0f} KB economizados.")
+            else:
+                print(f"{table}.{column}: {linhas} linha(s) com {imagens} imagem(ns) embutida(s), {economizados / 1024:.0f} KB de HTML afetado.")
+
+    if args.aplicar:
+        print(f"\nTotal: {total_economizado / 1024 / 1024:.1f} MB removidos do banco.")
+    else:
+        print("\nExecução de simulação. Use --aplicar para gravar as alterações.")
+
+if __name__ == "__main__":
+    main()
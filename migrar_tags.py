@@ -0,0 +1,33 @@
+import argparse
+import sqlalchemy
+from db_utils import get_postgres_engine
+from tag_utils import BACKFILL_QUERY
+
+def main():
+    """Preenche a tabela noticia_tags (criada pela migração 009) a partir da coluna de texto noticias."TAGS"."""
+    parser = argparse.ArgumentParser(description="Normaliza as tags das notícias na tabela noticia_tags.")
+    parser.add_argument("--recriar", action="store_true",
+                        help="Apaga as linhas existentes antes de preencher (corrige divergências).")
+    args = parser.parse_args()
+
+    engine = get_postgres_engine()
+    if engine is None:
+        print("Não foi possível conectar à base de dados. Verifique o seu ficheiro secrets.toml.")
+        return
+
+    with engine.connect() as conn:
+        with conn.begin():
+            if not conn.execute(sqlalchemy.text("SELECT to_regclass('noticia_tags') IS NOT NULL")).scalar():
+                print("A tabela noticia_tags não existe. Rode antes: python migracoes.py")
+                return
+            if args.recriar:
+                conn.execute(sqlalchemy.text("TRUNCATE noticia_tags"))
+            inseridas = conn.execute(sqlalchemy.text(BACKFILL_QUERY)).rowcount
+            conn.execute(sqlalchemy.text("ANALYZE noticia_tags"))
+            total, tags = conn.execute(sqlalchemy.text(
+                'SELECT count(*), count(DISTINCT "TAG") FROM noticia_tags'
+            )).first()
+    print(f"{inseridas} linha(s) inserida(s). noticia_tags tem {total} associação(ões) e {tags} tag(s) distinta(s).")
+
+if __name__ == "__main__":
+    main()
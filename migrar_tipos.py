@@ -0,0 +1,304 @@
+import argparse
+import sqlalchemy
+from db_utils import get_postgres_engine
+from reparos import contar_pendentes
+
+# Colunas gravadas como texto que passam a ter tipo próprio, o que permite índices de intervalo
+# (datas) e filtros por flag sem conversão a cada leitura. Um tipo (tabela, coluna) significa "o mesmo
+# tipo daquela coluna": as colunas que referenciam um ID são convertidas junto com ele, para que as
+# junções comparem os tipos nativos e usem o índice da chave primária.
+CONVERSOES = [
+    ("noticias", "DATA", "timestamp"),
+    ("comentarios", "TIMESTAMP", "timestamp"),
+    ("contatos", "TIMESTAMP", "timestamp"),
+    ("classificados", "DATA_CRIACAO", "timestamp"),
+    ("classificados", "DESTAQUE", "boolean"),
+    ("classificados", "CLASSIFICADO_ID", "integer"),
+    ("usuarios", "DATA_CADASTRO", "timestamp"),
+    ("usuarios", "ULTIMO_ACESSO", "timestamp"),
+    ("usuarios", "DATA_EXPIRACAO_TOKEN", "timestamp"),
+    ("usuarios", "ID", "integer"),
+    ("financas", "USER_ID", ("usuarios", "ID")),
+    ("classificados", "USER_ID", ("usuarios", "ID")),
+    ("comentarios", "USER_ID", ("usuarios", "ID")),
+    ("tag_follows", "USER_ID", ("usuarios", "ID")),
+    ("noticia_likes", "USER_ID", ("usuarios", "ID")),
+    ("noticia_likes", "NOTICIA_ID", ("noticias", "ID")),
+]
+
+# Reparos de reparos.py que precisam terminar antes da conversão: o das colunas deslocadas acha as
+# linhas pelo texto do ID e lhes dá um ID numérico; convertidas antes, elas virariam NULL.
+REPAROS_ANTES = {("usuarios", "ID"): "usuarios_colunas_deslocadas"}
+
+# Índices que só fazem sentido (ou só são possíveis) com a coluna já tipada.
+INDICES_TIPADOS = {
+    ("noticias", "DATA"): ['CREATE INDEX IF NOT EXISTS noticias_data_idx ON noticias ("DATA" DESC)'],
+    ("comentarios", "TIMESTAMP"): ['CREATE INDEX IF NOT EXISTS comentarios_noticia_data_idx ON comentarios ("NOTICIA_ID", "TIMESTAMP")'],
+    ("contatos", "TIMESTAMP"): ['CREATE INDEX IF NOT EXISTS contatos_data_idx ON contatos ("TIMESTAMP")'],
+    ("classificados", "DESTAQUE"): [
+        'CREATE INDEX IF NOT EXISTS classificados_destaque_idx ON classificados ("DATA_CRIACAO" DESC) '
+        'WHERE "STATUS" = \'ATIVO\' AND "DESTAQUE"'
+    ],
+}
+
+# Conversores tolerantes: valores que não podem ser convertidos viram NULL em vez de abortar o lote,
+# e a migração conta quantos são antes de trocar a coluna.
+FUNCOES_DDL = r"""
+CREATE OR REPLACE FUNCTION texto_para_timestamp(valor text) RETURNS timestamp
+LANGUAGE plpgsql STABLE AS $$
+BEGIN
+    IF valor IS NULL OR btrim(valor) = '' THEN RETURN NULL; END IF;
+    RETURN valor::timestamp;
+EXCEPTION WHEN others THEN
+    RETURN NULL;
+END $$;
+
+CREATE OR REPLACE FUNCTION texto_para_inteiro(valor text) RETURNS integer
+LANGUAGE plpgsql IMMUTABLE AS $$
+BEGIN
+    IF valor !~ '^\s*[+-]?\d+(\.0+)?\s*$' THEN RETURN NULL; END IF;
+    RETURN valor::numeric::integer;
+EXCEPTION WHEN others THEN
+    RETURN NULL;
+END $$;
+
+CREATE OR REPLACE FUNCTION texto_para_numerico(valor text) RETURNS numeric
+LANGUAGE plpgsql IMMUTABLE AS $$
+BEGIN
+    IF valor !~ '^\s*[+-]?\d+(\.\d+)?\s*$' THEN RETURN NULL; END IF;
+    RETURN valor::numeric;
+EXCEPTION WHEN others THEN
+    RETURN NULL;
+END $$;
+
+CREATE OR REPLACE FUNCTION texto_para_boolean(valor text) RETURNS boolean
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT CASE
+        WHEN upper(btrim(valor)) IN ('TRUE', 'T', '1', 'SIM', 'S', 'YES', 'Y') THEN true
+        WHEN upper(btrim(valor)) IN ('FALSE', 'F', '0', 'NAO', 'NÃO', 'N', 'NO', '') THEN false
+    END
+$$;
+"""
+
+FUNCOES = {"timestamp": "texto_para_timestamp", "integer": "texto_para_inteiro", "boolean": "texto_para_boolean"}
+NOMES_PG = {"timestamp": "timestamp without time zone", "integer": "integer", "boolean": "boolean"}
+SUFIXO = "__novo"
+
+class ConversaoBloqueada(Exception):
+    pass
+
+def conversao(tipo, coluna):
+    """Expressão SQL que converte a coluna de texto para o tipo (tipos numéricos de outra coluna vão por numeric)."""
+    if tipo in FUNCOES:
+        return f'{FUNCOES[tipo]}("{coluna}"::text)'
+    return f'texto_para_numerico("{coluna}"::text)::{tipo}'
+
+COLUNA_QUERY = """
+    SELECT a.attnum, format_type(a.atttypid, a.atttypmod), a.attnotnull
+    FROM pg_attribute a
+    WHERE a.attrelid = to_regclass(:tabela) AND a.attname = :coluna AND NOT a.attisdropped
+"""
+
+# Índices (e as restrições que os usam) que dependem da coluna: são recriados sobre a coluna nova.
+INDICES_QUERY = """
+    SELECT DISTINCT i.relname, pg_get_indexdef(i.oid), c.conname, pg_get_constraintdef(c.oid)
+    FROM pg_depend d
+    JOIN pg_class i ON d.classid = 'pg_class'::regclass AND i.oid = d.objid AND i.relkind = 'i'
+    LEFT JOIN pg_constraint c ON c.conindid = i.oid AND c.conrelid = d.refobjid
+    WHERE d.refobjid = to_regclass(:tabela) AND d.refobjsubid = :attnum
+"""
+
+# Qualquer outro dependente (chave estrangeira, visão, coluna gerada, CHECK) impede a troca automática.
+# O DEFAULT da coluna de texto não é bloqueio: ele não vale para o tipo novo e sai junto com ela.
+BLOQUEIOS_QUERY = """
+    SELECT pg_describe_object(d.classid, d.objid, d.objsubid)
+    FROM pg_depend d
+    WHERE d.refobjid = to_regclass(:tabela) AND d.refobjsubid = :attnum AND d.deptype IN ('n', 'a')
+      AND d.classid <> 'pg_attrdef'::regclass
+      AND NOT (d.classid = 'pg_class'::regclass AND EXISTS (SELECT 1 FROM pg_class i WHERE i.oid = d.objid AND i.relkind = 'i'))
+      AND NOT (d.classid = 'pg_constraint'::regclass AND EXISTS (
+          SELECT 1 FROM pg_constraint c WHERE c.oid = d.objid AND c.contype IN ('p', 'u') AND c.conrelid = d.refobjid))
+    UNION
+    SELECT pg_describe_object('pg_constraint'::regclass, c.oid, 0)
+    FROM pg_constraint c
+    WHERE c.confrelid = to_regclass(:tabela) AND :attnum = ANY(c.confkey)
+"""
+
+def coluna_atual(conn, tabela, coluna):
+    """(attnum, tipo, NOT NULL) da coluna, ou None se ela não existir."""
+    return conn.execute(sqlalchemy.text(COLUNA_QUERY), {"tabela": tabela, "coluna": coluna}).first()
+
+def tipo_destino(conn, tipo):
+    """Resolve o tipo de destino. Para (tabela, coluna), retorna (tipo, referência ainda pendente ou None)."""
+    if not isinstance(tipo, tuple):
+        return tipo, None
+    for tabela, coluna, destino in CONVERSOES:
+        if (tabela, coluna) == tipo:
+            atual = coluna_atual(conn, tabela, coluna)
+            pendente = atual is not None and atual[1] != NOMES_PG[destino]
+            return destino, f"{tabela}.{coluna}" if pendente else None
+    atual = coluna_atual(conn, *tipo)
+    if atual is None:
+        raise ConversaoBloqueada(f"{tipo[0]}.{tipo[1]} não existe")
+    return atual[1], None
+
+def relatorio(conn, tabela, coluna, tipo):
+    """Conta as linhas preenchidas e as que não têm conversão válida."""
+    return conn.execute(sqlalchemy.text(
+        f'SELECT count("{coluna}"), count(*) FILTER (WHERE "{coluna}" IS NOT NULL AND {conversao(tipo, coluna)} IS NULL) '
+        f'FROM {tabela}'
+    )).first()
+
+def preencher_em_lotes(conn, tabela, coluna, tipo, paginas_por_lote=500):
+    """Cria a coluna nova e a preenche percorrendo a tabela por faixas de páginas (ctid), um lote por transação.
+
+    Cada faixa é lida por TID Range Scan, então o custo total é uma passada pela tabela; linhas já
+    convertidas (de uma execução interrompida) são puladas. Retorna o número de linhas convertidas.
+    """
+    nova = f"{coluna}{SUFIXO}"
+    with conn.begin():
+        conn.execute(sqlalchemy.text(f'ALTER TABLE {tabela} ADD COLUMN IF NOT EXISTS "{nova}" {tipo}'))
+        # Numa tabela particionada (financas) as faixas de ctid valem em cada partição: percorre até a maior.
+        paginas = conn.execute(sqlalchemy.text(
+            "SELECT coalesce(max(pg_relation_size(relid)), 0) / current_setting('block_size')::int "
+            "FROM pg_partition_tree(to_regclass(:tabela))"
+        ), {"tabela": tabela}).scalar()
+    query = sqlalchemy.text(f"""
+        UPDATE {tabela} SET "{nova}" = {conversao(tipo, coluna)}
+        WHERE ctid >= CAST('(' || :inicio || ',0)' AS tid) AND ctid < CAST('(' || :fim || ',0)' AS tid)
+          AND "{nova}" IS NULL AND "{coluna}" IS NOT NULL
+    """)
+    convertidas = 0
+    for inicio in range(0, paginas + 1, paginas_por_lote):
+        with conn.begin():
+            convertidas += conn.execute(query, {"inicio": inicio, "fim": inicio + paginas_por_lote}).rowcount
+    return convertidas
+
+def trocar_coluna(conn, tabela, coluna, tipo, forcar=False):
+    """Troca a coluna de texto pela convertida numa transação curta, sob bloqueio exclusivo.
+
+    Converte as linhas gravadas desde o preenchimento, recria índices e chaves primárias/únicas
+    sobre a coluna nova e preserva o NOT NULL. Retorna (linhas sem conversão, índices não recriados).
+    """
+    nova = f"{coluna}{SUFIXO}"
+    with conn.begin():
+        conn.execute(sqlalchemy.text(f"LOCK TABLE {tabela} IN ACCESS EXCLUSIVE MODE"))
+        attnum, _, not_null = coluna_atual(conn, tabela, coluna)
+        bloqueios = conn.execute(sqlalchemy.text(BLOQUEIOS_QUERY), {"tabela": tabela, "attnum": attnum}).scalars().all()
+        if bloqueios:
+            raise ConversaoBloqueada(f"{tabela}.{coluna} é usada por: {'; '.join(bloqueios)}")
+        conn.execute(sqlalchemy.text(
+            f'UPDATE {tabela} SET "{nova}" = {conversao(tipo, coluna)} WHERE "{nova}" IS NULL AND "{coluna}" IS NOT NULL'
+        ))
+        invalidas = conn.execute(sqlalchemy.text(
+            f'SELECT count(*) FROM {tabela} WHERE "{coluna}" IS NOT NULL AND "{nova}" IS NULL'
+        )).scalar()
+        if invalidas and not forcar:
+            raise ConversaoBloqueada(f"{tabela}.{coluna}: {invalidas} valor(es) sem conversão para {tipo} (use --forcar para gravá-los como NULL)")
+        indices = conn.execute(sqlalchemy.text(INDICES_QUERY), {"tabela": tabela, "attnum": attnum}).fetchall()
+
+        conn.execute(sqlalchemy.text(f'ALTER TABLE {tabela} DROP COLUMN "{coluna}"'))
+        conn.execute(sqlalchemy.text(f'ALTER TABLE {tabela} RENAME COLUMN "{nova}" TO "{coluna}"'))
+        if not_null and not invalidas:
+            conn.execute(sqlalchemy.text(f'ALTER TABLE {tabela} ALTER COLUMN "{coluna}" SET NOT NULL'))
+        if tipo == "boolean":
+            conn.execute(sqlalchemy.text(f'UPDATE {tabela} SET "{coluna}" = false WHERE "{coluna}" IS NULL'))
+            conn.execute(sqlalchemy.text(f'ALTER TABLE {tabela} ALTER COLUMN "{coluna}" SET DEFAULT false'))
+
+        nao_recriados = []
+        for nome, definicao_indice, restricao, definicao_restricao in indices:
+            # Índices sobre expressões de texto (ex.: substr) podem não valer para o tipo novo;
+            # esses são descartados e recriados pelo código que os mantém.
+            try:
+                with conn.begin_nested():
+                    if restricao:
+                        conn.execute(sqlalchemy.text(f'ALTER TABLE {tabela} ADD CONSTRAINT "{restricao}" {definicao_restricao}'))
+                    else:
+                        conn.execute(sqlalchemy.text(definicao_indice))
+            except sqlalchemy.exc.DBAPIError:
+                nao_recriados.append(nome)
+    with conn.begin():
+        conn.execute(sqlalchemy.text(f"ANALYZE {tabela}"))
+    return invalidas, nao_recriados
+
+def criar_indices_tipados(conn, tabela, coluna):
+    """Cria os índices previstos para a coluna já convertida."""
+    with conn.begin():
+        for ddl in INDICES_TIPADOS.get((tabela, coluna), []):
+            conn.execute(sqlalchemy.text(ddl))
+
+def main():
+    """Converte as datas, flags e IDs gravados como texto para timestamp, boolean e integer."""
+    parser = argparse.ArgumentParser(description="Migra colunas de texto para tipos nativos, em lotes.")
+    parser.add_argument("--aplicar", action="store_true", help="Executa a migração (sem isso, apenas relata).")
+    parser.add_argument("--colunas", help="Limita a tabela.coluna, separadas por vírgula (ex.: noticias.DATA).")
+    parser.add_argument("--lote-paginas", type=int, default=500, help="Páginas de 8 KB convertidas por transação.")
+    parser.add_argument("--forcar", action="store_true", help="Grava como NULL os valores que não puderem ser convertidos.")
+    args = parser.parse_args()
+
+    engine = get_postgres_engine()
+    if engine is None:
+        print("Não foi possível conectar à base de dados. Verifique o seu ficheiro secrets.toml.")
+        return
+
+    escolhidas = {c.strip() for c in args.colunas.split(",")} if args.colunas else None
+    if escolhidas:
+        # As colunas que referenciam um ID escolhido acompanham a conversão dele.
+        escolhidas |= {f"{tabela}.{coluna}" for tabela, coluna, tipo in CONVERSOES
+                       if isinstance(tipo, tuple) and f"{tipo[0]}.{tipo[1]}" in escolhidas}
+    with engine.connect() as conn:
+        with conn.begin():
+            conn.execute(sqlalchemy.text(FUNCOES_DDL))
+        for tabela, coluna, tipo in CONVERSOES:
+            if escolhidas and f"{tabela}.{coluna}" not in escolhidas:
+                continue
+            try:
+                with conn.begin():
+                    atual = coluna_atual(conn, tabela, coluna)
+                    tipo, pendente = tipo_destino(conn, tipo)
+                    if atual is not None and atual[1] != NOMES_PG.get(tipo, tipo):
+                        preenchidas, invalidas = relatorio(conn, tabela, coluna, tipo)
+                        reparo = REPAROS_ANTES.get((tabela, coluna))
+                        a_reparar = contar_pendentes(conn, reparo) if reparo else 0
+            except ConversaoBloqueada as e:
+                print(f"{tabela}.{coluna}: {e}, ignorada.")
+                continue
+            if atual is None:
+                print(f"{tabela}.{coluna}: coluna inexistente, ignorada.")
+                continue
+            if atual[1] == NOMES_PG.get(tipo, tipo):
+                if args.aplicar:
+                    criar_indices_tipados(conn, tabela, coluna)
+                print(f"{tabela}.{coluna}: já é {tipo}.")
+                continue
+            if not args.aplicar:
+                print(f"{tabela}.{coluna} ({atual[1]} → {tipo}): {preenchidas} valor(es), {invalidas} sem conversão."
+                      + (f" Convertida depois de {pendente}." if pendente else ""))
+                if a_reparar:
+                    print(f"  {a_reparar} linha(s) aguardam o reparo {reparo}: rode antes fix_database.py --aplicar.")
+                continue
+            if a_reparar:
+                print(f"ERRO: {tabela}.{coluna}: {a_reparar} linha(s) aguardam o reparo {reparo}. "
+                      f"Rode antes: python fix_database.py --aplicar")
+                continue
+            if pendente:
+                # Converter só um lado deixaria a junção comparando integer com text.
+                print(f"{tabela}.{coluna}: aguarda a conversão de {pendente}, ignorada.")
+                continue
+            convertidas = preencher_em_lotes(conn, tabela, coluna, tipo, args.lote_paginas)
+            try:
+                invalidas, nao_recriados = trocar_coluna(conn, tabela, coluna, tipo, forcar=args.forcar)
+            except ConversaoBloqueada as e:
+                print(f"ERRO: {e}. A coluna {coluna}{SUFIXO} fica preenchida para a próxima execução.")
+                continue
+            criar_indices_tipados(conn, tabela, coluna)
+            print(f"{tabela}.{coluna}: {convertidas} linha(s) convertida(s) para {tipo}"
+                  + (f", {invalidas} gravada(s) como NULL" if invalidas else "") + ".")
+            if nao_recriados:
+                print(f"  Índice(s) não recriado(s) no tipo novo: {', '.join(nao_recriados)}.")
+
+    if not args.aplicar:
+        print("\nExecução de simulação. Use --aplicar para converter as colunas.")
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,7 @@ import pandas as pd
 from datetime import datetime
 from social_utils import display_social_media_links
 from auth import get_db_connection
+from file_utils import media_url
 
 display_social_media_links()
 st.set_page_config(page_title="Eventos", layout="wide")
@@ -45,7 +46,7 @@ else:
             with st.container(border=True):
                 col1, col2 = st.columns([1, 3])
                 if pd.notna(evento['imagem_url']) and evento['imagem_url']:
-                    col1.image(evento['imagem_url'])
+                    col1.image(media_url(evento['imagem_url']))
                 
                 col2.subheader(evento['titulo'])
                 col2.write(f"**Data:** {evento['data_evento'].strftime('%d/%m/%Y')} às {evento['hora_evento']}")
@@ -2,6 +2,8 @@ import streamlit as st
 import pandas as pd
 from social_utils import display_social_media_links
 from auth import get_db_connection
+from search_utils import buscar, pagina_atual, paginacao
+from html_utils import sanitizar_html, resolver_imagens
 
 display_social_media_links()
 st.set_page_config(page_title="Perguntas Frequentes", layout="wide")
@@ -10,7 +12,7 @@ st.set_page_config(page_title="Perguntas Frequentes", layout="wide")
 def carregar_dados_faq():
     conn = get_db_connection()
     try:
-        df = pd.read_sql_query('SELECT * FROM "faq" WHERE "STATUS" = \'ATIVO\'', conn)
+        df = pd.read_sql_query('SELECT "PERGUNTA", "RESPOSTA", "RESPOSTA_HTML", "RESPOSTA_TEXTO" FROM "faq" WHERE "STATUS" = \'ATIVO\'', conn)
         return df
     except Exception as e:
         st.error(f"Erro ao carregar FAQ: {e}")
@@ -19,30 +21,40 @@ def carregar_dados_faq():
         if conn:
             conn.close()
 
+def resposta_html(item):
+    """HTML pré-processado da resposta; perguntas cadastradas depois do preprocessar_conteudo.py usam a original sanitizada."""
+    if pd.notna(item.get('RESPOSTA_HTML')):
+        return item['RESPOSTA_HTML']
+    return sanitizar_html(item.get('RESPOSTA'))
+
+RESULTADOS_POR_PAGINA = 10
+
+@st.cache_data(ttl=300)
+def buscar_faq(termo, pagina):
+    return buscar(termo, ["faq"], pagina, RESULTADOS_POR_PAGINA)
+
 st.title("❓ Perguntas Frequentes (FAQ)")
 st.write("Encontre aqui as respostas para as dúvidas mais comuns sobre nossa associação.")
 
 search_term = st.text_input("🔎 Buscar na FAQ", placeholder="Digite uma palavra-chave...")
 
-df_faq = carregar_dados_faq()
-
-if not df_faq.empty:
-    if search_term:
-        faq_filtrados = df_faq[
-            df_faq['PERGUNTA'].str.contains(search_term, case=False, na=False) |
-            df_faq['RESPOSTA'].str.contains(search_term, case=False, na=False)
-        ]
+if search_term:
+    resultados, total = buscar_faq(search_term, pagina_atual("pagina_busca_faq", search_term))
+    if resultados.empty:
+        st.warning("Nenhum resultado encontrado para sua busca.")
     else:
-        faq_filtrados = df_faq
-
-    if faq_filtrados.empty:
-        if search_term:
-            st.warning("Nenhum resultado encontrado para sua busca.")
-        else:
-            st.info("Nenhuma pergunta frequente cadastrada no momento.")
+        st.caption(f"{total} resultado(s) para \"{search_term}\"")
+        for item in resultados.itertuples():
+            with st.expander(item.titulo):
+                st.markdown(f"<small>{item.trecho}</small>", unsafe_allow_html=True)
+                st.divider()
+                st.markdown(resolver_imagens(resposta_html(item.dados)), unsafe_allow_html=True)
+        paginacao("pagina_busca_faq", total, RESULTADOS_POR_PAGINA)
+else:
+    df_faq = carregar_dados_faq()
+    if df_faq.empty:
+        st.info("Nenhuma pergunta frequente cadastrada no momento.")
     else:
-        for _, item in faq_filtrados.iterrows():
+        for _, item in df_faq.iterrows():
             with st.expander(item['PERGUNTA']):
-                st.markdown(item['RESPOSTA'], unsafe_allow_html=True)
-else:
-    st.info("Nenhuma pergunta frequente cadastrada no momento.")
+                st.markdown(resolver_imagens(resposta_html(item)), unsafe_allow_html=True)
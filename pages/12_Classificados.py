@@ -3,21 +3,52 @@ import pandas as pd
 from datetime import datetime, timedelta
 from social_utils import display_social_media_links
 from auth import get_db_connection, insert_record, get_max_id
+from search_utils import buscar, pagina_atual, paginacao
+from data_utils import formatar_data
+from classificados_utils import (
+    LIMITE_ANUNCIOS_POR_MEMBRO, DIAS_EXPIRACAO_ANUNCIO, COTA_QUERY, consulta_anuncios, filtro_busca
+)
 
 display_social_media_links()
 st.set_page_config(page_title="Mural de Classificados", layout="wide")
 
+# --- CONFIGURAÇÕES ---
+CATEGORIAS_CLASSIFICADOS = ["Venda", "Serviço", "Aluguel", "Doação", "Outros"]
+ANUNCIOS_POR_PAGINA = 20
+ANUNCIOS_DESTAQUE_MAX = 10
+
 # --- FUNÇÕES DE BANCO DE DADOS ---
-@st.cache_data
-def carregar_classificados():
-    """Carrega os dados de classificados do banco de dados."""
+@st.cache_data(ttl=300)
+def contar_anuncios_usuario(user_id):
+    """Conta os anúncios ativos ou pendentes do membro (COUNT sobre o índice parcial)."""
     conn = get_db_connection()
     try:
-        df = pd.read_sql_query('SELECT * FROM "classificados"', conn)
-        return df
+        return int(pd.read_sql_query(COTA_QUERY, conn, params={"user_id": user_id}).iloc[0, 0])
+    except Exception as e:
+        st.error(f"Erro ao verificar seus anúncios: {e}")
+        return 0
+    finally:
+        if conn:
+            conn.close()
+
+@st.cache_data(ttl=300)
+def carregar_classificados(categoria=None, ids=None, destaque=False, pagina=1, por_pagina=ANUNCIOS_POR_PAGINA):
+    """Carrega uma página dos anúncios ativos e não vencidos. Retorna (DataFrame, total)."""
+    conn = get_db_connection()
+    params = {
+        "limite": datetime.now() - timedelta(days=DIAS_EXPIRACAO_ANUNCIO),
+        "categoria": categoria,
+        "ids": list(ids) if ids is not None else None,
+        "limite_linhas": por_pagina,
+        "offset": (max(pagina, 1) - 1) * por_pagina,
+    }
+    try:
+        df = pd.read_sql_query(consulta_anuncios(categoria, ids, destaque), conn, params=params)
+        total = int(df['total'].iloc[0]) if not df.empty else 0
+        return df.drop(columns='total'), total
     except Exception as e:
         st.error(f"Erro ao carregar classificados: {e}")
-        return pd.DataFrame()
+        return pd.DataFrame(), 0
     finally:
         if conn:
             conn.close()
@@ -27,24 +58,29 @@ def salvar_classificado(user_id, nome_usuario, titulo, descricao, contato, categ
     new_id = get_max_id('classificados', '"CLASSIFICADO_ID"') + 1
     
     novo_classificado = {
-        '"CLASSIFICADO_ID"': str(new_id),
+        '"CLASSIFICADO_ID"': int(new_id),
         '"USER_ID"': user_id,
         '"NOME_USUARIO"': nome_usuario,
         '"TITULO"': titulo,
         '"DESCRICAO"': descricao,
         '"CONTATO"': contato,
-        '"DATA_CRIACAO"': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        '"DATA_CRIACAO"': datetime.now(),
         '"STATUS"': 'PENDENTE',
         '"CATEGORIA"': categoria,
-        '"DESTAQUE"': 'FALSE'
+        '"DESTAQUE"': False
     }
     insert_record('classificados', novo_classificado)
     st.cache_data.clear()
 
-# --- CONFIGURAÇÕES ---
-CATEGORIAS_CLASSIFICADOS = ["Venda", "Serviço", "Aluguel", "Doação", "Outros"]
-LIMITE_ANUNCIOS_POR_MEMBRO = 3
-DIAS_EXPIRACAO_ANUNCIO = 30
+@st.cache_data(ttl=300)
+def buscar_classificados(termo, categoria, pagina):
+    """Busca textual nos anúncios ativos e não vencidos; retorna (IDs da página por relevância, total)."""
+    resultados, total = buscar(
+        termo, ["classificados"], pagina, ANUNCIOS_POR_PAGINA,
+        filtros={"classificados": filtro_busca(categoria)},
+        parametros={"limite": datetime.now() - timedelta(days=DIAS_EXPIRACAO_ANUNCIO), "categoria": categoria},
+    )
+    return tuple(resultados['id']), total
 
 st.title("📢 Mural de Classificados")
 st.write("Um espaço para membros anunciarem produtos e serviços.")
@@ -52,12 +88,7 @@ st.write("Um espaço para membros anunciarem produtos e serviços.")
 # --- Formulário para Novo Anúncio ---
 if 'member_logged_in' in st.session_state and st.session_state['member_logged_in']:
     user_info = st.session_state['member_info']
-    df_classificados_check = carregar_classificados()
-    anuncios_do_usuario = df_classificados_check[
-        (df_classificados_check['USER_ID'] == user_info['ID']) & 
-        (df_classificados_check['STATUS'].isin(['ATIVO', 'PENDENTE']))
-    ]
-    num_anuncios = len(anuncios_do_usuario)
+    num_anuncios = contar_anuncios_usuario(user_info['ID'])
 
     if num_anuncios >= LIMITE_ANUNCIOS_POR_MEMBRO:
         st.warning(f"Você atingiu o seu limite de {LIMITE_ANUNCIOS_POR_MEMBRO} anúncios ativos ou pendentes.")
@@ -88,29 +119,18 @@ col1, col2 = st.columns(2)
 search_term = col1.text_input("🔎 Buscar por palavra-chave", placeholder="Ex: Bicicleta, Serviço...")
 selected_category = col2.selectbox("Filtrar por categoria:", ["Todas"] + CATEGORIAS_CLASSIFICADOS)
 
-df_classificados = carregar_classificados()
-
-df_classificados['DATA_CRIACAO'] = pd.to_datetime(df_classificados['DATA_CRIACAO'])
-data_limite = datetime.now() - timedelta(days=DIAS_EXPIRACAO_ANUNCIO)
-df_classificados['DESTAQUE'] = df_classificados['DESTAQUE'].fillna(False)
-anuncios_validos = df_classificados[
-    (df_classificados['STATUS'] == 'ATIVO') &
-    (df_classificados['DATA_CRIACAO'] >= data_limite)
-].sort_values(by="DATA_CRIACAO", ascending=False)
-
-anuncios_para_exibir = anuncios_validos
-
-if selected_category != "Todas":
-    anuncios_para_exibir = anuncios_para_exibir[anuncios_para_exibir['CATEGORIA'] == selected_category]
+categoria = None if selected_category == "Todas" else selected_category
+pagina = pagina_atual("pagina_classificados", (search_term, selected_category))
 
 if search_term:
-    anuncios_para_exibir = anuncios_para_exibir[
-        anuncios_para_exibir['TITULO'].str.contains(search_term, case=False, na=False) |
-        anuncios_para_exibir['DESCRICAO'].str.contains(search_term, case=False, na=False)
-    ]
-
-anuncios_destaque = anuncios_para_exibir[anuncios_para_exibir['DESTAQUE'] == 'TRUE']
-anuncios_normais = anuncios_para_exibir[anuncios_para_exibir['DESTAQUE'] != 'TRUE']
+    # Na busca, a página de resultados vem por relevância, com os destaques marcados na própria lista.
+    ids_busca, total_normais = buscar_classificados(search_term, categoria, pagina)
+    anuncios_destaque = pd.DataFrame()
+    anuncios_normais, _ = carregar_classificados(categoria, ids_busca, destaque=None) if ids_busca else (pd.DataFrame(), 0)
+else:
+    # Os destaques ficam fixos no topo; só os anúncios normais são paginados.
+    anuncios_destaque, _ = carregar_classificados(categoria, destaque=True, por_pagina=ANUNCIOS_DESTAQUE_MAX)
+    anuncios_normais, total_normais = carregar_classificados(categoria, pagina=pagina)
 
 if anuncios_destaque.empty and anuncios_normais.empty:
     if search_term:
@@ -124,15 +144,18 @@ else:
             with st.container(border=True):
                 st.subheader(f"🌟 {anuncio['TITULO']}")
                 categoria_tag = f"| Categoria: **{anuncio.get('CATEGORIA', 'N/A')}**"
-                st.caption(f"Publicado por: {anuncio['NOME_USUARIO']} em {pd.to_datetime(anuncio['DATA_CRIACAO']).strftime('%d/%m/%Y')} {categoria_tag}")
+                st.caption(f"Publicado por: {anuncio['NOME_USUARIO']} em {formatar_data(anuncio['DATA_CRIACAO'])} {categoria_tag}")
                 st.write(anuncio['DESCRICAO'])
                 st.success(f"**Contato:** {anuncio['CONTATO']}")
         st.divider()
 
     for _, anuncio in anuncios_normais.iterrows():
         with st.container(border=True):
-            st.subheader(anuncio['TITULO'])
+            destacado = pd.notna(anuncio.get('DESTAQUE')) and bool(anuncio['DESTAQUE'])
+            st.subheader(f"🌟 {anuncio['TITULO']}" if destacado else anuncio['TITULO'])
             categoria_tag = f"| Categoria: **{anuncio.get('CATEGORIA', 'N/A')}**"
-            st.caption(f"Publicado por: {anuncio['NOME_USUARIO']} em {pd.to_datetime(anuncio['DATA_CRIACAO']).strftime('%d/%m/%Y')} {categoria_tag}")
+            st.caption(f"Publicado por: {anuncio['NOME_USUARIO']} em {formatar_data(anuncio['DATA_CRIACAO'])} {categoria_tag}")
             st.write(anuncio['DESCRICAO'])
             st.success(f"**Contato:** {anuncio['CONTATO']}")
+
+    paginacao("pagina_classificados", total_normais, ANUNCIOS_POR_PAGINA)
@@ -2,6 +2,7 @@ import streamlit as st
 import pandas as pd
 from social_utils import display_social_media_links
 from auth import get_db_connection
+from file_utils import media_url
 
 display_social_media_links()
 st.set_page_config(page_title="Sobre Nós", layout="wide")
@@ -24,7 +25,7 @@ institucional = carregar_dados_institucionais()
 
 if institucional is not None:
     st.title("Sobre a Nossa Associação")
-    st.image(institucional['logo_url'], width=200)
+    st.image(media_url(institucional['logo_url']), width=200)
 
     st.header("Nossa História")
     st.write(institucional['historico'])
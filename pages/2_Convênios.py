@@ -1,33 +1,74 @@
 import streamlit as st
 import pandas as pd
-import numpy as np
 from social_utils import display_social_media_links
 from auth import get_db_connection, insert_record, update_record, get_max_id
+from file_utils import media_url
+from search_utils import buscar, pagina_atual, paginacao
+from autocomplete_utils import indice_convenios
 
 display_social_media_links()
 st.set_page_config(page_title="Nossos Convênios", layout="wide")
 
+CONVENIOS_POR_PAGINA = 12
+
 # --- FUNÇÕES DE BANCO DE DADOS ---
-@st.cache_data
-def carregar_dados_db(table_name):
-    """Carrega uma tabela inteira do banco de dados para um DataFrame."""
+def _consultar(query, params=None, erro="Erro ao carregar os convênios"):
+    """Roda a consulta e devolve o DataFrame com as colunas em minúsculas, como o resto da página espera."""
     conn = get_db_connection()
     try:
-        df = pd.read_sql_query(f"SELECT * FROM {table_name}", conn)
+        df = pd.read_sql_query(query, conn, params=params)
         df.columns = [x.lower() for x in df.columns]
         return df
     except Exception as e:
-        st.error(f"Erro ao carregar dados da tabela {table_name}: {e}")
+        st.error(f"{erro}: {e}")
         return pd.DataFrame()
     finally:
         if conn:
             conn.close()
 
+@st.cache_data
+def carregar_convenios(pagina):
+    """Carrega uma página dos convênios ativos. Retorna (DataFrame, total)."""
+    df = _consultar(
+        'SELECT "CONVENIO_ID", "NOME_CONVENIO", "ICON_URL", count(*) OVER () AS total FROM convenios '
+        'WHERE "STATUS" = \'ATIVO\' ORDER BY "NOME_CONVENIO" LIMIT %(limite)s OFFSET %(offset)s',
+        {"limite": CONVENIOS_POR_PAGINA, "offset": (max(pagina, 1) - 1) * CONVENIOS_POR_PAGINA},
+    )
+    total = int(df['total'].iloc[0]) if not df.empty else 0
+    return df.drop(columns='total', errors='ignore'), total
+
+@st.cache_data
+def carregar_convenios_por_ids(ids):
+    """Carrega os convênios ativos de uma página da busca, na ordem dada."""
+    df = _consultar(
+        'SELECT "CONVENIO_ID", "NOME_CONVENIO", "ICON_URL" FROM convenios '
+        'WHERE "STATUS" = \'ATIVO\' AND "CONVENIO_ID" = ANY(%(ids)s)',
+        {"ids": [int(i) for i in ids]},
+    )
+    ordem = {int(convenio_id): i for i, convenio_id in enumerate(ids)}
+    return df.sort_values(by='convenio_id', key=lambda coluna: coluna.map(lambda v: ordem.get(int(v)))) if not df.empty else df
+
+@st.cache_data
+def carregar_convenio(convenio_id):
+    """Carrega o convênio aberto em detalhe, ou None."""
+    df = _consultar('SELECT * FROM convenios WHERE "CONVENIO_ID" = %(id)s', {"id": convenio_id})
+    return df.to_dict('records')[0] if not df.empty else None
+
+@st.cache_data
+def carregar_parceiros(convenio_id):
+    return _consultar('SELECT * FROM parceiros WHERE "CONVENIO_ID" = %(id)s', {"id": convenio_id},
+                      erro="Erro ao carregar os parceiros")
+
+@st.cache_data
+def carregar_ratings(convenio_id):
+    return _consultar('SELECT * FROM convenio_ratings WHERE convenio_id = %(id)s', {"id": convenio_id},
+                      erro="Erro ao carregar as avaliações")
+
 def salvar_rating(convenio_id, user_id, rating):
     """Salva ou atualiza a avaliação de um usuário para um convênio."""
-    df_ratings = carregar_dados_db('convenio_ratings')
+    df_ratings = carregar_ratings(convenio_id)
 
-    existing_rating = df_ratings[(df_ratings['user_id'] == user_id) & (df_ratings['convenio_id'] == convenio_id)]
+    existing_rating = df_ratings[df_ratings['user_id'] == user_id] if not df_ratings.empty else df_ratings
 
     if not existing_rating.empty:
         rating_id = existing_rating.iloc[0]['rating_id']
@@ -44,10 +85,15 @@ def salvar_rating(convenio_id, user_id, rating):
     
     st.cache_data.clear()
 
-# --- CARREGAMENTO INICIAL DOS DADOS ---
-df_convenios = carregar_dados_db('convenios')
-df_parceiros = carregar_dados_db('parceiros')
-df_ratings = carregar_dados_db('convenio_ratings')
+def escolher_sugestao(rotulo):
+    """Preenche a caixa de busca com a sugestão clicada."""
+    st.session_state["busca_convenios"] = rotulo
+
+@st.cache_data(ttl=300)
+def buscar_convenios(termo, pagina):
+    """Busca textual nos convênios ativos; retorna ({id: trecho} da página por relevância, total)."""
+    resultados, total = buscar(termo, ["convenios"], pagina, CONVENIOS_POR_PAGINA)
+    return dict(zip(resultados['id'], resultados['trecho'])), total
 
 st.title("Rede de Convênios")
 st.write("Explore os benefícios exclusivos para nossos associados.")
@@ -66,13 +112,13 @@ if st.session_state.convenio_selecionado:
     col1, col2 = st.columns([1, 2])
 
     with col1:
-        st.image(convenio['imagem_url'], use_container_width=True)
+        st.image(media_url(convenio['imagem_url']), use_container_width=True)
 
     with col2:
-        st.image(convenio['icon_url'], width=60)
+        st.image(media_url(convenio['icon_url']), width=60)
         st.write(convenio['descricao'])
 
-        ratings_deste_convenio = df_ratings[df_ratings['convenio_id'] == convenio['convenio_id']]
+        ratings_deste_convenio = carregar_ratings(int(convenio['convenio_id']))
         avg_rating = ratings_deste_convenio['rating'].mean()
         rating_count = len(ratings_deste_convenio)
 
@@ -101,7 +147,7 @@ if st.session_state.convenio_selecionado:
 
         st.divider()
         st.subheader("Parceiros Associados")
-        parceiros_do_convenio = df_parceiros[df_parceiros['convenio_id'] == convenio['convenio_id']]
+        parceiros_do_convenio = carregar_parceiros(int(convenio['convenio_id']))
 
         if parceiros_do_convenio.empty:
             st.info("Nenhum parceiro específico cadastrado para este convênio ainda.")
@@ -114,18 +160,31 @@ if st.session_state.convenio_selecionado:
                     if pd.notna(parceiro['telefone']): st.write(f"📞 {parceiro['telefone']}")
                     if pd.notna(parceiro['website']): st.markdown(f"🌐 [{parceiro['website']}]({parceiro['website']})")
 else:
-    search_term = st.text_input("🔎 Buscar por nome ou tipo de serviço", placeholder="Ex: Saúde, Educação, Academia...")
+    search_term = st.text_input("🔎 Buscar por nome, tipo de serviço ou parceiro", placeholder="Ex: Saúde, Educação, Academia...", key="busca_convenios")
+
+    # Sugestões do índice em memória: tolera erros de digitação e já casa prefixos a cada tecla.
+    sugestoes = indice_convenios().sugerir(search_term) if search_term else []
+    rotulos = list(dict.fromkeys(
+        sugestao['rotulo'] for sugestao in sugestoes if sugestao['rotulo'].casefold() != search_term.strip().casefold()
+    ))
+    if rotulos:
+        cols_sugestoes = st.columns(len(rotulos))
+        for col, rotulo in zip(cols_sugestoes, rotulos):
+            col.button(rotulo, key=f"sugestao_{rotulo}", on_click=escolher_sugestao, args=(rotulo,))
     st.write("Clique em 'Ver Mais' para detalhes de cada convênio.")
     
-    convenios_ativos = df_convenios[df_convenios['status'] == 'ATIVO']
-
+    pagina = pagina_atual("pagina_convenios", search_term)
+    trechos = {}
     if search_term:
-        convenios_filtrados = convenios_ativos[
-            convenios_ativos['nome_convenio'].str.contains(search_term, case=False, na=False) |
-            convenios_ativos['tipo_servico'].str.contains(search_term, case=False, na=False)
-        ]
+        trechos, total = buscar_convenios(search_term, pagina)
+        ids = tuple(trechos)
+        if not ids:
+            # Nenhum resultado da busca textual: mostra os convênios sugeridos, que toleram erros de digitação.
+            ids = tuple(dict.fromkeys(str(sugestao['convenio_id']) for sugestao in sugestoes if sugestao['convenio_id']))
+            total = len(ids)
+        convenios_filtrados = carregar_convenios_por_ids(ids) if ids else pd.DataFrame()
     else:
-        convenios_filtrados = convenios_ativos
+        convenios_filtrados, total = carregar_convenios(pagina)
 
     num_colunas = 3
     cols = st.columns(num_colunas)
@@ -138,8 +197,11 @@ else:
             with cols[col_index]:
                 with st.container(border=True):
                     st.subheader(convenio.nome_convenio)
-                    st.image(convenio.icon_url, width=50)
+                    st.image(media_url(convenio.icon_url), width=50)
+                    if str(convenio.convenio_id) in trechos:
+                        st.markdown(f"<small>{trechos[str(convenio.convenio_id)]}</small>", unsafe_allow_html=True)
                     
                     if st.button("Ver Mais", key=f"btn_{convenio.convenio_id}"):
-                        st.session_state.convenio_selecionado = df_convenios.loc[df_convenios['convenio_id'] == convenio.convenio_id].to_dict('records')[0]
-                        st.rerun()
\ No newline at end of file
+                        st.session_state.convenio_selecionado = carregar_convenio(int(convenio.convenio_id))
+                        st.rerun()
+        paginacao("pagina_convenios", total, CONVENIOS_POR_PAGINA)
@@ -1,28 +1,138 @@
 import streamlit as st
 import pandas as pd
-import math
+import sqlalchemy
 from datetime import datetime
 from social_utils import display_social_media_links
 from auth import get_db_connection, insert_record, delete_record, get_max_id
+from data_utils import formatar_data
+from html_utils import sanitizar_html, resolver_imagens
+from file_utils import media_url
+from search_utils import buscar, pagina_atual, paginacao
+from tag_utils import STATUS_PUBLICADA
 
 display_social_media_links()
 st.set_page_config(page_title="Notícias", layout="wide")
 
+ITENS_POR_PAGINA = 5
+
+# Colunas da listagem (sem o corpo completo, carregado só quando o leitor expande a notícia).
+COLUNAS_LISTA = """
+    n."ID", n."TITULO", n."IMAGEM_URL", n."DATA", n."STATUS", n."DESTAQUE", n."RESUMO",
+    ARRAY(SELECT t."TAG" FROM noticia_tags t WHERE t."NOTICIA_ID" = n."ID" ORDER BY t."TAG") AS "TAGS"
+"""
+
 # --- FUNÇÕES DE BANCO DE DADOS ---
 @st.cache_data
-def carregar_dados_db(table_name):
-    """Carrega uma tabela inteira do banco de dados para um DataFrame."""
+def carregar_lista_noticias(tags_selecionadas=(), pagina=1):
+    """Carrega uma página das notícias publicadas, filtrando pelas tags no banco. Retorna (DataFrame, total)."""
+    conn = get_db_connection()
+    try:
+        query = f"""
+            SELECT {COLUNAS_LISTA}, count(*) OVER () AS total
+            FROM noticias n
+            WHERE n."STATUS" = %(status)s
+              AND (%(sem_filtro)s OR n."ID" IN (
+                  SELECT "NOTICIA_ID" FROM noticia_tags WHERE "TAG" = ANY(%(tags)s)
+              ))
+            ORDER BY n."DATA" DESC
+            LIMIT %(limite)s OFFSET %(offset)s
+        """
+        params = {"status": STATUS_PUBLICADA, "sem_filtro": not tags_selecionadas, "tags": list(tags_selecionadas),
+                  "limite": ITENS_POR_PAGINA, "offset": (max(pagina, 1) - 1) * ITENS_POR_PAGINA}
+        df = pd.read_sql_query(query, conn, params=params)
+        total = int(df['total'].iloc[0]) if not df.empty else 0
+        return df.drop(columns='total'), total
+    except Exception as e:
+        st.error(f"Erro ao carregar notícias: {e}")
+        return pd.DataFrame(), 0
+    finally:
+        if conn:
+            conn.close()
+
+@st.cache_data
+def carregar_noticias_por_ids(ids):
+    """Carrega as notícias de uma página da busca, na ordem dada."""
     conn = get_db_connection()
     try:
-        df = pd.read_sql_query(f'SELECT * FROM "{table_name}"', conn)
-        return df
+        query = f'SELECT {COLUNAS_LISTA} FROM noticias n WHERE n."ID" = ANY(%(ids)s)'
+        df = pd.read_sql_query(query, conn, params={"ids": [int(i) for i in ids]})
+        ordem = {int(noticia_id): i for i, noticia_id in enumerate(ids)}
+        return df.sort_values(by='ID', key=lambda coluna: coluna.map(lambda v: ordem.get(int(v))))
     except Exception as e:
-        st.error(f"Erro ao carregar dados da tabela {table_name}: {e}")
+        st.error(f"Erro ao carregar notícias: {e}")
         return pd.DataFrame()
     finally:
         if conn:
             conn.close()
 
+@st.cache_data
+def carregar_interacoes(ids):
+    """Likes, comentários aprovados e fotos só das notícias exibidas. Retorna (likes, comentários, galeria)."""
+    conn = get_db_connection()
+    params = {"ids": [int(i) for i in ids]}
+    try:
+        likes = pd.read_sql_query('SELECT "NOTICIA_ID", "USER_ID" FROM noticia_likes WHERE "NOTICIA_ID" = ANY(%(ids)s)',
+                                  conn, params=params)
+        comentarios = pd.read_sql_query(
+            'SELECT * FROM comentarios WHERE "NOTICIA_ID" = ANY(%(ids)s) AND "STATUS" = \'APROVADO\' ORDER BY "TIMESTAMP"',
+            conn, params=params)
+        galeria = pd.read_sql_query('SELECT * FROM galeria_fotos WHERE "NOTICIA_ID" = ANY(%(ids)s)', conn, params=params)
+        return likes, comentarios, galeria
+    except Exception as e:
+        st.error(f"Erro ao carregar curtidas e comentários: {e}")
+        return pd.DataFrame(columns=["NOTICIA_ID", "USER_ID"]), pd.DataFrame(columns=["NOTICIA_ID"]), pd.DataFrame(columns=["NOTICIA_ID"])
+    finally:
+        if conn:
+            conn.close()
+
+@st.cache_data
+def carregar_facetas_tags():
+    """Lista as tags das notícias publicadas com a quantidade de notícias de cada uma."""
+    conn = get_db_connection()
+    try:
+        query = """
+            SELECT t."TAG", count(*) AS "TOTAL"
+            FROM noticia_tags t
+            JOIN noticias n ON n."ID" = t."NOTICIA_ID"
+            WHERE n."STATUS" = %(status)s
+            GROUP BY t."TAG"
+            ORDER BY t."TAG"
+        """
+        df = pd.read_sql_query(query, conn, params={"status": STATUS_PUBLICADA})
+        return dict(zip(df['TAG'], df['TOTAL']))
+    except Exception as e:
+        st.error(f"Erro ao carregar as tags: {e}")
+        return {}
+    finally:
+        if conn:
+            conn.close()
+
+@st.cache_data
+def carregar_conteudo_noticia(noticia_id):
+    """Carrega o HTML sanitizado de uma notícia, apenas quando o leitor o expande."""
+    conn = get_db_connection()
+    try:
+        query = 'SELECT "CONTEUDO_HTML", "CONTEUDO" FROM noticias WHERE "ID" = %(noticia_id)s'
+        df = pd.read_sql_query(query, conn, params={"noticia_id": noticia_id})
+        if df.empty:
+            return ""
+        row = df.iloc[0]
+        return row['CONTEUDO_HTML'] if pd.notna(row['CONTEUDO_HTML']) else sanitizar_html(row['CONTEUDO'])
+    except Exception as e:
+        st.error(f"Erro ao carregar a notícia: {e}")
+        return ""
+    finally:
+        if conn:
+            conn.close()
+
+@st.cache_data(ttl=300)
+def buscar_noticias(termo, tags_selecionadas, pagina):
+    """Busca textual nas notícias publicadas (e nas tags escolhidas). Retorna ({id: trecho} por relevância, total)."""
+    filtros = {"noticias": 't."ID" IN (SELECT "NOTICIA_ID" FROM noticia_tags WHERE "TAG" = ANY(:tags))'} if tags_selecionadas else None
+    resultados, total = buscar(termo, ["noticias"], pagina, ITENS_POR_PAGINA,
+                               filtros=filtros, parametros={"tags": list(tags_selecionadas)})
+    return dict(zip(resultados['id'], resultados['trecho'])), total
+
 def salvar_like(noticia_id, user_id):
     """Salva um novo like no banco de dados."""
     new_id = get_max_id('noticia_likes', '"LIKE_ID"') + 1
@@ -39,18 +149,64 @@ def remover_like(noticia_id, user_id):
     delete_record('noticia_likes', {'"NOTICIA_ID"': noticia_id, '"USER_ID"': user_id})
     st.cache_data.clear()
 
+@st.cache_data
+def carregar_tags_seguidas(user_id):
+    """Carrega as tags seguidas por um membro."""
+    conn = get_db_connection()
+    try:
+        query = 'SELECT "TAG_NAME" FROM tag_follows WHERE "USER_ID" = %(user_id)s ORDER BY "TAG_NAME"'
+        return pd.read_sql_query(query, conn, params={"user_id": user_id})['TAG_NAME'].tolist()
+    except Exception as e:
+        st.error(f"Erro ao carregar as tags seguidas: {e}")
+        return []
+    finally:
+        if conn:
+            conn.close()
+
+# Aplica só a diferença entre as tags seguidas e as escolhidas: remove as desmarcadas com um único
+# DELETE e insere as novas em lote, numerando os FOLLOW_ID a partir do máximo atual.
+SINCRONIZAR_TAG_FOLLOWS_QUERY = """
+    WITH escolhidas AS (
+        SELECT DISTINCT unnest(CAST(:tags AS TEXT[])) AS tag
+    ),
+    removidas AS (
+        DELETE FROM tag_follows
+        WHERE "USER_ID" = :user_id AND NOT ("TAG_NAME" = ANY(CAST(:tags AS TEXT[])))
+        RETURNING 1
+    ),
+    novas AS (
+        SELECT e.tag, row_number() OVER (ORDER BY e.tag) AS ordem
+        FROM escolhidas e
+        WHERE NOT EXISTS (
+            SELECT 1 FROM tag_follows f WHERE f."USER_ID" = :user_id AND f."TAG_NAME" = e.tag
+        )
+    ),
+    inseridas AS (
+        INSERT INTO tag_follows ("FOLLOW_ID", "USER_ID", "TAG_NAME")
+        SELECT (SELECT COALESCE(MAX("FOLLOW_ID"), 0) FROM tag_follows) + n.ordem, :user_id, n.tag
+        FROM novas n
+        RETURNING 1
+    )
+    SELECT (SELECT count(*) FROM removidas), (SELECT count(*) FROM inseridas)
+"""
+
 def salvar_tag_follows(user_id, tags_a_seguir):
-    """Salva as preferências de tags de um usuário, substituindo as antigas."""
-    delete_record('tag_follows', {'"USER_ID"': user_id})
-    for tag in tags_a_seguir:
-        new_id = get_max_id('tag_follows', '"FOLLOW_ID"') + 1
-        new_follow = {
-            '"FOLLOW_ID"': int(new_id),
-            '"USER_ID"': user_id,
-            '"TAG_NAME"': tag
-        }
-        insert_record('tag_follows', new_follow)
-    st.cache_data.clear()
+    """Sincroniza as tags seguidas por um usuário, gravando apenas as alterações em uma transação."""
+    conn = get_db_connection()
+    if conn is None: return False
+    try:
+        with conn.begin():
+            # Serializa a numeração dos FOLLOW_ID entre gravações simultâneas, sem bloquear leituras.
+            conn.execute(sqlalchemy.text("SELECT pg_advisory_xact_lock(hashtext('tag_follows'))"))
+            conn.execute(sqlalchemy.text(SINCRONIZAR_TAG_FOLLOWS_QUERY),
+                         {"user_id": user_id, "tags": list(tags_a_seguir)})
+        carregar_tags_seguidas.clear(user_id)
+        return True
+    except Exception as e:
+        st.error(f"Erro ao salvar as preferências: {e}")
+        return False
+    finally:
+        conn.close()
 
 def salvar_comentario(noticia_id, user_id, nome_usuario, comentario):
     """Salva um novo comentário no banco de dados com status PENDENTE."""
@@ -61,92 +217,76 @@ def salvar_comentario(noticia_id, user_id, nome_usuario, comentario):
         '"USER_ID"': user_id,
         '"NOME_USUARIO"': nome_usuario,
         '"COMENTARIO"': comentario,
-        '"TIMESTAMP"': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        '"TIMESTAMP"': datetime.now(),
         '"STATUS"': 'PENDENTE'
     }
     insert_record('comentarios', novo_comentario)
 
 # --- CARREGAMENTO DOS DADOS ---
-df_noticias = carregar_dados_db('noticias')
-df_galeria = carregar_dados_db('galeria_fotos')
-df_comentarios = carregar_dados_db('comentarios')
-df_likes = carregar_dados_db('noticia_likes')
-df_tag_follows = carregar_dados_db('tag_follows')
+facetas_tags = carregar_facetas_tags()
+all_tags = list(facetas_tags)
 
 st.title("Mural de Notícias")
 
-noticias_publicadas = df_noticias[df_noticias['STATUS'] == 'PUBLICADO'].sort_values(by="DATA", ascending=False)
-
-# --- LÓGICA DE FILTRAGEM POR TAG ---
-all_tags = set()
-if 'TAGS' in noticias_publicadas.columns:
-    tags_series = noticias_publicadas['TAGS'].dropna().str.split(',')
-    all_tags = sorted(list(set([tag.strip() for sublist in tags_series for tag in sublist if tag.strip()])))
-
+# --- LÓGICA DE BUSCA E FILTRAGEM POR TAG ---
+col_busca, col_tags = st.columns(2)
+search_term = col_busca.text_input("🔎 Buscar notícias", placeholder="Digite uma palavra-chave...")
 if all_tags:
-    selected_tags = st.multiselect("Filtrar por tags:", options=all_tags)
+    selected_tags = col_tags.multiselect("Filtrar por tags:", options=all_tags,
+                                         format_func=lambda tag: f"{tag} ({facetas_tags[tag]})")
 else:
     selected_tags = []
 
+tags_filtro = tuple(sorted(selected_tags))
+pagina = pagina_atual("pagina_noticias", (search_term, tags_filtro))
+
+# Só a página exibida vem do banco, com as curtidas, comentários e fotos dela.
+trechos = {}
+if search_term:
+    trechos, total_noticias = buscar_noticias(search_term, tags_filtro, pagina)
+    noticias_para_exibir = carregar_noticias_por_ids(tuple(trechos)) if trechos else pd.DataFrame()
+else:
+    noticias_para_exibir, total_noticias = carregar_lista_noticias(tags_filtro, pagina)
+
 if 'member_logged_in' in st.session_state and st.session_state['member_logged_in']:
     st.divider()
     with st.expander("🔔 Gerenciar notificações por tag"):
         user_id = st.session_state['member_info']['ID']
-        tags_seguidas = df_tag_follows[df_tag_follows['USER_ID'] == user_id]['TAG_NAME'].tolist()
+        tags_seguidas = carregar_tags_seguidas(user_id)
 
         novas_tags_seguidas = st.multiselect(
             "Selecione as tags que você deseja seguir para receber novidades:",
-            options=all_tags,
+            options=sorted(set(all_tags) | set(tags_seguidas)),
             default=tags_seguidas
         )
 
         if st.button("Salvar minhas preferências"):
-            salvar_tag_follows(user_id, novas_tags_seguidas)
-            st.success("Preferências salvas!")
-            st.rerun()
-
-if selected_tags:
-    def has_tags(row_tags):
-        if pd.isna(row_tags):
-            return False
-        return any(tag in [t.strip() for t in row_tags.split(',')] for tag in selected_tags)
+            if salvar_tag_follows(user_id, novas_tags_seguidas):
+                st.success("Preferências salvas!")
+                st.rerun()
 
-    noticias_filtradas = noticias_publicadas[noticias_publicadas['TAGS'].apply(has_tags)]
-else:
-    noticias_filtradas = noticias_publicadas
-
-if not noticias_publicadas.empty:
-    if 'page_num' not in st.session_state:
-        st.session_state.page_num = 1
-
-    ITENS_POR_PAGINA = 5
-    total_noticias = len(noticias_filtradas)
-    total_paginas = math.ceil(total_noticias / ITENS_POR_PAGINA)
-
-    if st.session_state.page_num > total_paginas:
-        st.session_state.page_num = total_paginas
-    if st.session_state.page_num < 1:
-        st.session_state.page_num = 1
-
-    start_idx = (st.session_state.page_num - 1) * ITENS_POR_PAGINA
-    end_idx = start_idx + ITENS_POR_PAGINA
-    noticias_para_exibir = noticias_filtradas.iloc[start_idx:end_idx]
+if not noticias_para_exibir.empty:
+    df_likes, df_comentarios, df_galeria = carregar_interacoes(tuple(int(i) for i in noticias_para_exibir['ID']))
 
     for noticia in noticias_para_exibir.itertuples():
         with st.container(border=True):
             col1, col2 = st.columns([1, 3])
             with col1:
                 if pd.notna(noticia.IMAGEM_URL):
-                    st.image(noticia.IMAGEM_URL)
+                    st.image(media_url(noticia.IMAGEM_URL))
             
             with col2:
                 st.subheader(noticia.TITULO)
-                st.caption(f"Publicado em: {pd.to_datetime(noticia.DATA).strftime('%d/%m/%Y')}")
-                st.markdown(noticia.CONTEUDO, unsafe_allow_html=True)
+                st.caption(f"Publicado em: {formatar_data(noticia.DATA)}")
+                if str(noticia.ID) in trechos:
+                    st.markdown(trechos[str(noticia.ID)], unsafe_allow_html=True)
+                elif pd.notna(noticia.RESUMO):
+                    st.write(noticia.RESUMO)
+                if st.toggle("Ler notícia completa", key=f"ler_{noticia.ID}"):
+                    st.markdown(resolver_imagens(carregar_conteudo_noticia(noticia.ID)), unsafe_allow_html=True)
             
-            if hasattr(noticia, 'TAGS') and pd.notna(noticia.TAGS):
-                tags = [tag.strip() for tag in noticia.TAGS.split(',') if tag.strip()]
-                st.write(" ".join([f"`#{tag}`" for tag in tags]))
+            if len(noticia.TAGS):
+                st.write(" ".join([f"`#{tag}`" for tag in noticia.TAGS]))
 
             likes_desta_noticia = df_likes[df_likes['NOTICIA_ID'] == noticia.ID]
             like_count = len(likes_desta_noticia)
@@ -178,17 +318,19 @@ if not noticias_publicadas.empty:
                 num_colunas_galeria = 4
                 cols_galeria = st.columns(num_colunas_galeria)
                 for i, foto in enumerate(fotos_da_noticia.itertuples()):
-                    cols_galeria[i % num_colunas_galeria].image(foto.IMAGEM_URL, caption=foto.LEGENDA, use_container_width=True)
+                    miniatura = getattr(foto, 'MINIATURA_URL', None)
+                    imagem = miniatura if pd.notna(miniatura) and miniatura else foto.IMAGEM_URL
+                    cols_galeria[i % num_colunas_galeria].image(media_url(imagem), caption=foto.LEGENDA, use_container_width=True)
 
             st.divider()
             st.subheader("Comentários")
 
-            comentarios_aprovados = df_comentarios[(df_comentarios['NOTICIA_ID'] == noticia.ID) & (df_comentarios['STATUS'] == 'APROVADO')]
+            comentarios_aprovados = df_comentarios[df_comentarios['NOTICIA_ID'] == noticia.ID]
             if comentarios_aprovados.empty:
                 st.write("_Seja o primeiro a comentar!_")
             else:
                 for _, comentario in comentarios_aprovados.iterrows():
-                    st.write(f"**{comentario['NOME_USUARIO']}** em {pd.to_datetime(comentario['TIMESTAMP']).strftime('%d/%m/%Y')}:")
+                    st.write(f"**{comentario['NOME_USUARIO']}** em {formatar_data(comentario['TIMESTAMP'])}:")
                     st.info(f"{comentario['COMENTARIO']}")
 
             if 'member_logged_in' in st.session_state and st.session_state['member_logged_in']:
@@ -204,18 +346,10 @@ if not noticias_publicadas.empty:
 
         st.write("")
 
-    if total_paginas > 1:
+    if total_noticias > ITENS_POR_PAGINA:
         st.divider()
-        col1, col2, col3 = st.columns([2, 1, 2])
-
-        if col1.button("⬅️ Anterior", disabled=(st.session_state.page_num <= 1)):
-            st.session_state.page_num -= 1
-            st.rerun()
-
-        col2.write(f"Página {st.session_state.page_num} de {total_paginas}")
-
-        if col3.button("Próxima ➡️", disabled=(st.session_state.page_num >= total_paginas)):
-            st.session_state.page_num += 1
-            st.rerun()
+    paginacao("pagina_noticias", total_noticias, ITENS_POR_PAGINA)
+elif search_term:
+    st.warning("Nenhuma notícia encontrada para sua busca.")
 else:
     st.info("Nenhuma notícia publicada no momento.")
\ No newline at end of file
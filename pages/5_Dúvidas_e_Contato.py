@@ -26,7 +26,7 @@ def salvar_contato(nome, email, telefone, assunto, mensagem):
     new_id = get_max_id('contatos', 'ID') + 1
     novo_contato = {
         'ID': int(new_id),
-        'TIMESTAMP': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        'TIMESTAMP': datetime.now(),
         'NOME': nome,
         'EMAIL': email,
         'TELEFONE': telefone,
@@ -5,7 +5,8 @@ from datetime import datetime
 import os
 from social_utils import display_social_media_links
 from auth import hash_password, insert_record, get_max_id, get_db_connection
-from file_utils import save_uploaded_file
+from data_utils import carregar_tabela
+from file_utils import store_blob, add_blob_reference, get_upload_limit, UploadTooLargeError
 from pdf_utils import gerar_contrato_adesao_pdf
 
 display_social_media_links()
@@ -17,7 +18,7 @@ def carregar_dados_db(table_name):
     """Carrega uma tabela inteira do banco de dados para um DataFrame."""
     conn = get_db_connection()
     try:
-        df = pd.read_sql_query(f'SELECT * FROM "{table_name}"', conn)
+        df = carregar_tabela(conn, table_name)
         return df
     except Exception as e:
         st.error(f"Erro ao carregar dados da tabela {table_name}: {e}")
@@ -59,10 +60,10 @@ def salvar_novo_membro(dados_membro):
     max_id = get_max_id('usuarios', '"ID"')
     new_id = int(max_id) + 1 if max_id else 1
     
-    dados_membro['ID'] = str(new_id)
+    dados_membro['ID'] = new_id
     dados_membro['STATUS'] = 'PENDENTE'
     dados_membro['NIVEL_ACESSO'] = 'MEMBRO'
-    dados_membro['DATA_CADASTRO'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    dados_membro['DATA_CADASTRO'] = datetime.now()
 
     colunas_usuarios = ['ID', 'NOME', 'CPF', 'EMAIL', 'CEP', 'LOGRADOURO', 'NUMERO', 
                         'COMPLEMENTO', 'BAIRRO', 'CIDADE', 'ESTADO', 'SENHA_HASH', 
@@ -224,14 +225,29 @@ def step3_contrato():
     st.divider()
 
     contrato_assinado = st.file_uploader("Anexe aqui o seu contrato assinado*", type=['pdf', 'jpg', 'png'])
-    st.session_state.form_data['contrato_assinado_file'] = contrato_assinado
+    # Grava o arquivo em disco assim que é enviado; a sessão guarda apenas o caminho e o hash.
+    if contrato_assinado is not None:
+        file_id = getattr(contrato_assinado, 'file_id', contrato_assinado.name)
+        contrato_atual = st.session_state.form_data.get('contrato_assinado')
+        if contrato_atual is None or contrato_atual['file_id'] != file_id:
+            try:
+                caminho, digest, tamanho = store_blob(contrato_assinado, os.path.splitext(contrato_assinado.name)[1], get_upload_limit("contratos"), privado=True)
+                st.session_state.form_data['contrato_assinado'] = {
+                    'file_id': file_id, 'nome': contrato_assinado.name,
+                    'caminho': caminho, 'hash': digest, 'tamanho': tamanho
+                }
+            except UploadTooLargeError as e:
+                st.session_state.form_data.pop('contrato_assinado', None)
+                st.error(f"❌ {e}")
+    elif 'contrato_assinado' in st.session_state.form_data:
+        st.caption(f"Contrato já anexado: {st.session_state.form_data['contrato_assinado']['nome']}")
 
     col1, col2 = st.columns(2)
     if col1.button("⬅️ Voltar para Dados"):
         prev_step()
         st.rerun()
 
-    if col2.button("Avançar para Finalizar ➡️", type="primary", disabled=(contrato_assinado is None)):
+    if col2.button("Avançar para Finalizar ➡️", type="primary", disabled=('contrato_assinado' not in st.session_state.form_data)):
         next_step()
         st.rerun()
 
@@ -249,7 +265,7 @@ def step4_finalizar():
         st.write(f"**Nomes:** {st.session_state.form_data['nomes_adicionais']}")
     st.write(f"**Nome do Titular:** {st.session_state.form_data['NOME']}")
     st.write(f"**Email:** {st.session_state.form_data['EMAIL']}")
-    st.write(f"**Contrato Anexado:** {st.session_state.form_data['contrato_assinado_file'].name}")
+    st.write(f"**Contrato Anexado:** {st.session_state.form_data['contrato_assinado']['nome']}")
 
     col1, col2 = st.columns(2)
     if col1.button("⬅️ Voltar para Contrato"):
@@ -258,7 +274,8 @@ def step4_finalizar():
 
     if col2.button("🚀 Enviar Solicitação", type="primary"):
         with st.spinner("Enviando seus dados..."):
-            contrato_url = save_uploaded_file(st.session_state.form_data['contrato_assinado_file'], subfolder="contratos")
+            contrato = st.session_state.form_data['contrato_assinado']
+            contrato_url = contrato['caminho']
             
             dados_para_salvar = st.session_state.form_data.copy()
             dados_para_salvar['PLANO_ESCOLHIDO'] = plano_info['nome']
@@ -269,11 +286,12 @@ def step4_finalizar():
             # Limpa dados temporários que não devem ir para o banco
             del dados_para_salvar['plano_selecionado']
             del dados_para_salvar['servico_selecionado']
-            del dados_para_salvar['contrato_assinado_file']
+            del dados_para_salvar['contrato_assinado']
             del dados_para_salvar['num_adicionais']
             del dados_para_salvar['nomes_adicionais']
 
             if salvar_novo_membro(dados_para_salvar):
+                add_blob_reference(contrato_url, contrato['hash'], contrato['tamanho'], origem="contratos")
                 st.session_state.step = 5
                 st.rerun()
             else:
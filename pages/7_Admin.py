@@ -1,11 +1,20 @@
 import streamlit as st
 import pandas as pd
+import os
 from auth import verify_password, get_user_by_email, get_db_connection, insert_record, update_record, delete_record, get_max_id
-from file_utils import save_uploaded_file
+from data_utils import carregar_tabela
+from file_utils import save_uploaded_file, release_uploaded_file, read_private_file, UploadTooLargeError, UploadReferenceError
+from gallery_utils import ingerir_galeria
+from html_utils import extrair_imagens_base64, processar_conteudo_rico, resolver_imagens, referenciar_imagens, imagens_referenciadas
+from tag_utils import sincronizar_tags_noticia
+from autocomplete_utils import atualizar_convenio_no_indice, atualizar_parceiro_no_indice
+from snapshot_parquet import data_snapshot, data_alteracao, marcar_alteracao, totais_financas_por_status
+from search_utils import pagina_atual, paginacao
 from streamlit_quill import st_quill
 import matplotlib.pyplot as plt
 from social_utils import display_social_media_links
 from datetime import datetime
+from collections import Counter
 
 display_social_media_links()
 
@@ -17,7 +26,7 @@ def carregar_dados_db(table_name):
     """Carrega uma tabela inteira do banco de dados para um DataFrame."""
     conn = get_db_connection()
     try:
-        df = pd.read_sql_query(f'SELECT * FROM "{table_name}"', conn)
+        df = carregar_tabela(conn, table_name)
         return df
     except Exception as e:
         st.error(f"Erro ao carregar dados da tabela {table_name}: {e}")
@@ -25,6 +34,80 @@ def carregar_dados_db(table_name):
     finally:
         if conn: conn.close()
 
+@st.cache_data
+def carregar_totais_snapshot(data):
+    """Totais por status lidos do snapshot Parquet; 'data' na chave troca o cache a cada exportação."""
+    return totais_financas_por_status()
+
+@st.cache_data(ttl=300)
+def carregar_totais_db():
+    """Totais por status agregados no banco, usados enquanto não existe snapshot."""
+    conn = get_db_connection()
+    try:
+        df = pd.read_sql_query('SELECT "STATUS", sum("VALOR") AS "VALOR" FROM financas GROUP BY "STATUS"', conn)
+        return df.set_index("STATUS")["VALOR"]
+    except Exception as e:
+        st.error(f"Erro ao carregar os totais financeiros: {e}")
+        return pd.Series(dtype=float)
+    finally:
+        if conn: conn.close()
+
+FINANCAS_POR_PAGINA = 50
+STATUS_FINANCAS = ["PENDENTE", "PAGO", "VENCIDO"]
+
+def carregar_financas(status=None, mes=None, pagina=1, por_pagina=FINANCAS_POR_PAGINA):
+    """Uma página das cobranças, filtrada por status e mês de vencimento. Retorna (df, total de registros).
+
+    Sem cache: a consulta é limitada e as edições aparecem no rerun seguinte.
+    """
+    filtros, params = [], {"limite": por_pagina, "deslocamento": (pagina - 1) * por_pagina}
+    if status:
+        filtros.append('"STATUS" = %(status)s')
+        params["status"] = status
+    if mes:
+        # Intervalo em vez de substr/to_char: usa o índice e só lê a partição do mês.
+        filtros.append('"DATA_VENCIMENTO" >= %(inicio)s AND "DATA_VENCIMENTO" < %(fim)s')
+        # DATA_VENCIMENTO ainda é texto ISO ('AAAA-MM-DD'): os limites vão como texto no mesmo formato.
+        params["inicio"] = mes.strftime('%Y-%m-%d')
+        params["fim"] = (mes + pd.DateOffset(months=1)).strftime('%Y-%m-%d')
+    onde = f"WHERE {' AND '.join(filtros)}" if filtros else ""
+    conn = get_db_connection()
+    if conn is None: return pd.DataFrame(), 0
+    try:
+        df = pd.read_sql_query(f"""
+            SELECT *, count(*) OVER () AS total_registros FROM financas {onde}
+            ORDER BY "DATA_VENCIMENTO" DESC, "COBRANCA_ID" DESC
+            LIMIT %(limite)s OFFSET %(deslocamento)s
+        """, conn, params=params)
+        total = int(df["total_registros"].iloc[0]) if not df.empty else 0
+        return df.drop(columns="total_registros"), total
+    except Exception as e:
+        st.error(f"Erro ao carregar os registros financeiros: {e}")
+        return pd.DataFrame(), 0
+    finally:
+        conn.close()
+
+def registrar_edicao_financas():
+    """Depois de alterar financas: os totais passam a vir do banco até o próximo snapshot, em todas as sessões."""
+    marcar_alteracao("financas")
+    carregar_totais_db.clear()
+
+def avisar_imagens_extraidas(quantidade, bytes_economizados):
+    """Guarda o aviso das imagens extraídas do editor para exibi-lo depois do st.rerun()."""
+    if quantidade:
+        st.session_state['aviso_imagens'] = (f"{quantidade} imagem(ns) colada(s) no editor foram salvas como arquivo "
+                                             f"({bytes_economizados / 1024:.0f} KB a menos no registro).")
+
+def mostrar_aviso_imagens():
+    if 'aviso_imagens' in st.session_state:
+        st.info(st.session_state.pop('aviso_imagens'))
+
+def liberar_imagens_html(html_antigo, html_novo=None):
+    """Libera os blobs que estavam no HTML antigo e não estão mais no novo (todos, na exclusão)."""
+    removidas = Counter(imagens_referenciadas(html_antigo)) - Counter(imagens_referenciadas(html_novo))
+    for caminho in removidas.elements():
+        release_uploaded_file(caminho)
+
 def update_user_status(user_id, status):
     """Atualiza o status de um usuário no banco de dados."""
     update_record('usuarios', {'"STATUS"': status}, {'"ID"': user_id})
@@ -112,6 +195,20 @@ def gerenciar_usuarios():
             st.success(f"Status do usuário {user_id_to_update} atualizado para {new_status}.")
             st.rerun()
 
+        # Os contratos ficam no armazenamento privado, sem URL: o download só existe aqui, após o login de admin.
+        if 'CONTRATO_ASSINADO_URL' in df_users.columns:
+            com_contrato = df_users[df_users['CONTRATO_ASSINADO_URL'].notna()]
+            if not com_contrato.empty:
+                st.subheader("Contratos Assinados")
+                user_id_contrato = st.selectbox("Selecione o ID do usuário", com_contrato['ID'], key="contrato_user_select")
+                contrato_url = com_contrato[com_contrato['ID'] == user_id_contrato].iloc[0]['CONTRATO_ASSINADO_URL']
+                conteudo = read_private_file(contrato_url)
+                if conteudo is None:
+                    st.warning("Arquivo do contrato não encontrado no armazenamento.")
+                else:
+                    st.download_button("📄 Baixar contrato", data=conteudo,
+                                       file_name=f"contrato_{user_id_contrato}{os.path.splitext(contrato_url)[1]}")
+
     st.subheader("Adicionar Novo Usuário")
     with st.form("add_user_form", clear_on_submit=True):
         new_user_nome = st.text_input("Nome")
@@ -128,7 +225,7 @@ def gerenciar_usuarios():
             new_id = int(max_id) + 1 if max_id else 1
 
             new_user_data = {
-                '"ID"': str(new_id),
+                '"ID"': new_id,
                 '"NOME"': new_user_nome,
                 '"EMAIL"': new_user_email,
                 '"SENHA_HASH"': hashed_password,
@@ -223,6 +320,7 @@ def gerenciar_institucional():
 
 def gerenciar_convenios():
     st.subheader("Gerenciamento de Convênios")
+    mostrar_aviso_imagens()
     df_convenios = carregar_dados_db('convenios')
 
     st.dataframe(df_convenios)
@@ -239,7 +337,7 @@ def gerenciar_convenios():
 
     with st.form("convenio_form", clear_on_submit=True):
         nome = st.text_input("Nome do Convênio", value=convenio_data.get('NOME_CONVENIO', ''))
-        descricao = st_quill(value=convenio_data.get('DESCRICAO', ''), placeholder="Descreva o convênio...")
+        descricao = st_quill(value=resolver_imagens(convenio_data.get('DESCRICAO', '')), placeholder="Descreva o convênio...")
         categoria = st.text_input("Tipo de Serviço", value=convenio_data.get('TIPO_SERVICO', ''))
         icon_url = st.text_input("URL do Ícone", value=convenio_data.get('ICON_URL', ''))
         imagem_url = st.text_input("URL da Imagem", value=convenio_data.get('IMAGEM_URL', ''))
@@ -252,7 +350,14 @@ def gerenciar_convenios():
 
         if submitted:
             if uploaded_file is not None:
-                imagem_url = save_uploaded_file(uploaded_file, "convenios")
+                try:
+                    imagem_url = save_uploaded_file(uploaded_file, "convenios", atual=convenio_data.get('IMAGEM_URL'))
+                except (UploadTooLargeError, UploadReferenceError) as e:
+                    st.error(str(e))
+                    return
+
+            descricao, imagens_extraidas, bytes_economizados = extrair_imagens_base64(referenciar_imagens(descricao), "convenios")
+            avisar_imagens_extraidas(imagens_extraidas, bytes_economizados)
 
             new_data = {
                 '"NOME_CONVENIO"': nome,
@@ -265,10 +370,16 @@ def gerenciar_convenios():
             }
 
             if selected_id == 'new':
-                insert_record('convenios', new_data)
+                novo_id = insert_record('convenios', new_data, returning='"CONVENIO_ID"')
+                if novo_id is not False:
+                    atualizar_convenio_no_indice(novo_id, nome, categoria, status)
                 st.success("Convênio adicionado com sucesso!")
             else:
-                update_record('convenios', new_data, {'"CONVENIO_ID"': selected_id})
+                if update_record('convenios', new_data, {'"CONVENIO_ID"': selected_id}):
+                    atualizar_convenio_no_indice(selected_id, nome, categoria, status)
+                    liberar_imagens_html(convenio_data.get('DESCRICAO'), descricao)
+                    if convenio_data.get('IMAGEM_URL') != imagem_url:
+                        release_uploaded_file(convenio_data.get('IMAGEM_URL'))
                 st.success("Convênio atualizado com sucesso!")
             
             st.rerun()
@@ -277,12 +388,17 @@ def gerenciar_convenios():
     convenio_to_delete = st.selectbox("Selecione o convênio para excluir", options=list(convenio_options.keys())[:-1], format_func=lambda x: convenio_options[x], key="delete_convenio")
     if st.button("Excluir Convênio"):
         if convenio_to_delete:
-            delete_record('convenios', {'"CONVENIO_ID"': convenio_to_delete})
+            convenio_antigo = df_convenios.loc[df_convenios['CONVENIO_ID'] == convenio_to_delete].iloc[0]
+            if delete_record('convenios', {'"CONVENIO_ID"': convenio_to_delete}):
+                release_uploaded_file(convenio_antigo['IMAGEM_URL'])
+                liberar_imagens_html(convenio_antigo['DESCRICAO'])
+                atualizar_convenio_no_indice(convenio_to_delete, None, None, None)
             st.success("Convênio excluído com sucesso!")
             st.rerun()
 
 def gerenciar_noticias():
     st.subheader("Gerenciamento de Notícias")
+    mostrar_aviso_imagens()
     df_noticias = carregar_dados_db('noticias')
 
     st.dataframe(df_noticias)
@@ -299,7 +415,7 @@ def gerenciar_noticias():
 
     with st.form("noticia_form", clear_on_submit=True):
         titulo = st.text_input("Título", value=noticia_data.get('TITULO', ''))
-        conteudo = st_quill(value=noticia_data.get('CONTEUDO', ''), placeholder="Conteúdo da notícia...")
+        conteudo = st_quill(value=resolver_imagens(noticia_data.get('CONTEUDO', '')), placeholder="Conteúdo da notícia...")
         imagem_url = st.text_input("URL da Imagem", value=noticia_data.get('IMAGEM_URL', ''))
         destaque = st.checkbox("Destaque?", value=bool(noticia_data.get('DESTAQUE', 0)))
         status = st.selectbox("Status", ["ATIVO", "INATIVO"], index=0 if noticia_data.get('STATUS', 'ATIVO') == 'ATIVO' else 1)
@@ -311,23 +427,52 @@ def gerenciar_noticias():
 
         if submitted:
             if uploaded_file is not None:
-                imagem_url = save_uploaded_file(uploaded_file, "noticias")
+                try:
+                    imagem_url = save_uploaded_file(uploaded_file, "noticias", atual=noticia_data.get('IMAGEM_URL'))
+                except (UploadTooLargeError, UploadReferenceError) as e:
+                    st.error(str(e))
+                    return
+
+            conteudo, imagens_extraidas, bytes_economizados = extrair_imagens_base64(referenciar_imagens(conteudo), "noticias")
+            avisar_imagens_extraidas(imagens_extraidas, bytes_economizados)
+
+            conteudo_processado = processar_conteudo_rico(conteudo)
 
             new_data = {
                 '"TITULO"': titulo,
                 '"CONTEUDO"': conteudo,
+                '"CONTEUDO_HTML"': conteudo_processado['html'],
+                '"CONTEUDO_TEXTO"': conteudo_processado['texto'],
+                '"RESUMO"': conteudo_processado['resumo'],
                 '"IMAGEM_URL"': imagem_url,
                 '"DESTAQUE"': 1 if destaque else 0,
                 '"STATUS"': status,
-                '"DATA"': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                '"DATA"': datetime.now(),
                 '"TAGS"': tags
             }
 
+            # A notícia e as suas linhas em noticia_tags são gravadas na mesma transação.
+            conn = get_db_connection()
+            if conn is None: return
+            try:
+                with conn.begin():
+                    if selected_id == 'new':
+                        novo_id = insert_record('noticias', new_data, returning='"ID"', conn=conn)
+                        sincronizar_tags_noticia(novo_id, tags, conn=conn)
+                    else:
+                        update_record('noticias', new_data, {'"ID"': selected_id}, conn=conn)
+                        sincronizar_tags_noticia(selected_id, tags, conn=conn)
+            except Exception as e:
+                st.error(f"Erro ao salvar a notícia: {e}")
+                return
+            finally:
+                conn.close()
             if selected_id == 'new':
-                insert_record('noticias', new_data)
                 st.success("Notícia adicionada com sucesso!")
             else:
-                update_record('noticias', new_data, {'"ID"': selected_id})
+                if noticia_data.get('IMAGEM_URL') != imagem_url:
+                    release_uploaded_file(noticia_data.get('IMAGEM_URL'))
+                liberar_imagens_html(noticia_data.get('CONTEUDO'), conteudo)
                 st.success("Notícia atualizada com sucesso!")
             
             st.rerun()
@@ -336,12 +481,44 @@ def gerenciar_noticias():
     noticia_to_delete = st.selectbox("Selecione a notícia para excluir", options=list(noticia_options.keys())[:-1], format_func=lambda x: noticia_options[x], key="delete_noticia")
     if st.button("Excluir Notícia"):
         if noticia_to_delete:
-            delete_record('noticias', {'"ID"': noticia_to_delete})
+            noticia_antiga = df_noticias.loc[df_noticias['ID'] == noticia_to_delete].iloc[0]
+            # As linhas de noticia_tags saem junto, pela chave estrangeira ON DELETE CASCADE.
+            if delete_record('noticias', {'"ID"': noticia_to_delete}):
+                release_uploaded_file(noticia_antiga['IMAGEM_URL'])
+                liberar_imagens_html(noticia_antiga['CONTEUDO'])
             st.success("Notícia excluída com sucesso!")
             st.rerun()
 
+    st.subheader("Galeria de Fotos em Lote")
+    if df_noticias.empty:
+        st.info("Cadastre uma notícia antes de importar fotos.")
+        return
+    with st.form("galeria_lote_form", clear_on_submit=True):
+        noticia_galeria = st.selectbox("Notícia", options=list(noticia_options.keys())[:-1], format_func=lambda x: noticia_options[x])
+        legenda = st.text_input("Legenda (opcional, aplicada a todas as fotos)")
+        arquivos = st.file_uploader("Fotos ou arquivo ZIP", type=['png', 'jpg', 'jpeg', 'webp', 'gif', 'zip'], accept_multiple_files=True)
+        importar = st.form_submit_button("Importar Fotos")
+
+        if importar and arquivos:
+            progresso = st.progress(0.0, text="Processando fotos...")
+            def atualizar_progresso(concluidas, total):
+                progresso.progress(concluidas / total, text=f"Processando fotos... {concluidas}/{total}")
+
+            conn = get_db_connection()
+            if conn is None: return
+            try:
+                resultado = ingerir_galeria(conn, noticia_galeria, arquivos, legenda=legenda or None, progress_callback=atualizar_progresso)
+            finally:
+                conn.close()
+            progresso.empty()
+            st.success(f"{resultado['importadas']} foto(s) importada(s), {resultado['duplicadas']} duplicada(s) ignorada(s).")
+            for erro in resultado['erros']:
+                st.warning(f"Arquivo ignorado: {erro}")
+            st.cache_data.clear()
+
 def gerenciar_eventos():
     st.subheader("Gerenciamento de Eventos")
+    mostrar_aviso_imagens()
     df_eventos = carregar_dados_db('eventos')
 
     st.dataframe(df_eventos)
@@ -358,7 +535,7 @@ def gerenciar_eventos():
 
     with st.form("evento_form", clear_on_submit=True):
         titulo = st.text_input("Título do Evento", value=evento_data.get('TITULO', ''))
-        descricao = st_quill(value=evento_data.get('DESCRICAO', ''), placeholder="Descrição do evento...")
+        descricao = st_quill(value=resolver_imagens(evento_data.get('DESCRICAO', '')), placeholder="Descrição do evento...")
         data_evento = st.date_input("Data do Evento", value=pd.to_datetime(evento_data.get('DATA_EVENTO'))) if 'DATA_EVENTO' in evento_data else st.date_input("Data do Evento")
         hora_evento = st.text_input("Hora do Evento", value=evento_data.get('HORA_EVENTO', ''))
         local = st.text_input("Local", value=evento_data.get('LOCAL', ''))
@@ -371,7 +548,14 @@ def gerenciar_eventos():
 
         if submitted:
             if uploaded_file is not None:
-                imagem_url = save_uploaded_file(uploaded_file, "eventos")
+                try:
+                    imagem_url = save_uploaded_file(uploaded_file, "eventos", atual=evento_data.get('IMAGEM_URL'))
+                except (UploadTooLargeError, UploadReferenceError) as e:
+                    st.error(str(e))
+                    return
+
+            descricao, imagens_extraidas, bytes_economizados = extrair_imagens_base64(referenciar_imagens(descricao), "eventos")
+            avisar_imagens_extraidas(imagens_extraidas, bytes_economizados)
 
             new_data = {
                 '"TITULO"': titulo,
@@ -387,7 +571,10 @@ def gerenciar_eventos():
                 insert_record('eventos', new_data)
                 st.success("Evento adicionado com sucesso!")
             else:
-                update_record('eventos', new_data, {'"EVENTO_ID"': selected_id})
+                if update_record('eventos', new_data, {'"EVENTO_ID"': selected_id}):
+                    if evento_data.get('IMAGEM_URL') != imagem_url:
+                        release_uploaded_file(evento_data.get('IMAGEM_URL'))
+                    liberar_imagens_html(evento_data.get('DESCRICAO'), descricao)
                 st.success("Evento atualizado com sucesso!")
             
             st.rerun()
@@ -396,7 +583,10 @@ def gerenciar_eventos():
     evento_to_delete = st.selectbox("Selecione o evento para excluir", options=list(evento_options.keys())[:-1], format_func=lambda x: evento_options[x], key="delete_evento")
     if st.button("Excluir Evento"):
         if evento_to_delete:
-            delete_record('eventos', {'"EVENTO_ID"': evento_to_delete})
+            evento_antigo = df_eventos.loc[df_eventos['EVENTO_ID'] == evento_to_delete].iloc[0]
+            if delete_record('eventos', {'"EVENTO_ID"': evento_to_delete}):
+                release_uploaded_file(evento_antigo['IMAGEM_URL'])
+                liberar_imagens_html(evento_antigo['DESCRICAO'])
             st.success("Evento excluído com sucesso!")
             st.rerun()
 
@@ -405,9 +595,14 @@ def gerenciar_financas():
 
     df_usuarios = carregar_dados_db('usuarios')
     df_servicos = carregar_dados_db('servicos')
-    df_financas = carregar_dados_db('financas')
 
-    total_por_status = df_financas.groupby('STATUS')['VALOR'].sum().reindex(["PENDENTE", "PAGO", "VENCIDO"]).fillna(0)
+    # O snapshot só vale se for posterior à última edição feita no app (por qualquer sessão); senão
+    # os totais ao lado da lista ficariam desatualizados até a próxima exportação.
+    data = data_snapshot("financas")
+    editadas_em = data_alteracao("financas")
+    usar_snapshot = data is not None and (editadas_em is None or data >= editadas_em)
+    totais = carregar_totais_snapshot(data) if usar_snapshot else carregar_totais_db()
+    total_por_status = totais.reindex(STATUS_FINANCAS).fillna(0)
     
     st.markdown("""
     <style>
@@ -436,6 +631,10 @@ def gerenciar_financas():
         st.markdown(f'<div class="metric-container paid"><b>Total Pago</b><br><span class="stMetric-value">R$ {total_por_status['PAGO']:.2f}</span></div>', unsafe_allow_html=True)
     with col3:
         st.markdown(f'<div class="metric-container overdue"><b>Total Vencido</b><br><span class="stMetric-value">R$ {total_por_status['VENCIDO']:.2f}</span></div>', unsafe_allow_html=True)
+    if usar_snapshot:
+        st.caption(f"Totais do snapshot de {data:%d/%m/%Y %H:%M} (atualizado por snapshot_parquet.py).")
+    elif data:
+        st.caption("Totais calculados no banco: houve alterações depois do último snapshot.")
     st.markdown("---")
 
     st.subheader("Adicionar Novas Cobranças")
@@ -481,27 +680,41 @@ def gerenciar_financas():
                     '"STATUS"': status
                 }
                 if insert_record('financas', novo_registro):
+                    registrar_edicao_financas()
                     st.success("Registro financeiro adicionado com sucesso!")
                     st.rerun()
                 else:
                     st.error("Erro ao adicionar registro financeiro.")
     
     st.subheader("Atualizar Status de Cobranças Existentes e Excluir Registros Financeiros")
+    col_status, col_mes = st.columns(2)
+    filtro_status = col_status.selectbox("Filtrar por status", ["Todos"] + STATUS_FINANCAS, key="financas_status")
+    filtro_mes = col_mes.text_input("Mês de vencimento (AAAA-MM)", key="financas_mes").strip()
+    mes = None
+    if filtro_mes:
+        mes = pd.to_datetime(filtro_mes, format="%Y-%m", errors="coerce")
+        if pd.isna(mes):
+            st.warning("Informe o mês no formato AAAA-MM (ex.: 2025-03).")
+            mes = None
+    status_filtro = None if filtro_status == "Todos" else filtro_status
+    pagina = pagina_atual("pagina_financas", (status_filtro, mes))
+    df_financas, total_financas = carregar_financas(status_filtro, mes, pagina)
     if df_financas.empty:
         st.info("Nenhum registro financeiro encontrado.")
-        return  
+        return
     with st.form("form_update_financa"):
         financa_options = {row['COBRANCA_ID']: f"ID {row['COBRANCA_ID']} - Usuário {row['USER_ID']} - Valor R$ {row['VALOR']:.2f} - Status {row['STATUS']}" for index, row in df_financas.iterrows()}
         selected_financa_id = st.selectbox("Selecione o Registro Financeiro", options=list(financa_options.keys()), format_func=lambda x: financa_options[x])
 
         if selected_financa_id:
             selected_financa = df_financas[df_financas['COBRANCA_ID'] == selected_financa_id].iloc[0]
-            new_status = st.selectbox("Atualizar Status", ["PENDENTE", "PAGO", "VENCIDO"], index=["PENDENTE", "PAGO", "VENCIDO"].index(selected_financa['STATUS']))
+            new_status = st.selectbox("Atualizar Status", STATUS_FINANCAS, index=STATUS_FINANCAS.index(selected_financa['STATUS']))
             update_button = st.form_submit_button("Atualizar Status")
             delete_button = st.form_submit_button("Excluir Registro")
 
             if update_button:
                 if update_record('financas', {'"STATUS"': new_status}, {'"COBRANCA_ID"': selected_financa_id}):
+                    registrar_edicao_financas()
                     st.success("Status atualizado com sucesso!")
                     st.rerun()
                 else:
@@ -509,6 +722,7 @@ def gerenciar_financas():
 
             if delete_button:
                 if delete_record('financas', {'"COBRANCA_ID"': selected_financa_id}):
+                    registrar_edicao_financas()
                     st.success("Registro financeiro excluído com sucesso!")
                     st.rerun()
                 else:
@@ -516,7 +730,9 @@ def gerenciar_financas():
 
     st.markdown("---")
     st.subheader("Registros Financeiros")
+    st.caption(f"{total_financas} registro(s) no filtro.")
     st.dataframe(df_financas)
+    paginacao("pagina_financas", total_financas, FINANCAS_POR_PAGINA)
 
 def gerenciar_parceiros():
     st.subheader("Gerenciamento de Parceiros")
@@ -555,10 +771,13 @@ def gerenciar_parceiros():
             }
 
             if selected_id == 'new':
-                insert_record('parceiros', new_data)
+                novo_id = insert_record('parceiros', new_data, returning='"PARCEIRO_ID"')
+                if novo_id is not False:
+                    atualizar_parceiro_no_indice(novo_id, nome, None, status)
                 st.success("Parceiro adicionado com sucesso!")
             else:
-                update_record('parceiros', new_data, {'"PARCEIRO_ID"': selected_id})
+                if update_record('parceiros', new_data, {'"PARCEIRO_ID"': selected_id}):
+                    atualizar_parceiro_no_indice(selected_id, nome, parceiro_data.get('CONVENIO_ID'), status)
                 st.success("Parceiro atualizado com sucesso!")
             
             st.rerun()
@@ -567,7 +786,8 @@ def gerenciar_parceiros():
     parceiro_to_delete = st.selectbox("Selecione o parceiro para excluir", options=list(parceiro_options.keys())[:-1], format_func=lambda x: parceiro_options[x], key="delete_parceiro")
     if st.button("Excluir Parceiro"):
         if parceiro_to_delete:
-            delete_record('parceiros', {'"PARCEIRO_ID"': parceiro_to_delete})
+            if delete_record('parceiros', {'"PARCEIRO_ID"': parceiro_to_delete}):
+                atualizar_parceiro_no_indice(parceiro_to_delete, None, None, None)
             st.success("Parceiro excluído com sucesso!")
             st.rerun()
 
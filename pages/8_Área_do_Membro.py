@@ -2,19 +2,38 @@ import streamlit as st
 import pandas as pd
 from datetime import datetime
 from auth import verify_password, get_user_by_email, get_db_connection, update_record
+from data_utils import carregar_tabela, formatar_data
 from pdf_utils import gerar_recibo_pdf
+from tag_utils import STATUS_PUBLICADA
 from social_utils import display_social_media_links
 
 display_social_media_links()
 st.set_page_config(page_title="Área do Membro", layout="centered")
 
 # --- FUNÇÕES DE BANCO DE DADOS ---
+# Percorre só as notícias posteriores ao último acesso (noticias_ativas_data_idx, migração 005) e testa suas tags
+# (chave primária de noticia_tags) contra as tags seguidas pelo membro (índice único em USER_ID,
+# TAG_NAME, criado pela migração 003 de migracoes.py).
+NOTIFICACOES_QUERY = """
+    SELECT n."ID", n."TITULO", n."DATA"
+    FROM noticias n
+    WHERE n."STATUS" = %(status)s
+      AND n."DATA" > %(desde)s
+      AND EXISTS (
+          SELECT 1
+          FROM noticia_tags t
+          JOIN tag_follows f ON f."TAG_NAME" = t."TAG"
+          WHERE t."NOTICIA_ID" = n."ID" AND f."USER_ID" = %(user_id)s
+      )
+    ORDER BY n."DATA" DESC
+"""
+
 @st.cache_data
 def carregar_dados_db(table_name):
     """Carrega uma tabela inteira do banco de dados para um DataFrame."""
     conn = get_db_connection()
     try:
-        df = pd.read_sql_query(f'SELECT * FROM "{table_name}"', conn)
+        df = carregar_tabela(conn, table_name)
         return df
     except Exception as e:
         st.error(f"Erro ao carregar dados da tabela {table_name}: {e}")
@@ -49,6 +68,18 @@ def carregar_historico_financeiro(user_id):
         if conn:
             conn.close()
 
+def carregar_notificacoes_tags(user_id, desde):
+    """Busca as notícias publicadas depois de 'desde' com alguma tag seguida pelo membro."""
+    conn = get_db_connection()
+    try:
+        return pd.read_sql_query(NOTIFICACOES_QUERY, conn, params={"status": STATUS_PUBLICADA, "user_id": user_id, "desde": desde})
+    except Exception as e:
+        st.error(f"Erro ao carregar notificações: {e}")
+        return pd.DataFrame()
+    finally:
+        if conn:
+            conn.close()
+
 def atualizar_dados_membro(user_id, novos_dados):
     """Atualiza os dados de um membro no banco de dados."""
     dados_para_atualizar = {f'"{k.upper()}"': v for k, v in novos_dados.items()}
@@ -56,8 +87,7 @@ def atualizar_dados_membro(user_id, novos_dados):
 
 def atualizar_ultimo_acesso(user_id):
     """Atualiza o campo ultimo_acesso para o usuário no banco de dados."""
-    now_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    update_record('usuarios', {'"ULTIMO_ACESSO"': now_str}, {'"ID"': user_id})
+    update_record('usuarios', {'"ULTIMO_ACESSO"': datetime.now()}, {'"ID"': user_id})
 
 # --- PÁGINAS E LÓGICA DE UI ---
 def pagina_login():
@@ -106,27 +136,15 @@ def pagina_perfil():
     
     last_login_str = st.session_state.get('last_login_for_notifications')
     if pd.notna(last_login_str) and last_login_str:
-        last_login_dt = pd.to_datetime(last_login_str)
-        df_noticias = carregar_dados_db('noticias')
-        df_follows = carregar_dados_db('tag_follows')
-        
-        tags_seguidas = df_follows[df_follows['USER_ID'] == user_info['ID']]['TAG_NAME'].tolist()
-        
-        if tags_seguidas:
-            novas_noticias = df_noticias[df_noticias['DATA'] > last_login_dt]
-            
-            def has_followed_tags(row_tags):
-                if pd.isna(row_tags): return False
-                return any(tag in [t.strip() for t in row_tags.split(',')] for tag in tags_seguidas)
-                
-            notificacoes = novas_noticias[novas_noticias['TAGS'].apply(has_followed_tags)]
-            
-            if not notificacoes.empty:
-                with st.container(border=True):
-                    st.subheader(f"🔔 Novidades em suas tags seguidas ({len(notificacoes)})")
-                    for _, noticia in notificacoes.iterrows():
-                        st.markdown(f"- **[{noticia['TITULO']}]({st.page_link('pages/3_Notícias.py')})**")
-                st.divider()
+        notificacoes = carregar_notificacoes_tags(user_info['ID'], pd.to_datetime(last_login_str).to_pydatetime())
+
+        if not notificacoes.empty:
+            with st.container(border=True):
+                st.subheader(f"🔔 Novidades em suas tags seguidas ({len(notificacoes)})")
+                for _, noticia in notificacoes.iterrows():
+                    st.markdown(f"- **{noticia['TITULO']}** ({formatar_data(noticia['DATA'])})")
+                st.page_link("pages/3_Notícias.py", label="Ver notícias", icon="📰")
+            st.divider()
 
     if st.button("Sair"):
         for key in ['member_logged_in', 'member_info', 'edit_mode', 'last_login_for_notifications']:
@@ -202,7 +220,7 @@ def pagina_perfil():
                 with st.container(border=True):
                     col1, col2, col3 = st.columns([2, 1, 1])
                     col1.write(f"**Serviço Contratado:** {row['SERVICO_CONTRATADO']}")
-                    col1.write(f"**Vencimento:** {pd.to_datetime(row['DATA_VENCIMENTO']).strftime('%d/%m/%Y')}")
+                    col1.write(f"**Vencimento:** {formatar_data(row['DATA_VENCIMENTO'])}")
                     
                     valor_formatado = f"R$ {row['VALOR']:.2f}".replace('.', ',')
                     col2.metric("Valor", valor_formatado)
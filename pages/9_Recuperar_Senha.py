@@ -1,23 +1,35 @@
 import streamlit as st
 import secrets
+import hashlib
 from datetime import datetime, timedelta
 from social_utils import display_social_media_links
 from auth import hash_password, get_user_by_email, get_db_connection, update_record
-from email_utils import send_recovery_email
+from jobs import enqueue_job
 import sqlalchemy
 
 display_social_media_links()
 st.set_page_config(page_title="Recuperar Senha", layout="centered")
 
 # --- FUNÇÕES DE BANCO DE DADOS ---
-def update_user_token(user_id, token, expiration_date):
-    """Atualiza o token de recuperação e a data de expiração de um usuário."""
-    record_to_update = {
-        '"TOKEN_RECUPERACAO"': token,
-        '"DATA_EXPIRACAO_TOKEN"': expiration_date.strftime("%Y-%m-%d %H:%M:%S")
-    }
-    where_clause = {'"ID"': user_id}
-    return update_record('usuarios', record_to_update, where_clause)
+def solicitar_recuperacao(user_id, token, expiration_date):
+    """Grava o token e enfileira o email de recuperação na mesma transação (outbox)."""
+    conn = get_db_connection()
+    if conn is None: return False
+    try:
+        with conn.begin():
+            conn.execute(
+                sqlalchemy.text('UPDATE usuarios SET "TOKEN_RECUPERACAO" = :token, "DATA_EXPIRACAO_TOKEN" = :expiracao WHERE "ID" = :id'),
+                {"token": token, "expiracao": expiration_date, "id": user_id}
+            )
+            # A chave deriva do token: cada token gera no máximo um email, mesmo se a transação for repetida.
+            enqueue_job(conn, "email_recuperacao_senha", {"usuario_id": user_id},
+                        chave_idempotencia=f"recuperacao_senha:{hashlib.sha256(token.encode()).hexdigest()}")
+        return True
+    except Exception as e:
+        print(f"Erro ao solicitar recuperação de senha: {e}")
+        return False
+    finally:
+        if conn: conn.close()
 
 def get_user_by_token(token):
     """Busca um usuário pelo token de recuperação."""
@@ -58,21 +70,10 @@ with st.form("form_request_token"):
             token = secrets.token_urlsafe(32)
             expiration_date = datetime.now() + timedelta(minutes=15)
             
-            if update_user_token(user['ID'], token, expiration_date):
-                try:
-                    email_creds = st.secrets["email_credentials"]
-                    url = st.secrets["app_config"]["url"]
-                    email_config = {
-                        "email_address": email_creds["email_address"],
-                        "email_password": email_creds["email_password"],
-                        "url": url
-                    }
-                    if send_recovery_email(email_solicitacao, token, email_config):
-                        st.success("✅ Token de recuperação enviado para o seu email. Verifique sua caixa de entrada (e spam).")
-                    else:
-                        st.error("❌ Ocorreu um erro ao tentar enviar o email. Por favor, contate o suporte.")
-                except (KeyError, FileNotFoundError):
-                    st.error("As configurações de email não foram encontradas. O administrador precisa configurar o arquivo secrets.toml.")
+            if solicitar_recuperacao(user['ID'], token, expiration_date):
+                st.success("✅ Solicitação registrada! O token será enviado para o seu email em instantes. Verifique sua caixa de entrada (e spam).")
+            else:
+                st.error("❌ Ocorreu um erro ao processar a solicitação. Por favor, contate o suporte.")
         else:
             st.error("Email não encontrado em nosso sistema.")
 
@@ -100,8 +101,8 @@ with st.form("form_reset_password", clear_on_submit=True):
             user = get_user_by_token(token_input)
 
             if user:
-                expiration_str = user['DATA_EXPIRACAO_TOKEN']
-                if expiration_str and datetime.strptime(expiration_str, "%Y-%m-%d %H:%M:%S") > datetime.now():
+                expiration_date = user['DATA_EXPIRACAO_TOKEN']
+                if expiration_date and expiration_date > datetime.now():
                     new_hash = hash_password(nova_senha)
                     if reset_user_password(user['ID'], new_hash):
                         st.success("✅ Senha redefinida com sucesso! Você já pode fazer o login.")
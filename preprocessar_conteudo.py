@@ -0,0 +1,44 @@
+import argparse
+import sqlalchemy
+from db_utils import get_postgres_engine
+from html_utils import CONTEUDO_PROCESSADO_COLUMNS, processar_conteudo_rico
+
+# As linhas são lidas numa transação e atualizadas em outra, então a chave precisa ser estável (o ctid
+# muda a cada UPDATE ou VACUUM FULL). A FAQ ganha a coluna ID na migração 010 e as colunas de
+# conteúdo pré-processado vêm da migração 013 (migracoes.py); este script só preenche as linhas.
+CHAVE = "ID"
+
+def preprocessar_tabela(conn, table, origem, col_html, col_texto, col_resumo, todos=False):
+    """Gera HTML sanitizado, texto e resumo para as linhas de uma tabela. Retorna o número de linhas."""
+    filtro = "" if todos else f'WHERE "{col_html}" IS NULL AND "{origem}" IS NOT NULL'
+    with conn.begin():
+        rows = conn.execute(sqlalchemy.text(f'SELECT "{CHAVE}", "{origem}" FROM {table} {filtro}')).fetchall()
+    # Uma linha editada entre a leitura e a gravação é pulada e fica para a próxima execução.
+    update = sqlalchemy.text(
+        f'UPDATE {table} SET "{col_html}" = :html, "{col_texto}" = :texto, "{col_resumo}" = :resumo '
+        f'WHERE "{CHAVE}" = :chave AND "{origem}" IS NOT DISTINCT FROM :origem'
+    )
+    params = [{"chave": chave, "origem": html, **processar_conteudo_rico(html)} for chave, html in rows]
+    if params:
+        with conn.begin():
+            conn.execute(update, params)
+    return len(params)
+
+def main():
+    """Pré-processa o conteúdo rico já salvo (notícias e FAQ)."""
+    parser = argparse.ArgumentParser(description="Gera HTML sanitizado, texto e resumo do conteúdo rico.")
+    parser.add_argument("--todos", action="store_true", help="Reprocessa também as linhas já processadas.")
+    args = parser.parse_args()
+
+    engine = get_postgres_engine()
+    if engine is None:
+        print("Não foi possível conectar à base de dados. Verifique o seu ficheiro secrets.toml.")
+        return
+
+    with engine.connect() as conn:
+        for table, origem, col_html, col_texto, col_resumo in CONTEUDO_PROCESSADO_COLUMNS:
+            linhas = preprocessar_tabela(conn, table, origem, col_html, col_texto, col_resumo, args.todos)
+            print(f"{table}.{origem}: {linhas} linha(s) processada(s).")
+
+if __name__ == "__main__":
+    main()
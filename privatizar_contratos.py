@@ -0,0 +1,82 @@
+import argparse
+import sqlalchemy
+from db_utils import get_postgres_engine
+from file_utils import existing_upload_columns
+from storage import get_storage
+
+# Os contratos assinados enviados enquanto iam para o armazenamento público (static/blobs) ficaram
+# acessíveis por URL. Este script copia cada um para o armazenamento privado, reescreve a referência
+# em usuarios e em upload_blobs e só então apaga a cópia pública.
+COLUNA_CONTRATO = ("usuarios", "CONTRATO_ASSINADO_URL")
+
+def contratos_publicos(conn):
+    """Retorna {referência pública: chave} dos contratos que estão no armazenamento público."""
+    publico = get_storage()
+    tabela, coluna = COLUNA_CONTRATO
+    with conn.begin():
+        valores = conn.execute(sqlalchemy.text(
+            f'SELECT DISTINCT "{coluna}" FROM {tabela} WHERE "{coluna}" IS NOT NULL'
+        )).scalars().all()
+    return {valor: key for valor in valores if (key := publico.key_from_reference(valor)) is not None}
+
+def outras_referencias(conn, caminho):
+    """Conta as referências ao mesmo blob fora da coluna de contratos (ex.: a mesma imagem usada numa notícia)."""
+    total = 0
+    for table, column in existing_upload_columns(conn):
+        if (table, column) == COLUNA_CONTRATO:
+            continue
+        total += conn.execute(sqlalchemy.text(
+            f'SELECT count(*) FROM {table} WHERE "{column}" = :caminho'
+        ), {"caminho": caminho}).scalar()
+    return total
+
+def privatizar(conn, antigo, key):
+    """Copia o blob para o armazenamento privado, reescreve as referências e apaga o público."""
+    publico, privado = get_storage(), get_storage(privado=True)
+    if not privado.exists(key):
+        origem = publico.open(key)
+        try:
+            privado.put(key, origem)
+        finally:
+            origem.close()
+    novo = privado.reference(key)
+    tabela, coluna = COLUNA_CONTRATO
+    with conn.begin():
+        conn.execute(sqlalchemy.text(f'UPDATE {tabela} SET "{coluna}" = :novo WHERE "{coluna}" = :antigo'),
+                     {"novo": novo, "antigo": antigo})
+        if conn.execute(sqlalchemy.text("SELECT to_regclass('upload_blobs') IS NOT NULL")).scalar():
+            conn.execute(sqlalchemy.text('UPDATE upload_blobs SET "CAMINHO" = :novo WHERE "CAMINHO" = :antigo'),
+                         {"novo": novo, "antigo": antigo})
+    publico.delete(key)
+    return novo
+
+def main():
+    """Move os contratos assinados do armazenamento público para o privado."""
+    parser = argparse.ArgumentParser(description="Tira os contratos assinados do armazenamento público.")
+    parser.add_argument("--aplicar", action="store_true", help="Move os arquivos (sem isso, apenas lista).")
+    args = parser.parse_args()
+
+    engine = get_postgres_engine()
+    if engine is None:
+        print("Não foi possível conectar à base de dados. Verifique o seu ficheiro secrets.toml.")
+        return
+
+    with engine.connect() as conn:
+        contratos = contratos_publicos(conn)
+        print(f"{len(contratos)} contrato(s) no armazenamento público.")
+        for antigo, key in contratos.items():
+            with conn.begin():
+                compartilhado = outras_referencias(conn, antigo)
+            if compartilhado:
+                print(f"  - {antigo}: o mesmo arquivo é usado em {compartilhado} outro(s) registro(s); revise manualmente.")
+                continue
+            if not args.aplicar:
+                print(f"  - {antigo}")
+                continue
+            print(f"  - {antigo} -> {privatizar(conn, antigo, key)}")
+
+    if not args.aplicar:
+        print("Execução de simulação. Use --aplicar para mover os arquivos.")
+
+if __name__ == "__main__":
+    main()
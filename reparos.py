@@ -0,0 +1,209 @@
+import argparse
+import time
+import sqlalchemy
+from db_utils import get_postgres_engine
+
+# Reparos de dados. Cada reparo percorre a tabela em ordem de chave, em lotes de :lote chaves; cada
+# lote guarda as linhas originais em "<tabela>_reparo_<nome>", aplica o SET e registra a última
+# chave em reparos_progresso na mesma transação. Se o processo parar, a próxima execução continua do
+# lote seguinte; um reparo concluído não roda de novo (salvo com --reiniciar). Entre os lotes há uma
+# pausa e cada lote desiste rápido de bloqueios (lock_timeout), para não disputar com o site.
+#
+# "preparar" roda antes do primeiro lote; "chave_texto" exige a chave ainda como texto, quando a
+# condição só faz sentido nele. O reparo das colunas deslocadas precisa rodar ANTES do migrar_tipos.py converter
+# usuarios.ID para integer (que se recusa enquanto houver linhas pendentes): o nome guardado no ID
+# vai para NOME e a linha recebe um ID numérico novo, que sobrevive à conversão.
+REPAROS = {
+    "usuarios_colunas_deslocadas": {
+        "tabela": "usuarios",
+        "chave": "ID",
+        "chave_texto": True,
+        "descricao": "cadastros importados com as colunas deslocadas (nome no ID, email no NOME, CPF no EMAIL)",
+        "condicao": '"ID"::text ~ \'^\\D\'',
+        "preparar": [
+            "CREATE SEQUENCE IF NOT EXISTS usuarios_reparo_id_seq",
+            "SELECT setval('usuarios_reparo_id_seq', greatest(1, (SELECT max(\"ID\"::text::bigint) FROM usuarios "
+            "WHERE \"ID\"::text ~ '^\\d+$'), (SELECT last_value FROM usuarios_reparo_id_seq)))",
+        ],
+        "atribuicoes": '"CPF" = "EMAIL", "EMAIL" = "NOME", "NOME" = "ID"::text, "ID" = nextval(\'usuarios_reparo_id_seq\')::text',
+    },
+}
+
+REPAROS_PROGRESSO_DDL = """
+CREATE TABLE IF NOT EXISTS reparos_progresso (
+    "REPARO" TEXT PRIMARY KEY,
+    "ULTIMA_CHAVE" TEXT,
+    "LINHAS" INTEGER NOT NULL DEFAULT 0,
+    "INICIO" TIMESTAMPTZ NOT NULL DEFAULT now(),
+    "ATUALIZADO" TIMESTAMPTZ NOT NULL DEFAULT now(),
+    "CONCLUIDO" TIMESTAMPTZ
+);
+"""
+
+PROGRESSO_QUERY = 'SELECT "ULTIMA_CHAVE", "LINHAS", "CONCLUIDO" FROM reparos_progresso WHERE "REPARO" = :reparo'
+
+REGISTRAR_LOTE_QUERY = """
+    INSERT INTO reparos_progresso ("REPARO", "ULTIMA_CHAVE", "LINHAS")
+    VALUES (:reparo, :chave, :linhas)
+    ON CONFLICT ("REPARO") DO UPDATE
+    SET "ULTIMA_CHAVE" = EXCLUDED."ULTIMA_CHAVE",
+        "LINHAS" = reparos_progresso."LINHAS" + EXCLUDED."LINHAS",
+        "ATUALIZADO" = now()
+"""
+
+TIPO_CHAVE_QUERY = """
+    SELECT format_type(a.atttypid, a.atttypmod)
+    FROM pg_attribute a
+    WHERE a.attrelid = to_regclass(:tabela) AND a.attname = :coluna AND NOT a.attisdropped
+"""
+
+class ReparoInaplicavel(Exception):
+    pass
+
+def ensure_reparos_progresso(conn):
+    conn.execute(sqlalchemy.text(REPAROS_PROGRESSO_DDL))
+
+def tipo_chave(conn, nome):
+    """Tipo atual da chave do reparo; levanta ReparoInaplicavel se a condição exige texto e ela não é mais."""
+    reparo = REPAROS[nome]
+    tipo = conn.execute(sqlalchemy.text(TIPO_CHAVE_QUERY), {"tabela": reparo["tabela"], "coluna": reparo["chave"]}).scalar()
+    if reparo.get("chave_texto") and not (tipo == "text" or tipo.startswith("character")):
+        raise ReparoInaplicavel(f'{reparo["tabela"]}.{reparo["chave"]} já é {tipo}: '
+                                f"o reparo precisava rodar antes do migrar_tipos.py")
+    return tipo
+
+def progresso(conn, nome):
+    """(última chave, linhas corrigidas, concluído em) do reparo, ou None se nunca rodou."""
+    return conn.execute(sqlalchemy.text(PROGRESSO_QUERY), {"reparo": nome}).first()
+
+def reiniciar(conn, nome):
+    conn.execute(sqlalchemy.text('DELETE FROM reparos_progresso WHERE "REPARO" = :reparo'), {"reparo": nome})
+
+def _faixa(chave, tipo, ultima):
+    """Filtro das chaves posteriores ao checkpoint; o cast mantém o índice da chave utilizável."""
+    if ultima is None:
+        return "true"
+    return f'"{chave}" > CAST(:ultima AS {tipo})'
+
+def contar_pendentes(conn, nome, ultima=None):
+    """Linhas que o reparo ainda alteraria (a partir do checkpoint, se houver)."""
+    reparo = REPAROS[nome]
+    tipo = tipo_chave(conn, nome)
+    return conn.execute(sqlalchemy.text(
+        f'SELECT count(*) FROM {reparo["tabela"]} WHERE {_faixa(reparo["chave"], tipo, ultima)} AND {reparo["condicao"]}'
+    ), {"ultima": ultima}).scalar()
+
+def garantir_tabela_backup(conn, nome):
+    """Cria "<tabela>_reparo_<nome>" com as colunas da tabela e a data do reparo."""
+    tabela = REPAROS[nome]["tabela"]
+    backup = f"{tabela}_reparo_{nome}"[:63]
+    conn.execute(sqlalchemy.text(f"CREATE TABLE IF NOT EXISTS {backup} (LIKE {tabela})"))
+    conn.execute(sqlalchemy.text(f'ALTER TABLE {backup} ADD COLUMN IF NOT EXISTS "DATA_REPARO" TIMESTAMPTZ DEFAULT now()'))
+    return backup
+
+def executar(conn, nome, lote=1000, pausa=0.5, lock_timeout_ms=2000):
+    """Aplica o reparo em lotes a partir do checkpoint. Retorna as linhas corrigidas nesta execução.
+
+    Cada lote percorre as próximas :lote chaves pelo índice da chave (não só as que casam com a
+    condição), então o custo de cada transação é limitado mesmo quando a condição é rara.
+    """
+    reparo = REPAROS[nome]
+    tabela, chave = reparo["tabela"], reparo["chave"]
+    with conn.begin():
+        tipo = tipo_chave(conn, nome)
+        ensure_reparos_progresso(conn)
+        backup = garantir_tabela_backup(conn, nome)
+        for comando in reparo.get("preparar", []):
+            conn.execute(sqlalchemy.text(comando))
+        colunas = conn.execute(sqlalchemy.text(
+            "SELECT attname FROM pg_attribute WHERE attrelid = to_regclass(:tabela) AND attnum > 0 AND NOT attisdropped ORDER BY attnum"
+        ), {"tabela": tabela}).scalars().all()
+        estado = progresso(conn, nome)
+    ultima = estado[0] if estado else None
+    lista = ", ".join(f'"{c}"' for c in colunas)
+
+    corrigidas = 0
+    while True:
+        faixa = _faixa(chave, tipo, ultima)
+        with conn.begin():
+            conn.execute(sqlalchemy.text(f"SET LOCAL lock_timeout = {int(lock_timeout_ms)}"))
+            fim = conn.execute(sqlalchemy.text(f"""
+                SELECT max(k)::text FROM (
+                    SELECT "{chave}" AS k FROM {tabela} WHERE {faixa} ORDER BY "{chave}" LIMIT :lote
+                ) s
+            """), {"ultima": ultima, "lote": lote}).scalar()
+            if fim is None:
+                conn.execute(sqlalchemy.text(
+                    'UPDATE reparos_progresso SET "CONCLUIDO" = now(), "ATUALIZADO" = now() WHERE "REPARO" = :reparo'
+                ), {"reparo": nome})
+                return corrigidas
+            params = {"ultima": ultima, "fim": fim}
+            filtro = f'{faixa} AND "{chave}" <= CAST(:fim AS {tipo}) AND {reparo["condicao"]}'
+            conn.execute(sqlalchemy.text(
+                f"INSERT INTO {backup} ({lista}) SELECT {lista} FROM {tabela} WHERE {filtro} FOR UPDATE"
+            ), params)
+            linhas = conn.execute(sqlalchemy.text(f"UPDATE {tabela} SET {reparo['atribuicoes']} WHERE {filtro}"), params).rowcount
+            conn.execute(sqlalchemy.text(REGISTRAR_LOTE_QUERY), {"reparo": nome, "chave": fim, "linhas": linhas})
+        corrigidas += linhas
+        ultima = fim
+        if pausa:
+            time.sleep(pausa)
+
+def main(reparos=None):
+    """Roda os reparos pendentes. Sem --aplicar, só conta as linhas que seriam alteradas."""
+    parser = argparse.ArgumentParser(description="Reparos de dados em lotes, retomáveis.")
+    parser.add_argument("--reparos", default=",".join(reparos or REPAROS),
+                        help=f"Reparos a executar, separados por vírgula (disponíveis: {','.join(REPAROS)}).")
+    parser.add_argument("--aplicar", action="store_true", help="Executa os reparos (sem isso, apenas conta as linhas).")
+    parser.add_argument("--lote", type=int, default=1000, help="Chaves percorridas por transação.")
+    parser.add_argument("--pausa", type=float, default=0.5, help="Segundos de espera entre os lotes.")
+    parser.add_argument("--reiniciar", action="store_true", help="Descarta o checkpoint e recomeça do início da tabela.")
+    args = parser.parse_args()
+
+    engine = get_postgres_engine()
+    if engine is None:
+        print("Não foi possível conectar à base de dados. Verifique o seu ficheiro secrets.toml.")
+        return
+
+    nomes = [nome.strip() for nome in args.reparos.split(",") if nome.strip()]
+    desconhecidos = set(nomes) - set(REPAROS)
+    if desconhecidos:
+        print(f"Reparo(s) desconhecido(s): {', '.join(sorted(desconhecidos))}.")
+        return
+
+    print("--- REPAROS" + ("" if args.aplicar else " (simulação)") + " ---")
+    with engine.connect() as conn:
+        for nome in nomes:
+            reparo = REPAROS[nome]
+            try:
+                with conn.begin():
+                    # A simulação não cria nada: sem a tabela de progresso, o reparo nunca rodou.
+                    if args.aplicar:
+                        ensure_reparos_progresso(conn)
+                        if args.reiniciar:
+                            reiniciar(conn, nome)
+                    existe = conn.execute(sqlalchemy.text("SELECT to_regclass('reparos_progresso') IS NOT NULL")).scalar()
+                    estado = progresso(conn, nome) if existe else None
+                    ultima = None if (estado is None or args.reiniciar) else estado[0]
+                    concluido = estado is not None and estado[2] is not None and not args.reiniciar
+                    pendentes = None if concluido else contar_pendentes(conn, nome, ultima)
+            except ReparoInaplicavel as e:
+                print(f"{nome}: {e}.")
+                continue
+            if concluido:
+                print(f"{nome}: concluído em {estado[2]:%d/%m/%Y %H:%M} ({estado[1]} linha(s)). Use --reiniciar para rodar de novo.")
+                continue
+            retomada = f" a partir da chave {ultima}" if ultima is not None else ""
+            if not args.aplicar:
+                print(f"{nome}: {pendentes} linha(s) de {reparo['descricao']} seriam corrigidas{retomada}.")
+                continue
+            print(f"{nome}: corrigindo {pendentes} linha(s){retomada}...")
+            try:
+                corrigidas = executar(conn, nome, lote=args.lote, pausa=args.pausa)
+            except sqlalchemy.exc.DBAPIError as e:
+                print(f"ERRO: {str(e.orig).splitlines()[0]}\nO último lote foi desfeito; rode novamente para continuar do checkpoint.")
+                return
+            print(f"{nome}: {corrigidas} linha(s) corrigida(s). Originais em {reparo['tabela']}_reparo_{nome}.")
+
+if __name__ == "__main__":
+    main()
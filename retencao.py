@@ -0,0 +1,308 @@
+import argparse
+from datetime import date, datetime, timedelta
+import sqlalchemy
+import toml
+from db_utils import get_postgres_engine, SECRETS_PATH
+from classificados_utils import DIAS_EXPIRACAO_ANUNCIO
+
+# Políticas de retenção: linhas que casam com a condição (com :limite = hoje - dias) saem da tabela
+# consultada pelas páginas e vão para "<tabela>_arquivo", que guarda as mesmas colunas e a data do
+# arquivamento. Os prazos podem ser trocados na seção [retencao] do secrets.toml (ex.: contatos = 365).
+# O limite é passado como 'AAAA-MM-DD HH:MM:SS', que o Postgres converte para o timestamp das colunas.
+POLITICAS = {
+    "contatos": {
+        "dias": 730,
+        "descricao": "mensagens de contato já lidas ou respondidas",
+        "condicao": 't."TIMESTAMP" < :limite AND t."STATUS_ATENDIMENTO" <> \'NOVO\'',
+    },
+    "classificados": {
+        "dias": DIAS_EXPIRACAO_ANUNCIO,
+        "descricao": "anúncios ativos vencidos",
+        "condicao": 't."STATUS" = \'ATIVO\' AND t."DATA_CRIACAO" < :limite',
+    },
+    "comentarios": {
+        "dias": 180,
+        "descricao": "comentários não aprovados",
+        "condicao": 't."STATUS" <> \'APROVADO\' AND t."TIMESTAMP" < :limite',
+    },
+    "noticia_likes": {
+        "dias": 730,
+        "descricao": "likes de notícias antigas",
+        "condicao": 't."NOTICIA_ID" IN (SELECT n."ID" FROM noticias n WHERE n."DATA" < :limite)',
+    },
+}
+
+# financas é particionada por mês de vencimento; partições inteiras mais antigas que o prazo são
+# desanexadas e anexadas a financas_arquivo, sem copiar nenhuma linha.
+MESES_RETENCAO_FINANCAS = 60
+MESES_FUTUROS_FINANCAS = 12
+
+COLUNAS_QUERY = """
+    SELECT a.attname, format_type(a.atttypid, a.atttypmod)
+    FROM pg_attribute a
+    WHERE a.attrelid = to_regclass(:tabela) AND a.attnum > 0 AND NOT a.attisdropped
+    ORDER BY a.attnum
+"""
+
+PARTICOES_QUERY = """
+    SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = to_regclass(:tabela)
+    ORDER BY c.relname
+"""
+
+def _colunas(conn, tabela):
+    return conn.execute(sqlalchemy.text(COLUNAS_QUERY), {"tabela": tabela}).fetchall()
+
+def garantir_tabela_arquivo(conn, tabela):
+    """Cria "<tabela>_arquivo" e acrescenta as colunas que a tabela de origem ganhou desde então."""
+    arquivo = f"{tabela}_arquivo"
+    conn.execute(sqlalchemy.text(
+        f'CREATE TABLE IF NOT EXISTS {arquivo} (LIKE {tabela} INCLUDING DEFAULTS);'
+        f'ALTER TABLE {arquivo} ADD COLUMN IF NOT EXISTS "DATA_ARQUIVAMENTO" TIMESTAMPTZ NOT NULL DEFAULT now()'
+    ))
+    for coluna, tipo in _colunas(conn, tabela):
+        conn.execute(sqlalchemy.text(f'ALTER TABLE {arquivo} ADD COLUMN IF NOT EXISTS "{coluna}" {tipo}'))
+    return arquivo
+
+def limite_politica(dias, hoje=None):
+    """Data de corte de uma política, no formato das colunas de texto."""
+    return (datetime.combine(hoje or date.today(), datetime.min.time()) - timedelta(days=dias)).strftime("%Y-%m-%d %H:%M:%S")
+
+def contar_elegiveis(conn, tabela, condicao, limite):
+    """Quantas linhas a política moveria agora."""
+    return conn.execute(sqlalchemy.text(f"SELECT count(*) FROM {tabela} t WHERE {condicao}"), {"limite": limite}).scalar()
+
+def arquivar(conn, tabela, condicao, limite, lote=1000):
+    """Move as linhas que casam com a condição para "<tabela>_arquivo", um lote por transação.
+
+    Cada lote é um DELETE ... RETURNING encadeado ao INSERT, então nenhuma linha fica nas duas tabelas
+    nem se perde se o processo parar no meio. Retorna o total movido.
+    """
+    with conn.begin():
+        arquivo = garantir_tabela_arquivo(conn, tabela)
+        colunas = ", ".join(f'"{coluna}"' for coluna, _ in _colunas(conn, tabela))
+    query = sqlalchemy.text(f"""
+        WITH movidos AS (
+            DELETE FROM {tabela}
+            WHERE ctid IN (SELECT t.ctid FROM {tabela} t WHERE {condicao} LIMIT :lote)
+            RETURNING *
+        )
+        INSERT INTO {arquivo} ({colunas})
+        SELECT {colunas} FROM movidos
+    """)
+    total = 0
+    while True:
+        with conn.begin():
+            movidos = conn.execute(query, {"limite": limite, "lote": lote}).rowcount
+        total += movidos
+        if movidos < lote:
+            return total
+
+# --- PARTICIONAMENTO DE FINANCAS ---
+def _mes(ano, mes, deslocamento=0):
+    indice = ano * 12 + (mes - 1) + deslocamento
+    return indice // 12, indice % 12 + 1
+
+def _particao_padrao(conn, tabela):
+    """Nome da partição padrão (DEFAULT) da tabela, ou None."""
+    for nome, limites in conn.execute(sqlalchemy.text(PARTICOES_QUERY), {"tabela": tabela}).fetchall():
+        if limites == "DEFAULT":
+            return nome
+    return None
+
+def _particao_mensal(conn, tabela, ano, mes):
+    """Cria, se faltar, a partição do mês [AAAA-MM-01, mês seguinte). Retorna as linhas tiradas da partição padrão.
+
+    Um CREATE ... PARTITION OF falha se a partição padrão já tiver linhas daquele mês (cobranças lançadas
+    com vencimento além das partições futuras). Nesse caso a partição é criada à parte, recebe as linhas
+    do mês num DELETE ... RETURNING encadeado ao INSERT e só então é anexada.
+    """
+    nome = f"{tabela}_p{ano:04d}_{mes:02d}"
+    if conn.execute(sqlalchemy.text("SELECT to_regclass(:nome)"), {"nome": nome}).scalar() is not None:
+        return 0
+    proximo_ano, proximo_mes = _mes(ano, mes, 1)
+    inicio, fim = f"{ano:04d}-{mes:02d}-01", f"{proximo_ano:04d}-{proximo_mes:02d}-01"
+    padrao = _particao_padrao(conn, tabela)
+    limites = {"inicio": inicio, "fim": fim}
+    no_padrao = padrao and conn.execute(sqlalchemy.text(
+        f'SELECT EXISTS (SELECT 1 FROM {padrao} WHERE "DATA_VENCIMENTO" >= :inicio AND "DATA_VENCIMENTO" < :fim)'
+    ), limites).scalar()
+    if not no_padrao:
+        conn.execute(sqlalchemy.text(f"CREATE TABLE {nome} PARTITION OF {tabela} FOR VALUES FROM ('{inicio}') TO ('{fim}')"))
+        return 0
+    colunas = ", ".join(f'"{coluna}"' for coluna, _ in _colunas(conn, tabela))
+    conn.execute(sqlalchemy.text(f"CREATE TABLE {nome} (LIKE {tabela} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    movidas = conn.execute(sqlalchemy.text(f"""
+        WITH movidas AS (
+            DELETE FROM {padrao} WHERE "DATA_VENCIMENTO" >= :inicio AND "DATA_VENCIMENTO" < :fim
+            RETURNING *
+        )
+        INSERT INTO {nome} ({colunas}) SELECT {colunas} FROM movidas
+    """), limites).rowcount
+    conn.execute(sqlalchemy.text(f"ALTER TABLE {tabela} ATTACH PARTITION {nome} FOR VALUES FROM ('{inicio}') TO ('{fim}')"))
+    return movidas
+
+def financas_particionada(conn):
+    return conn.execute(sqlalchemy.text(
+        "SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass('financas')"
+    )).scalar()
+
+def particionar_financas(conn):
+    """Recria financas como tabela particionada por mês de "DATA_VENCIMENTO", numa única transação.
+
+    A tabela original é mantida como financas_antiga para conferência; vencimentos nulos ou fora de
+    qualquer mês criado vão para a partição padrão.
+    """
+    with conn.begin():
+        conn.execute(sqlalchemy.text("LOCK TABLE financas IN ACCESS EXCLUSIVE MODE"))
+        conn.execute(sqlalchemy.text(
+            "CREATE TABLE financas_particionada (LIKE financas INCLUDING DEFAULTS INCLUDING CONSTRAINTS "
+            'INCLUDING IDENTITY INCLUDING GENERATED) PARTITION BY RANGE ("DATA_VENCIMENTO")'
+        ))
+        meses = conn.execute(sqlalchemy.text(
+            'SELECT DISTINCT substr("DATA_VENCIMENTO", 1, 7) FROM financas '
+            "WHERE \"DATA_VENCIMENTO\" ~ '^\\d{4}-\\d{2}'"
+        )).scalars().all()
+        for mes in meses:
+            _particao_mensal(conn, "financas_particionada", int(mes[:4]), int(mes[5:7]))
+        conn.execute(sqlalchemy.text("CREATE TABLE financas_particionada_padrao PARTITION OF financas_particionada DEFAULT"))
+        conn.execute(sqlalchemy.text("INSERT INTO financas_particionada SELECT * FROM financas"))
+
+        conn.execute(sqlalchemy.text("ALTER TABLE financas RENAME TO financas_antiga"))
+        conn.execute(sqlalchemy.text("ALTER INDEX IF EXISTS financas_pendentes_vencimento_idx RENAME TO financas_antiga_pendentes_vencimento_idx"))
+        conn.execute(sqlalchemy.text("ALTER TABLE financas_particionada RENAME TO financas"))
+        conn.execute(sqlalchemy.text("ALTER TABLE financas_particionada_padrao RENAME TO financas_padrao"))
+        for nome, _ in conn.execute(sqlalchemy.text(PARTICOES_QUERY), {"tabela": "financas"}).fetchall():
+            if nome.startswith("financas_particionada_p"):
+                conn.execute(sqlalchemy.text(f"ALTER TABLE {nome} RENAME TO {nome.replace('financas_particionada_', 'financas_')}"))
+        conn.execute(sqlalchemy.text(
+            'CREATE INDEX financas_pendentes_vencimento_idx ON financas ("DATA_VENCIMENTO") WHERE "STATUS" = \'PENDENTE\';'
+            'CREATE INDEX IF NOT EXISTS financas_usuario_idx ON financas ("USER_ID");'
+            'CREATE INDEX IF NOT EXISTS financas_cobranca_idx ON financas ("COBRANCA_ID")'
+        ))
+    return len(meses)
+
+def garantir_particoes_futuras(conn, meses=MESES_FUTUROS_FINANCAS, hoje=None):
+    """Cria as partições dos próximos meses e as dos meses que já têm cobranças na partição padrão.
+
+    Cada mês é uma transação, para que um mês com problema não desfaça os outros. Retorna as linhas
+    tiradas da partição padrão.
+    """
+    hoje = hoje or date.today()
+    with conn.begin():
+        padrao = _particao_padrao(conn, "financas")
+        meses_padrao = conn.execute(sqlalchemy.text(
+            f'SELECT DISTINCT substr("DATA_VENCIMENTO", 1, 7) FROM {padrao} '
+            "WHERE \"DATA_VENCIMENTO\" ~ '^\\d{4}-\\d{2}'"
+        )).scalars().all() if padrao else []
+    alvos = {_mes(hoje.year, hoje.month, deslocamento) for deslocamento in range(meses + 1)}
+    alvos |= {(int(mes[:4]), int(mes[5:7])) for mes in meses_padrao}
+    movidas = 0
+    for ano, mes in sorted(alvos):
+        with conn.begin():
+            movidas += _particao_mensal(conn, "financas", ano, mes)
+    return movidas
+
+def particoes_expiradas(conn, meses=MESES_RETENCAO_FINANCAS, hoje=None):
+    """Partições mensais de financas cujo mês inteiro é anterior ao prazo de retenção."""
+    hoje = hoje or date.today()
+    corte = "financas_p%04d_%02d" % _mes(hoje.year, hoje.month, -meses)
+    return [
+        nome for nome, _ in conn.execute(sqlalchemy.text(PARTICOES_QUERY), {"tabela": "financas"}).fetchall()
+        if nome.startswith("financas_p") and nome != "financas_padrao" and nome < corte
+    ]
+
+def arquivar_particoes_financas(conn, particoes):
+    """Desanexa as partições de financas e as anexa a financas_arquivo (só metadados, sem copiar linhas)."""
+    with conn.begin():
+        conn.execute(sqlalchemy.text(
+            "CREATE TABLE IF NOT EXISTS financas_arquivo (LIKE financas INCLUDING DEFAULTS) "
+            'PARTITION BY RANGE ("DATA_VENCIMENTO")'
+        ))
+        for nome in particoes:
+            ano, mes = int(nome[-7:-3]), int(nome[-2:])
+            proximo_ano, proximo_mes = _mes(ano, mes, 1)
+            conn.execute(sqlalchemy.text(f"ALTER TABLE financas DETACH PARTITION {nome}"))
+            conn.execute(sqlalchemy.text(
+                f"ALTER TABLE financas_arquivo ATTACH PARTITION {nome} "
+                f"FOR VALUES FROM ('{ano:04d}-{mes:02d}-01') TO ('{proximo_ano:04d}-{proximo_mes:02d}-01')"
+            ))
+
+def _tamanho(conn, tabela):
+    """Tamanho em disco da tabela, somando as partições quando houver."""
+    return conn.execute(sqlalchemy.text(
+        "SELECT pg_size_pretty(sum(pg_total_relation_size(relid))) FROM pg_partition_tree(to_regclass(:tabela))"
+    ), {"tabela": tabela}).scalar()
+
+def main():
+    """Aplica as políticas de retenção (ou só as relata, com --simular). Feito para rodar toda noite."""
+    parser = argparse.ArgumentParser(description="Arquivamento das tabelas que só crescem.")
+    parser.add_argument("--politicas", default=",".join(POLITICAS),
+                        help=f"Políticas a aplicar, separadas por vírgula (padrão: {','.join(POLITICAS)}).")
+    parser.add_argument("--lote", type=int, default=1000, help="Linhas movidas por transação.")
+    parser.add_argument("--particionar-financas", action="store_true",
+                        help="Converte financas em tabela particionada por mês de vencimento (uma vez).")
+    parser.add_argument("--meses-financas", type=int, default=None,
+                        help=f"Meses de cobranças mantidos em financas (padrão: {MESES_RETENCAO_FINANCAS}).")
+    parser.add_argument("--simular", action="store_true", help="Apenas relata o que seria arquivado.")
+    args = parser.parse_args()
+
+    engine = get_postgres_engine()
+    if engine is None:
+        print("Não foi possível conectar à base de dados. Verifique o seu ficheiro secrets.toml.")
+        return
+
+    config = toml.load(SECRETS_PATH).get("retencao", {})
+    meses_financas = args.meses_financas or config.get("financas_meses", MESES_RETENCAO_FINANCAS)
+    nomes = [nome.strip() for nome in args.politicas.split(",") if nome.strip()]
+    desconhecidas = set(nomes) - set(POLITICAS)
+    if desconhecidas:
+        print(f"Política(s) desconhecida(s): {', '.join(sorted(desconhecidas))}.")
+        return
+
+    print("--- RETENÇÃO" + (" (simulação)" if args.simular else "") + " ---")
+    with engine.connect() as conn:
+        for nome in nomes:
+            politica = POLITICAS[nome]
+            dias = int(config.get(nome, politica["dias"]))
+            limite = limite_politica(dias)
+            with conn.begin():
+                existe = conn.execute(sqlalchemy.text("SELECT to_regclass(:t)"), {"t": nome}).scalar() is not None
+                if existe and args.simular:
+                    elegiveis = contar_elegiveis(conn, nome, politica["condicao"], limite)
+                    tamanho = _tamanho(conn, nome)
+            if not existe:
+                print(f"{nome}: tabela inexistente, ignorada.")
+            elif args.simular:
+                print(f"{nome} ({tamanho}): {elegiveis} linha(s) de {politica['descricao']} anteriores a {limite[:10]} seriam arquivadas.")
+            else:
+                movidas = arquivar(conn, nome, politica["condicao"], limite, lote=args.lote)
+                print(f"{nome}: {movidas} linha(s) de {politica['descricao']} anteriores a {limite[:10]} arquivadas.")
+
+        with conn.begin():
+            particionada = financas_particionada(conn)
+        if not particionada and args.particionar_financas and not args.simular:
+            criadas = particionar_financas(conn)
+            print(f"financas: convertida em tabela particionada ({criadas} mês(es) com dados). A original ficou em financas_antiga.")
+            particionada = True
+        if not particionada:
+            print("financas: não particionada (use --particionar-financas).")
+            return
+        if not args.simular:
+            movidas = garantir_particoes_futuras(conn)
+            if movidas:
+                print(f"financas: {movidas} cobrança(s) movida(s) da partição padrão para a partição do seu mês.")
+        with conn.begin():
+            expiradas = particoes_expiradas(conn, meses_financas)
+            tamanho = _tamanho(conn, "financas")
+        if args.simular:
+            print(f"financas ({tamanho}): {len(expiradas)} partição(ões) anteriores a {meses_financas} meses seriam arquivadas"
+                  + (f" ({expiradas[0]} a {expiradas[-1]})." if expiradas else "."))
+        elif expiradas:
+            arquivar_particoes_financas(conn, expiradas)
+            print(f"financas: {len(expiradas)} partição(ões) movida(s) para financas_arquivo.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+import html as html_lib
+import math
+import pandas as pd
+import sqlalchemy
+from tag_utils import STATUS_PUBLICADA
+
+# Busca textual no PostgreSQL. Cada tabela ganha uma coluna tsvector gerada ("BUSCA_TSV"), mantida
+# pelo próprio banco a cada INSERT/UPDATE, e um índice GIN. A configuração pt_unaccent aplica o
+# stemmer do português depois do unaccent, então "saude" encontra "Saúde".
+CONFIG_BUSCA = "pt_unaccent"
+COLUNA_TSV = "BUSCA_TSV"
+
+# Marcadores do ts_headline; o trecho é escapado em Python e só então eles viram <mark>.
+INICIO_DESTAQUE = "⟦"
+FIM_DESTAQUE = "⟧"
+
+CONFIG_DDL = f"""
+CREATE EXTENSION IF NOT EXISTS unaccent;
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = '{CONFIG_BUSCA}') THEN
+        CREATE TEXT SEARCH CONFIGURATION {CONFIG_BUSCA} (COPY = portuguese);
+        ALTER TEXT SEARCH CONFIGURATION {CONFIG_BUSCA}
+            ALTER MAPPING FOR hword, hword_part, word WITH unaccent, portuguese_stem;
+    END IF;
+END $$;
+"""
+
+# Fontes de busca: colunas indexadas com peso (A é o mais relevante), coluna do título, coluna usada
+# no trecho destacado, filtro de visibilidade e colunas extras devolvidas para exibição.
+# As colunas listadas em "html" têm as tags removidas antes de indexar.
+FONTES_BUSCA = {
+    "noticias": {
+        "chave": '"ID"',
+        "titulo": "TITULO",
+        "campos": [("TITULO", "A"), ("RESUMO", "B"), ("CONTEUDO_TEXTO", "C")],
+        "trecho": "CONTEUDO_TEXTO",
+        "filtro": f"t.\"STATUS\" = '{STATUS_PUBLICADA}'",
+        "dados": ["DATA", "IMAGEM_URL", "RESUMO"],
+    },
+    "faq": {
+        "chave": '"ID"',
+        "titulo": "PERGUNTA",
+        "campos": [("PERGUNTA", "A"), ("RESPOSTA_TEXTO", "B")],
+        "trecho": "RESPOSTA_TEXTO",
+        "filtro": "t.\"STATUS\" = 'ATIVO'",
+        "dados": ["RESPOSTA", "RESPOSTA_HTML"],
+    },
+    "classificados": {
+        "chave": '"CLASSIFICADO_ID"',
+        "titulo": "TITULO",
+        "campos": [("TITULO", "A"), ("CATEGORIA", "B"), ("DESCRICAO", "B")],
+        "trecho": "DESCRICAO",
+        "filtro": "t.\"STATUS\" = 'ATIVO'",
+        "dados": [],
+    },
+    "convenios": {
+        "chave": '"CONVENIO_ID"',
+        "titulo": "NOME_CONVENIO",
+        "campos": [("NOME_CONVENIO", "A"), ("TIPO_SERVICO", "A"), ("DESCRICAO", "C")],
+        "trecho": "DESCRICAO",
+        "html": {"DESCRICAO"},
+        "filtro": "t.\"STATUS\" = 'ATIVO'",
+        "dados": ["ICON_URL"],
+    },
+}
+
+def _get_connection():
+    """Importa a conexão sob demanda para que scripts possam usar o módulo passando a própria conexão."""
+    from auth import get_db_connection
+    return get_db_connection()
+
+def _texto_coluna(fonte, coluna):
+    """Expressão SQL com o texto da coluna (sem tags HTML, se for o caso), nunca nula."""
+    expr = f'coalesce("{coluna}"::text, \'\')'
+    if coluna in fonte.get("html", ()):
+        expr = f"regexp_replace({expr}, '<[^>]+>', ' ', 'g')"
+    return expr
+
+def expressao_tsvector(fonte, colunas_existentes):
+    """Monta a expressão do tsvector ponderado com as colunas da fonte que existem na tabela."""
+    partes = [
+        f"setweight(to_tsvector('{CONFIG_BUSCA}', {_texto_coluna(fonte, coluna)}), '{peso}')"
+        for coluna, peso in fonte["campos"] if coluna in colunas_existentes
+    ]
+    return " || ".join(partes)
+
+def colunas_existentes(conn, tabelas):
+    """{tabela: colunas} das tabelas indicadas que existem no esquema atual."""
+    colunas = {}
+    for table, column in conn.execute(sqlalchemy.text(
+        "SELECT table_name, column_name FROM information_schema.columns "
+        "WHERE table_schema = current_schema() AND table_name = ANY(:tables)"
+    ), {"tables": list(tabelas)}):
+        colunas.setdefault(table, set()).add(column)
+    return colunas
+
+def configurar_busca(conn, recriar=False):
+    """Cria a configuração de texto, as colunas tsvector geradas e os índices GIN. Retorna as tabelas configuradas."""
+    with conn.begin():
+        conn.execute(sqlalchemy.text(CONFIG_DDL))
+        colunas = colunas_existentes(conn, FONTES_BUSCA)
+
+    configuradas = []
+    for table, fonte in FONTES_BUSCA.items():
+        expressao = expressao_tsvector(fonte, colunas.get(table, set()))
+        if not expressao:
+            continue
+        with conn.begin():
+            if recriar:
+                conn.execute(sqlalchemy.text(f'ALTER TABLE {table} DROP COLUMN IF EXISTS "{COLUNA_TSV}"'))
+            conn.execute(sqlalchemy.text(
+                f'ALTER TABLE {table} ADD COLUMN IF NOT EXISTS "{COLUNA_TSV}" tsvector '
+                f'GENERATED ALWAYS AS ({expressao}) STORED'
+            ))
+            conn.execute(sqlalchemy.text(
+                f'CREATE INDEX IF NOT EXISTS {table}_busca_idx ON {table} USING GIN ("{COLUNA_TSV}")'
+            ))
+        configuradas.append(table)
+    return configuradas
+
+def _consulta_fonte(nome, fonte, filtro_extra=None):
+    dados = ", ".join(f"'{coluna}', t.\"{coluna}\"" for coluna in fonte["dados"])
+    return f"""
+        SELECT '{nome}' AS fonte, t.{fonte['chave']}::text AS id, t."{fonte['titulo']}"::text AS titulo,
+               {_texto_coluna(fonte, fonte['trecho'])} AS texto_trecho,
+               jsonb_build_object({dados}) AS dados,
+               ts_rank_cd(t."{COLUNA_TSV}", q.consulta, 32) AS rank
+        FROM {nome} t, q
+        WHERE t."{COLUNA_TSV}" @@ q.consulta AND {fonte['filtro']} AND {filtro_extra or 'true'}
+    """
+
+def _consulta_fonte_simples(nome, fonte, colunas, filtro_extra=None):
+    """Filtro antigo (ILIKE nos campos da fonte), usado enquanto o configurar_busca.py não rodou nesta base."""
+    dados = ", ".join(f"'{coluna}', t.\"{coluna}\"" for coluna in fonte["dados"] if coluna in colunas)
+    campos = [_texto_coluna(fonte, coluna) for coluna, _ in fonte["campos"] if coluna in colunas]
+    trecho = _texto_coluna(fonte, fonte["trecho"]) if fonte["trecho"] in colunas else "''"
+    return f"""
+        SELECT '{nome}' AS fonte, t.{fonte['chave']}::text AS id, t."{fonte['titulo']}"::text AS titulo,
+               left({trecho}, 300) AS trecho, jsonb_build_object({dados}) AS dados, 0.0 AS rank
+        FROM {nome} t
+        WHERE ({' OR '.join(f'{campo} ILIKE :padrao' for campo in campos) or 'false'})
+          AND {fonte['filtro']} AND {filtro_extra or 'true'}
+    """
+
+def destacar_trecho(trecho):
+    """Escapa o trecho retornado pelo ts_headline e converte os marcadores em <mark>."""
+    return html_lib.escape(trecho or "").replace(INICIO_DESTAQUE, "<mark>").replace(FIM_DESTAQUE, "</mark>")
+
+def _transacao(conn):
+    """Transação própria, ou um savepoint se o chamador já estiver numa: um erro não contamina a dele."""
+    return conn.begin_nested() if conn.in_transaction() else conn.begin()
+
+def _buscar_simples(conn, termo, fontes, filtros, params):
+    """Busca pelo filtro antigo, em ordem alfabética, com a mesma paginação."""
+    with _transacao(conn):
+        colunas = colunas_existentes(conn, fontes)
+        uniao = " UNION ALL ".join(
+            _consulta_fonte_simples(nome, FONTES_BUSCA[nome], colunas[nome], filtros.get(nome))
+            for nome in fontes if nome in colunas
+        )
+        if not uniao:
+            return []
+        padrao = "%" + termo.strip().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        return conn.execute(sqlalchemy.text(f"""
+            SELECT *, count(*) OVER () AS total FROM ({uniao}) r
+            ORDER BY titulo
+            LIMIT :limite OFFSET :offset
+        """), {**params, "padrao": padrao}).mappings().all()
+
+def buscar(termo, fontes=None, pagina=1, por_pagina=10, conn=None, filtros=None, parametros=None):
+    """Busca o termo nas fontes indicadas (padrão: todas), ordenado por relevância.
+
+    'filtros' ({fonte: condição SQL sobre t}) restringe cada fonte além do filtro de visibilidade, com
+    os valores em 'parametros'. Enquanto o configurar_busca.py não tiver rodado, cai no filtro antigo
+    (ILIKE nos campos da fonte). Retorna (DataFrame com fonte, id, titulo, trecho em HTML seguro,
+    dados e rank; total de resultados).
+    """
+    fontes = list(fontes or FONTES_BUSCA)
+    filtros = filtros or {}
+    vazio = pd.DataFrame(columns=["fonte", "id", "titulo", "dados", "rank", "trecho"])
+    if not termo or not termo.strip():
+        return vazio, 0
+    own_conn = conn is None
+    conn = conn or _get_connection()
+    if conn is None: return vazio, 0
+
+    uniao = " UNION ALL ".join(_consulta_fonte(nome, FONTES_BUSCA[nome], filtros.get(nome)) for nome in fontes)
+    # Ordena e pagina antes de gerar os trechos: o ts_headline só roda nas linhas exibidas.
+    query = sqlalchemy.text(f"""
+        WITH q AS (SELECT websearch_to_tsquery('{CONFIG_BUSCA}', :termo) AS consulta),
+        resultados AS ({uniao}),
+        pagina AS (
+            SELECT *, count(*) OVER () AS total FROM resultados
+            ORDER BY rank DESC, titulo
+            LIMIT :limite OFFSET :offset
+        )
+        SELECT p.fonte, p.id, p.titulo, p.dados, p.rank, p.total,
+               ts_headline('{CONFIG_BUSCA}', p.texto_trecho, q.consulta,
+                           'StartSel={INICIO_DESTAQUE}, StopSel={FIM_DESTAQUE}, MaxWords=35, MinWords=15, MaxFragments=2') AS trecho
+        FROM pagina p, q
+        ORDER BY p.rank DESC, p.titulo
+    """)
+    params = {
+        **(parametros or {}),
+        "termo": termo.strip(),
+        "limite": por_pagina,
+        "offset": (max(pagina, 1) - 1) * por_pagina,
+    }
+    try:
+        try:
+            with _transacao(conn):
+                rows = conn.execute(query, params).mappings().all()
+        except sqlalchemy.exc.ProgrammingError:
+            # Sem a coluna BUSCA_TSV ou a configuração pt_unaccent.
+            rows = _buscar_simples(conn, termo, fontes, filtros, params)
+    finally:
+        if own_conn: conn.close()
+
+    df = pd.DataFrame([dict(row) for row in rows], columns=["fonte", "id", "titulo", "dados", "rank", "total", "trecho"])
+    total = int(df["total"].iloc[0]) if not df.empty else 0
+    df["trecho"] = df["trecho"].map(destacar_trecho)
+    return df.drop(columns="total"), total
+
+def pagina_atual(chave, termo):
+    """Página corrente dos resultados; volta para a primeira quando o termo buscado muda."""
+    import streamlit as st
+    if st.session_state.get(f"{chave}_termo") != termo:
+        st.session_state[f"{chave}_termo"] = termo
+        st.session_state[chave] = 1
+    return st.session_state.get(chave, 1)
+
+def paginacao(chave, total, por_pagina):
+    """Botões de página anterior/próxima para os resultados da busca. Retorna a página atual."""
+    import streamlit as st
+    total_paginas = max(1, math.ceil(total / por_pagina))
+    pagina = min(max(st.session_state.get(chave, 1), 1), total_paginas)
+    st.session_state[chave] = pagina
+    if total_paginas > 1:
+        col1, col2, col3 = st.columns([2, 1, 2])
+        if col1.button("⬅️ Anterior", key=f"{chave}_anterior", disabled=pagina <= 1):
+            st.session_state[chave] = pagina - 1
+            st.rerun()
+        col2.write(f"Página {pagina} de {total_paginas}")
+        if col3.button("Próxima ➡️", key=f"{chave}_proxima", disabled=pagina >= total_paginas):
+            st.session_state[chave] = pagina + 1
+            st.rerun()
+    return pagina
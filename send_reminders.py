@@ -0,0 +1,168 @@
+import argparse
+import time
+from datetime import date, timedelta
+import sqlalchemy
+import toml
+from db_utils import get_postgres_engine, SECRETS_PATH
+from email_utils import SMTPPool, build_due_date_reminder_email, build_renewal_reminder_email
+
+DIAS_ANTECEDENCIA_PADRAO = 3
+
+# O registro de envios é a chave da idempotência: cada lembrete é reservado com um INSERT ... ON CONFLICT
+# antes do envio, então execuções repetidas (ou simultâneas) nunca mandam o mesmo lembrete duas vezes.
+# A tabela lembretes_enviados e os índices das consultas abaixo vêm da migração 007 (migracoes.py).
+
+# DATA_VENCIMENTO continua texto ISO ('AAAA-MM-DD'), cuja ordem lexicográfica é a cronológica;
+# usuarios."DATA_CADASTRO" é timestamp e o aniversário é comparado como mês * 100 + dia.
+# O lembrete de vencimento vale por cobrança e data de vencimento; o de renovação, por membro e ano.
+VENCIMENTOS_QUERY = """
+    SELECT f."COBRANCA_ID"::text AS referencia_id, f."DATA_VENCIMENTO" AS periodo, u."EMAIL", u."NOME",
+           f."SERVICO_CONTRATADO" AS "DESCRICAO", f."VALOR", f."DATA_VENCIMENTO"
+    FROM financas f
+    JOIN usuarios u ON u."ID" = f."USER_ID"
+    WHERE f."STATUS" = 'PENDENTE'
+      AND f."DATA_VENCIMENTO" BETWEEN :inicio AND :fim
+      AND u."EMAIL" IS NOT NULL
+      AND NOT EXISTS (
+          SELECT 1 FROM lembretes_enviados l
+          WHERE l."TIPO" = 'vencimento' AND l."REFERENCIA_ID" = f."COBRANCA_ID"::text
+            AND l."PERIODO" = f."DATA_VENCIMENTO"
+      )
+"""
+
+ANIVERSARIOS_QUERY = """
+    SELECT u."ID"::text AS referencia_id, :ano AS periodo, u."EMAIL", u."NOME"
+    FROM usuarios u
+    WHERE u."STATUS" = 'ATIVO'
+      AND date_part('month', u."DATA_CADASTRO") * 100 + date_part('day', u."DATA_CADASTRO") = ANY(:dias_mes)
+      AND u."DATA_CADASTRO" < :inicio_ano
+      AND u."EMAIL" IS NOT NULL
+      AND NOT EXISTS (
+          SELECT 1 FROM lembretes_enviados l
+          WHERE l."TIPO" = 'renovacao' AND l."REFERENCIA_ID" = u."ID"::text AND l."PERIODO" = :ano
+      )
+"""
+
+RESERVAR_QUERY = """
+    INSERT INTO lembretes_enviados ("TIPO", "REFERENCIA_ID", "PERIODO", "EMAIL")
+    SELECT :tipo, r.referencia_id, r.periodo, r.email
+    FROM unnest(CAST(:referencias AS TEXT[]), CAST(:periodos AS TEXT[]), CAST(:emails AS TEXT[]))
+         AS r(referencia_id, periodo, email)
+    ON CONFLICT DO NOTHING
+    RETURNING "REFERENCIA_ID", "PERIODO"
+"""
+
+LIBERAR_QUERY = """
+    DELETE FROM lembretes_enviados
+    WHERE "TIPO" = :tipo AND ("REFERENCIA_ID", "PERIODO") IN (
+        SELECT * FROM unnest(CAST(:referencias AS TEXT[]), CAST(:periodos AS TEXT[]))
+    )
+"""
+
+def dias_aniversario(hoje):
+    """Dias de cadastro (mês * 100 + dia) cujo aniversário cai hoje; em anos não bissextos, 29/02 é lembrado em 28/02."""
+    dias = [hoje.month * 100 + hoje.day]
+    if hoje.month == 2 and hoje.day == 28 and (hoje + timedelta(days=1)).month == 3:
+        dias.append(229)
+    return dias
+
+def buscar_candidatos(conn, hoje, dias_antecedencia):
+    """Seleciona, com uma consulta por tipo, os lembretes de hoje que ainda não foram enviados."""
+    vencimentos = conn.execute(sqlalchemy.text(VENCIMENTOS_QUERY), {
+        "inicio": hoje.isoformat(),
+        "fim": (hoje + timedelta(days=dias_antecedencia)).isoformat(),
+    }).mappings().all()
+    aniversarios = conn.execute(sqlalchemy.text(ANIVERSARIOS_QUERY), {
+        "ano": str(hoje.year),
+        "dias_mes": dias_aniversario(hoje),
+        "inicio_ano": f"{hoje.year}-01-01",
+    }).mappings().all()
+    return {"vencimento": vencimentos, "renovacao": aniversarios}
+
+def reservar(conn, tipo, candidatos):
+    """Grava no registro os lembretes que serão enviados. Retorna só os que esta execução conseguiu reservar."""
+    if not candidatos:
+        return []
+    with conn.begin():
+        reservados = set(map(tuple, conn.execute(sqlalchemy.text(RESERVAR_QUERY), {
+            "tipo": tipo,
+            "referencias": [c["referencia_id"] for c in candidatos],
+            "periodos": [c["periodo"] for c in candidatos],
+            "emails": [c["EMAIL"] for c in candidatos],
+        }).fetchall()))
+    return [c for c in candidatos if (c["referencia_id"], c["periodo"]) in reservados]
+
+def liberar(conn, tipo, falhas):
+    """Remove do registro os lembretes cujo envio falhou, para que a próxima execução tente de novo."""
+    if not falhas:
+        return
+    with conn.begin():
+        conn.execute(sqlalchemy.text(LIBERAR_QUERY), {
+            "tipo": tipo,
+            "referencias": [c["referencia_id"] for c in falhas],
+            "periodos": [c["periodo"] for c in falhas],
+        })
+
+def montar_mensagem(tipo, candidato, remetente):
+    if tipo == "vencimento":
+        return build_due_date_reminder_email(candidato["EMAIL"], candidato, remetente)
+    return build_renewal_reminder_email(candidato["EMAIL"], candidato, remetente)
+
+def main():
+    """Envia os lembretes de vencimento e de aniversário de associação do dia."""
+    parser = argparse.ArgumentParser(description="Envio agendado de lembretes por email.")
+    parser.add_argument("--dias", type=int, default=DIAS_ANTECEDENCIA_PADRAO,
+                        help="Antecedência, em dias, dos lembretes de vencimento.")
+    parser.add_argument("--data", type=date.fromisoformat, default=None, help="Data de referência (AAAA-MM-DD).")
+    parser.add_argument("--conexoes", type=int, default=3, help="Conexões SMTP simultâneas.")
+    parser.add_argument("--max-por-segundo", type=float, default=5, help="Limite de envios por segundo.")
+    parser.add_argument("--simular", action="store_true", help="Apenas lista os lembretes, sem enviar nem registrar.")
+    args = parser.parse_args()
+
+    engine = get_postgres_engine()
+    if engine is None:
+        print("Não foi possível conectar à base de dados. Verifique o seu ficheiro secrets.toml.")
+        return
+
+    inicio = time.monotonic()
+    hoje = args.data or date.today()
+    email_creds = toml.load(SECRETS_PATH)["email_credentials"]
+    resumo = {}
+
+    with engine.connect() as conn:
+        with conn.begin():
+            if not conn.execute(sqlalchemy.text("SELECT to_regclass('lembretes_enviados') IS NOT NULL")).scalar():
+                print("A tabela lembretes_enviados não existe. Rode antes: python migracoes.py")
+                return
+            candidatos_por_tipo = buscar_candidatos(conn, hoje, args.dias)
+
+        with SMTPPool(email_creds, pool_size=args.conexoes, max_por_segundo=args.max_por_segundo) as pool:
+            for tipo, candidatos in candidatos_por_tipo.items():
+                if args.simular:
+                    for c in candidatos:
+                        print(f"  [{tipo}] {c['EMAIL']} ({c['referencia_id']}, {c['periodo']})")
+                    resumo[tipo] = {"candidatos": len(candidatos), "enviados": 0, "falhas": 0}
+                    continue
+
+                reservados = reservar(conn, tipo, candidatos)
+                mensagens = [montar_mensagem(tipo, c, email_creds["email_address"]) for c in reservados]
+                falhas = []
+                for candidato, (_, erro) in zip(reservados, pool.send_many(mensagens)):
+                    if erro:
+                        falhas.append(candidato)
+                        print(f"ERRO: Falha ao enviar lembrete de {tipo} para {candidato['EMAIL']}. Detalhes: {erro}")
+                liberar(conn, tipo, falhas)
+                resumo[tipo] = {
+                    "candidatos": len(candidatos),
+                    "enviados": len(reservados) - len(falhas),
+                    "falhas": len(falhas),
+                    "ja_reservados": len(candidatos) - len(reservados),
+                }
+
+    print(f"--- RESUMO DOS LEMBRETES ({hoje.strftime('%d/%m/%Y')}) ---")
+    for tipo, dados in resumo.items():
+        print(f"{tipo}: " + ", ".join(f"{chave}={valor}" for chave, valor in dados.items()))
+    print(f"Tempo total: {time.monotonic() - inicio:.1f}s" + (" (simulação)" if args.simular else ""))
+
+if __name__ == "__main__":
+    main()
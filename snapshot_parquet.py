@@ -0,0 +1,192 @@
+import argparse
+import json
+import os
+import shutil
+from datetime import datetime
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import sqlalchemy
+import toml
+from db_utils import get_postgres_engine, SECRETS_PATH
+
+# Snapshot colunar das tabelas usadas em relatórios. Cada tabela vira uma pasta de Parquet
+# particionada por mês no estilo hive ("snapshot/financas/MES=2025-03/dados.parquet"); os painéis
+# leem esses arquivos com Arrow em vez de consultar o Postgres a cada rerun. A exportação é
+# incremental: o banco devolve uma impressão digital por partição (contagem + soma dos hashes das
+# linhas, calculadas lá mesmo) e só as partições cuja impressão mudou são relidas e regravadas.
+PASTA_PADRAO = "snapshot"
+ESTADO = "_estado.json"
+ALTERADO = "_alterado"
+
+SNAPSHOT_TABELAS = {
+    "financas": {"particao": 'substr(t."DATA_VENCIMENTO"::text, 1, 7)'},
+    "usuarios": {"particao": None, "excluir": ["SENHA_HASH", "TOKEN_RECUPERACAO", "DATA_EXPIRACAO_TOKEN"]},
+    "servicos": {"particao": None},
+    "classificados": {"particao": 'to_char(t."DATA_CRIACAO", \'YYYY-MM\')'},
+    "contatos": {"particao": 'to_char(t."TIMESTAMP", \'YYYY-MM\')'},
+    "comentarios": {"particao": 'to_char(t."TIMESTAMP", \'YYYY-MM\')'},
+}
+
+# Tipos do Postgres -> Arrow. Fixar o esquema evita que uma partição só com nulos numa coluna
+# grave um tipo diferente das outras e quebre a leitura do conjunto.
+TIPOS_ARROW = {
+    "integer": pa.int64(), "bigint": pa.int64(), "smallint": pa.int64(),
+    "numeric": pa.float64(), "double precision": pa.float64(), "real": pa.float64(),
+    "boolean": pa.bool_(), "date": pa.date32(),
+    "timestamp without time zone": pa.timestamp("us"), "timestamp with time zone": pa.timestamp("us", tz="UTC"),
+}
+
+COLUNAS_QUERY = """
+    SELECT a.attname, format_type(a.atttypid, NULL)
+    FROM pg_attribute a
+    WHERE a.attrelid = to_regclass(:tabela) AND a.attnum > 0 AND NOT a.attisdropped
+    ORDER BY a.attnum
+"""
+
+def pasta_snapshot():
+    """Pasta do snapshot; pode ser trocada em [snapshot] pasta = "..." no secrets.toml."""
+    try:
+        return toml.load(SECRETS_PATH).get("snapshot", {}).get("pasta", PASTA_PADRAO)
+    except Exception:
+        return PASTA_PADRAO
+
+def esquema_arrow(conn, tabela, excluir=()):
+    colunas = conn.execute(sqlalchemy.text(COLUNAS_QUERY), {"tabela": tabela}).fetchall()
+    return pa.schema([(nome, TIPOS_ARROW.get(tipo, pa.string())) for nome, tipo in colunas if nome not in excluir])
+
+def impressoes(conn, tabela, particao):
+    """{partição: "linhas:soma dos hashes"}, calculado no banco sem trazer as linhas."""
+    expressao = particao or "'todos'"
+    linhas = conn.execute(sqlalchemy.text(
+        f"SELECT coalesce({expressao}, 'sem_data'), count(*), coalesce(sum(hashtext(t::text)::bigint), 0) "
+        f"FROM {tabela} t GROUP BY 1"
+    )).fetchall()
+    return {str(p): f"{n}:{h}" for p, n, h in linhas}
+
+def _caminho_particao(base, particao, valor):
+    return os.path.join(base, f"MES={valor}") if particao else base
+
+def exportar_particao(conn, tabela, config, esquema, valor, base):
+    """Relê uma partição e a grava de forma atômica (arquivo temporário + os.replace)."""
+    particao = config["particao"]
+    filtro = f"WHERE coalesce({particao}, 'sem_data') = :valor" if particao else ""
+    df = pd.read_sql_query(sqlalchemy.text(f"SELECT * FROM {tabela} t {filtro}"), conn,
+                           params={"valor": valor} if particao else None)
+    df = df.drop(columns=[c for c in config.get("excluir", []) if c in df.columns])
+    for campo in esquema:
+        if campo.name not in df.columns:
+            continue
+        if pa.types.is_string(campo.type):
+            df[campo.name] = df[campo.name].map(lambda v: v if v is None or isinstance(v, str) else str(v))
+        elif pa.types.is_integer(campo.type):
+            # Inteiros com nulos chegam como float; Int64 os mantém inteiros.
+            df[campo.name] = df[campo.name].astype("Int64")
+    tabela_arrow = pa.Table.from_pandas(df, schema=esquema, preserve_index=False)
+    pasta = _caminho_particao(base, particao, valor)
+    os.makedirs(pasta, exist_ok=True)
+    # Começa com ponto para o pyarrow.dataset ignorá-lo enquanto está sendo gravado.
+    temporario = os.path.join(pasta, ".dados.parquet.tmp")
+    pq.write_table(tabela_arrow, temporario, compression="zstd")
+    os.replace(temporario, os.path.join(pasta, "dados.parquet"))
+    return tabela_arrow.num_rows
+
+def atualizar_tabela(conn, tabela, pasta, completo=False):
+    """Regrava as partições novas ou alteradas e apaga as que sumiram. Retorna (regravadas, removidas, linhas)."""
+    config = SNAPSHOT_TABELAS[tabela]
+    base = os.path.join(pasta, tabela)
+    caminho_estado = os.path.join(base, ESTADO)
+    anterior = {}
+    if os.path.exists(caminho_estado) and not completo:
+        with open(caminho_estado, encoding="utf-8") as f:
+            anterior = json.load(f)
+    with conn.begin():
+        esquema = esquema_arrow(conn, tabela, config.get("excluir", []))
+        if anterior.get("esquema") != str(esquema):
+            anterior = {}
+        atuais = impressoes(conn, tabela, config["particao"])
+    regravadas, linhas = 0, 0
+    for valor, impressao in sorted(atuais.items()):
+        if anterior.get("particoes", {}).get(valor) == impressao:
+            continue
+        with conn.begin():
+            linhas += exportar_particao(conn, tabela, config, esquema, valor, base)
+        regravadas += 1
+    removidas = set(anterior.get("particoes", {})) - set(atuais)
+    for valor in removidas:
+        shutil.rmtree(_caminho_particao(base, config["particao"], valor), ignore_errors=True)
+    os.makedirs(base, exist_ok=True)
+    with open(caminho_estado, "w", encoding="utf-8") as f:
+        json.dump({"data": datetime.now().isoformat(timespec="seconds"), "esquema": str(esquema),
+                   "particoes": atuais}, f, ensure_ascii=False, indent=2)
+    return regravadas, len(removidas), linhas
+
+# --- LEITURA (usada pelos painéis) ---
+def data_snapshot(tabela, pasta=None):
+    """Quando a tabela foi exportada pela última vez, ou None se ainda não há snapshot."""
+    caminho = os.path.join(pasta or pasta_snapshot(), tabela, ESTADO)
+    if not os.path.exists(caminho):
+        return None
+    with open(caminho, encoding="utf-8") as f:
+        return datetime.fromisoformat(json.load(f)["data"])
+
+def marcar_alteracao(tabela, pasta=None):
+    """Registra (pela data do arquivo "_alterado") que a tabela mudou depois da exportação.
+
+    Fica na pasta do snapshot, compartilhada por todas as sessões do app, para que os painéis
+    saibam que os totais do snapshot estão desatualizados até a próxima exportação.
+    """
+    base = os.path.join(pasta or pasta_snapshot(), tabela)
+    os.makedirs(base, exist_ok=True)
+    with open(os.path.join(base, ALTERADO), "a", encoding="utf-8"):
+        pass
+    os.utime(os.path.join(base, ALTERADO))
+
+def data_alteracao(tabela, pasta=None):
+    """Quando a tabela foi alterada pelo app pela última vez, ou None se não há registro."""
+    caminho = os.path.join(pasta or pasta_snapshot(), tabela, ALTERADO)
+    if not os.path.exists(caminho):
+        return None
+    return datetime.fromtimestamp(os.path.getmtime(caminho))
+
+def abrir_snapshot(tabela, pasta=None):
+    """pyarrow.dataset da tabela (a coluna MES é a partição, usável em filtros sem ler os outros meses)."""
+    base = os.path.join(pasta or pasta_snapshot(), tabela)
+    particionamento = "hive" if SNAPSHOT_TABELAS[tabela]["particao"] else None
+    return ds.dataset(base, format="parquet", partitioning=particionamento)
+
+def totais_financas_por_status(pasta=None):
+    """Soma de VALOR por STATUS calculada com Arrow sobre o snapshot, lendo só as duas colunas."""
+    tabela = abrir_snapshot("financas", pasta).to_table(columns=["STATUS", "VALOR"])
+    totais = tabela.group_by("STATUS").aggregate([("VALOR", "sum")]).to_pandas()
+    return totais.set_index("STATUS")["VALOR_sum"]
+
+def main():
+    """Atualiza o snapshot Parquet. Feito para rodar periodicamente (ex.: a cada hora, pelo cron)."""
+    parser = argparse.ArgumentParser(description="Exporta as tabelas de relatório para Parquet, incrementalmente.")
+    parser.add_argument("--tabelas", default=",".join(SNAPSHOT_TABELAS),
+                        help=f"Tabelas a exportar, separadas por vírgula (padrão: {','.join(SNAPSHOT_TABELAS)}).")
+    parser.add_argument("--completo", action="store_true", help="Ignora o estado anterior e regrava todas as partições.")
+    args = parser.parse_args()
+
+    engine = get_postgres_engine()
+    if engine is None:
+        print("Não foi possível conectar à base de dados. Verifique o seu ficheiro secrets.toml.")
+        return
+
+    nomes = [nome.strip() for nome in args.tabelas.split(",") if nome.strip()]
+    desconhecidas = set(nomes) - set(SNAPSHOT_TABELAS)
+    if desconhecidas:
+        print(f"Tabela(s) sem configuração de snapshot: {', '.join(sorted(desconhecidas))}.")
+        return
+
+    pasta = pasta_snapshot()
+    print(f"--- SNAPSHOT EM {pasta} ---")
+    with engine.connect() as conn:
+        for nome in nomes:
+            regravadas, removidas, linhas = atualizar_tabela(conn, nome, pasta, completo=args.completo)
+            print(f"{nome}: {regravadas} partição(ões) regravada(s) ({linhas} linha(s)), {removidas} removida(s).")
+
+if __name__ == "__main__":
+    main()
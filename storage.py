@@ -0,0 +1,252 @@
+import os
+import time
+import shutil
+import tempfile
+import functools
+import mimetypes
+import threading
+from collections import OrderedDict
+from urllib.parse import urlsplit, unquote
+import toml
+
+SECRETS_PATH = '.streamlit/secrets.toml'
+CHUNK_SIZE = 1024 * 1024
+CACHE_CONTROL_IMUTAVEL = "public, max-age=31536000, immutable"
+CACHE_CONTROL_PRIVADO = "private, no-store"
+PRESIGNED_CACHE_MAX = 10000
+PRIVADO_ROOT = "uploads_privados"
+
+class LocalStorage:
+    """Armazena os arquivos no disco local, dentro da pasta servida pelo static serving do Streamlit.
+
+    Com url_prefix=None o armazenamento é privado: a pasta fica fora de static/ e os arquivos só são
+    lidos pelo próprio script (ex.: download na área administrativa), nunca por URL.
+    """
+
+    def __init__(self, root=os.path.join("static", "blobs"), url_prefix="app/static/blobs"):
+        self.root = root.replace("\\", "/")
+        self.url_prefix = url_prefix
+
+    def _path(self, key):
+        return f"{self.root}/{key}"
+
+    def reference(self, key):
+        """Valor gravado no banco para a chave (um caminho local, aceito pelo st.image)."""
+        return self._path(key)
+
+    def key_from_reference(self, reference):
+        """Retorna a chave de uma referência deste armazenamento, ou None se ela não pertencer a ele."""
+        if isinstance(reference, str):
+            reference = reference.replace("\\", "/")
+            for prefix in (f"{self.root}/", f"{self.url_prefix}/" if self.url_prefix else None):
+                if prefix and reference.startswith(prefix):
+                    return reference[len(prefix):]
+        return None
+
+    def put(self, key, fileobj):
+        """Copia o conteúdo em blocos para um temporário e renomeia atomicamente para o destino."""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = tempfile.NamedTemporaryFile(dir=os.path.dirname(path), suffix=".tmp", delete=False)
+        try:
+            with tmp:
+                shutil.copyfileobj(fileobj, tmp, CHUNK_SIZE)
+            os.replace(tmp.name, path)
+        except BaseException:
+            if os.path.exists(tmp.name):
+                os.remove(tmp.name)
+            raise
+
+    def open(self, key):
+        """Abre o arquivo para leitura em blocos."""
+        return open(self._path(key), "rb")
+
+    def exists(self, key):
+        return os.path.exists(self._path(key))
+
+    def delete(self, key):
+        if os.path.exists(self._path(key)):
+            os.remove(self._path(key))
+
+    def touch(self, key):
+        """Atualiza a data de modificação (um blob reaproveitado volta a contar como recente para o gc)."""
+        os.utime(self._path(key))
+
+    def mtime(self, key):
+        """Data de modificação (timestamp) do arquivo, ou None se ele não existir."""
+        try:
+            return os.path.getmtime(self._path(key))
+        except FileNotFoundError:
+            return None
+
+    def url(self, key):
+        """URL estática, servida diretamente pelo servidor sem passar pelo script."""
+        if self.url_prefix is None:
+            raise ValueError("Este armazenamento é privado e não tem URL pública.")
+        return f"{self.url_prefix}/{key}"
+
+    def media_url(self, key):
+        """Valor para o st.image: o caminho local, lido pelo gerenciador de mídia do Streamlit."""
+        return self._path(key)
+
+    def iter_keys(self):
+        """Percorre todas as chaves armazenadas, com tamanho e data de modificação."""
+        for dirpath, _, files in os.walk(self.root):
+            for name in files:
+                if name.endswith(".tmp"):
+                    continue
+                path = os.path.join(dirpath, name)
+                stat = os.stat(path)
+                yield os.path.relpath(path, self.root).replace("\\", "/"), stat.st_size, stat.st_mtime
+
+class S3Storage:
+    """Armazena os arquivos em um bucket compatível com S3 (AWS, MinIO, R2, etc.).
+
+    Para desenvolvimento, um MinIO local serve como substituto:
+    docker run -p 9000:9000 minio/minio server /data, com endpoint_url = "http://localhost:9000".
+    """
+
+    def __init__(self, bucket, endpoint_url=None, access_key_id=None, secret_access_key=None,
+                 region=None, public_base_url=None, presign_expires=3600, cache_control=CACHE_CONTROL_IMUTAVEL):
+        try:
+            import boto3
+        except ImportError as e:
+            raise RuntimeError("O armazenamento S3 requer o pacote 'boto3'.") from e
+        self.bucket = bucket
+        self.public_base_url = public_base_url.rstrip("/") if public_base_url else None
+        self.presign_expires = presign_expires
+        self.cache_control = cache_control
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url,
+            aws_access_key_id=access_key_id,
+            aws_secret_access_key=secret_access_key,
+            region_name=region,
+        )
+        self._presigned = OrderedDict()
+        self._lock = threading.Lock()
+
+    def reference(self, key):
+        return f"s3://{self.bucket}/{key}"
+
+    def key_from_reference(self, reference):
+        if isinstance(reference, str):
+            for prefix in (f"s3://{self.bucket}/", f"{self.public_base_url}/" if self.public_base_url else None):
+                if prefix and reference.startswith(prefix):
+                    return reference[len(prefix):]
+            return self._key_from_presigned(reference)
+        return None
+
+    def _key_from_presigned(self, url):
+        """Chave de uma URL pré-assinada deste bucket (estilo caminho "/bucket/chave" ou host "bucket.")."""
+        partes = urlsplit(url)
+        if partes.scheme not in ("http", "https") or "Signature=" not in partes.query:
+            return None
+        caminho = unquote(partes.path).lstrip("/")
+        if partes.netloc.startswith(f"{self.bucket}."):
+            return caminho or None
+        if caminho.startswith(f"{self.bucket}/"):
+            return caminho[len(self.bucket) + 1:] or None
+        return None
+
+    def put(self, key, fileobj):
+        """Envia o arquivo em partes (multipart), sem carregá-lo inteiro na memória."""
+        content_type = mimetypes.guess_type(key)[0] or "application/octet-stream"
+        self.client.upload_fileobj(
+            fileobj, self.bucket, key,
+            ExtraArgs={"ContentType": content_type, "CacheControl": self.cache_control},
+        )
+
+    def open(self, key):
+        """Retorna o corpo do objeto como stream (suporta read(n) e iter_chunks())."""
+        return self.client.get_object(Bucket=self.bucket, Key=key)["Body"]
+
+    def exists(self, key):
+        from botocore.exceptions import ClientError
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=key)
+            return True
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+
+    def touch(self, key):
+        """Copia o objeto sobre ele mesmo, o que renova o LastModified sem reenviar o conteúdo."""
+        self.client.copy_object(
+            Bucket=self.bucket, Key=key, CopySource={"Bucket": self.bucket, "Key": key},
+            MetadataDirective="REPLACE",
+            ContentType=mimetypes.guess_type(key)[0] or "application/octet-stream",
+            CacheControl=self.cache_control,
+        )
+
+    def mtime(self, key):
+        from botocore.exceptions import ClientError
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=key)["LastModified"].timestamp()
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+
+    def presigned_url(self, key):
+        """URL pré-assinada, reaproveitada até a metade da validade para manter o cache do navegador.
+
+        O cache guarda no máximo PRESIGNED_CACHE_MAX chaves, descartando as usadas há mais tempo.
+        """
+        agora = time.time()
+        with self._lock:
+            cached = self._presigned.get(key)
+            if cached and cached[1] > agora:
+                self._presigned.move_to_end(key)
+                return cached[0]
+        url = self.client.generate_presigned_url(
+            "get_object", Params={"Bucket": self.bucket, "Key": key}, ExpiresIn=self.presign_expires
+        )
+        with self._lock:
+            self._presigned[key] = (url, agora + self.presign_expires / 2)
+            self._presigned.move_to_end(key)
+            while len(self._presigned) > PRESIGNED_CACHE_MAX:
+                self._presigned.popitem(last=False)
+        return url
+
+    def url(self, key):
+        """URL pública estática, se configurada; caso contrário, uma URL pré-assinada."""
+        if self.public_base_url:
+            return f"{self.public_base_url}/{key}"
+        return self.presigned_url(key)
+
+    def media_url(self, key):
+        return self.url(key)
+
+    def iter_keys(self):
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket):
+            for obj in page.get("Contents", []):
+                yield obj["Key"], obj["Size"], obj["LastModified"].timestamp()
+
+@functools.lru_cache(maxsize=None)
+def get_storage(privado=False):
+    """Retorna o armazenamento configurado na seção [storage] do secrets.toml (padrão: disco local).
+
+    Com privado=True usa a seção [storage_privado], para documentos pessoais (contratos assinados).
+    O padrão é uma pasta local fora de static/, sem URL; em produção com várias réplicas, configure
+    um bucket próprio, sem acesso público (as URLs pré-assinadas só são geradas para o admin).
+    """
+    secao = "storage_privado" if privado else "storage"
+    try:
+        config = dict(toml.load(SECRETS_PATH).get(secao, {}))
+    except (FileNotFoundError, toml.TomlDecodeError):
+        config = {}
+    backend = config.pop("backend", "local")
+    if backend == "s3":
+        if privado:
+            config.setdefault("cache_control", CACHE_CONTROL_PRIVADO)
+        return S3Storage(**config)
+    if privado:
+        config.setdefault("root", PRIVADO_ROOT)
+        config.setdefault("url_prefix", None)
+    return LocalStorage(**config)
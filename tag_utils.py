@@ -0,0 +1,57 @@
+import contextlib
+import sqlalchemy
+
+# As tags das notícias ficam normalizadas em noticia_tags (uma linha por notícia e tag). A coluna
+# noticias."TAGS" continua sendo o texto editado no Admin; esta tabela é sincronizada a cada gravação.
+# A tabela é criada pela migração 009 (migracoes.py): "NOTICIA_ID" tem o mesmo tipo de noticias."ID",
+# com chave estrangeira ON DELETE CASCADE, então as junções usam a chave primária de noticias e as
+# tags de uma notícia excluída somem com ela.
+
+# Status das notícias visíveis no site: o que o seletor de status do Admin grava. Usado pela página de
+# notícias, pela busca, pelas notificações e pelo digest de tags, e no índice parcial da migração 005.
+STATUS_PUBLICADA = "ATIVO"
+
+# Preenche a tabela a partir do texto separado por vírgulas, inteiramente no banco.
+BACKFILL_QUERY = """
+    INSERT INTO noticia_tags ("NOTICIA_ID", "TAG")
+    SELECT DISTINCT n."ID", btrim(t.tag)
+    FROM noticias n, unnest(string_to_array(n."TAGS", ',')) AS t(tag)
+    WHERE btrim(t.tag) <> ''
+    ON CONFLICT DO NOTHING
+"""
+
+def _get_connection():
+    """Importa a conexão sob demanda para que scripts possam usar o módulo passando a própria conexão."""
+    from auth import get_db_connection
+    return get_db_connection()
+
+def separar_tags(tags):
+    """Converte o texto 'tag1, tag2' em uma lista de tags sem espaços nem repetições."""
+    return list(dict.fromkeys(tag.strip() for tag in (tags or "").split(",") if tag.strip()))
+
+def sincronizar_tags_noticia(noticia_id, tags, conn=None):
+    """Regrava as linhas de noticia_tags de uma notícia a partir do texto de tags.
+
+    Com 'conn', roda na transação corrente dessa conexão (a mesma que grava a notícia) e deixa os
+    erros subirem para que o chamador desfaça tudo; sem ela, abre a própria conexão e transação.
+    """
+    own_conn = conn is None
+    conn = conn or _get_connection()
+    if conn is None: return False
+    try:
+        with (conn.begin() if own_conn else contextlib.nullcontext()):
+            conn.execute(sqlalchemy.text('DELETE FROM noticia_tags WHERE "NOTICIA_ID" = :id'), {"id": noticia_id})
+            lista = separar_tags(tags)
+            if lista:
+                conn.execute(
+                    sqlalchemy.text('INSERT INTO noticia_tags ("NOTICIA_ID", "TAG") VALUES (:id, :tag)'),
+                    [{"id": noticia_id, "tag": tag} for tag in lista]
+                )
+        return True
+    except Exception as e:
+        if not own_conn:
+            raise
+        print(f"Erro ao sincronizar tags da notícia {noticia_id}: {e}")
+        return False
+    finally:
+        if own_conn: conn.close()
@@ -0,0 +1,84 @@
+import argparse
+import hashlib
+import os
+import urllib.request
+from io import BytesIO
+from storage import get_storage, S3Storage, CHUNK_SIZE
+
+# Verificação de ponta a ponta de um armazenamento: grava, lê em blocos, busca pela URL (estática ou
+# pré-assinada), confere o mapeamento URL -> chave usado pelo gc_uploads e apaga. Para testar o
+# driver S3 sem uma conta na nuvem, suba um MinIO local:
+#   docker run -p 9000:9000 -e MINIO_ROOT_USER=minio -e MINIO_ROOT_PASSWORD=minio123 minio/minio server /data
+#   python verificar_storage.py --s3-endpoint http://localhost:9000 --bucket teste --access-key minio --secret-key minio123
+
+def _sha256(fileobj):
+    hasher = hashlib.sha256()
+    while chunk := fileobj.read(CHUNK_SIZE):
+        hasher.update(chunk)
+    return hasher.hexdigest()
+
+def verificar(storage, tamanho=3 * CHUNK_SIZE + 123, base_url=None):
+    """Executa as verificações e retorna a lista de (etapa, ok, detalhe)."""
+    conteudo = os.urandom(tamanho)
+    esperado = hashlib.sha256(conteudo).hexdigest()
+    key = f"verificacao/{esperado}.bin"
+    resultados = []
+
+    def registrar(etapa, ok, detalhe=""):
+        resultados.append((etapa, bool(ok), detalhe))
+        return ok
+
+    storage.put(key, BytesIO(conteudo))
+    registrar("put + exists", storage.exists(key))
+
+    stream = storage.open(key)
+    try:
+        registrar("open (leitura em blocos)", _sha256(stream) == esperado)
+    finally:
+        stream.close()
+
+    registrar("referência -> chave", storage.key_from_reference(storage.reference(key)) == key, storage.reference(key))
+
+    try:
+        url = storage.url(key)
+    except ValueError as e:
+        registrar("url", True, f"armazenamento privado ({e})")
+    else:
+        registrar("url -> chave", storage.key_from_reference(url) == key, url)
+        if base_url or url.startswith(("http://", "https://")):
+            with urllib.request.urlopen(url if url.startswith("http") else f"{base_url.rstrip('/')}/{url}") as resposta:
+                registrar("download pela url", _sha256(resposta) == esperado)
+
+    storage.delete(key)
+    registrar("delete", not storage.exists(key))
+    return resultados
+
+def main():
+    """Verifica o armazenamento configurado no secrets.toml ou um bucket S3/MinIO passado na linha de comando."""
+    parser = argparse.ArgumentParser(description="Verificação de ponta a ponta do armazenamento de uploads.")
+    parser.add_argument("--privado", action="store_true", help="Verifica o armazenamento privado ([storage_privado]).")
+    parser.add_argument("--s3-endpoint", help="Endpoint S3 (ex.: http://localhost:9000 para um MinIO local).")
+    parser.add_argument("--bucket", help="Bucket a usar com --s3-endpoint (é criado se não existir).")
+    parser.add_argument("--access-key", help="Chave de acesso do S3/MinIO.")
+    parser.add_argument("--secret-key", help="Chave secreta do S3/MinIO.")
+    parser.add_argument("--base-url", help="Endereço do app, para baixar as URLs relativas do disco local (ex.: http://localhost:8501).")
+    args = parser.parse_args()
+
+    if args.s3_endpoint:
+        storage = S3Storage(args.bucket, endpoint_url=args.s3_endpoint, access_key_id=args.access_key,
+                            secret_access_key=args.secret_key, region="us-east-1")
+        existentes = [b["Name"] for b in storage.client.list_buckets().get("Buckets", [])]
+        if args.bucket not in existentes:
+            storage.client.create_bucket(Bucket=args.bucket)
+    else:
+        storage = get_storage(args.privado)
+
+    print(f"--- VERIFICANDO {type(storage).__name__} ---")
+    resultados = verificar(storage, base_url=args.base_url)
+    for etapa, ok, detalhe in resultados:
+        print(f"{'OK  ' if ok else 'FALHA'} {etapa}" + (f" ({detalhe})" if detalhe else ""))
+    if not all(ok for _, ok, _ in resultados):
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
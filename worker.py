@@ -0,0 +1,140 @@
+import argparse
+import os
+import socket
+import smtplib
+import time
+from datetime import datetime
+import sqlalchemy
+import toml
+from db_utils import get_postgres_engine, SECRETS_PATH
+from email_utils import (SMTPPool, build_recovery_email, build_due_date_reminder_email,
+                         build_renewal_reminder_email)
+from jobs import claim_jobs, complete_job, fail_job, purge_jobs, JobPermanenteError
+
+INTERVALO_PADRAO = 2
+LIMPEZA_A_CADA_SEGUNDOS = 3600
+
+HANDLERS = {}
+
+def job_handler(tipo):
+    """Registra a função que executa as tarefas de um tipo. Ela recebe (contexto, payload)."""
+    def registrar(func):
+        HANDLERS[tipo] = func
+        return func
+    return registrar
+
+class Contexto:
+    """Recursos compartilhados pelas tarefas de um worker: engine, segredos e o pool SMTP (aberto sob demanda)."""
+
+    def __init__(self, engine, secrets):
+        self.engine = engine
+        self.secrets = secrets
+        self._pool = None
+
+    @property
+    def email_creds(self):
+        return self.secrets["email_credentials"]
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            self._pool = SMTPPool(self.email_creds)
+        return self._pool
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+
+def _enviar(ctx, msg):
+    try:
+        ctx.pool.send(msg)
+    except smtplib.SMTPRecipientsRefused as e:
+        raise JobPermanenteError(f"Destinatário recusado: {e}") from e
+
+@job_handler("email_recuperacao_senha")
+def enviar_recuperacao_senha(ctx, payload):
+    """Envia o token vigente do usuário. O token é lido na hora do envio e não fica gravado na fila."""
+    with ctx.engine.connect() as conn:
+        user = conn.execute(
+            sqlalchemy.text('SELECT "EMAIL", "TOKEN_RECUPERACAO", "DATA_EXPIRACAO_TOKEN" FROM usuarios WHERE "ID" = :id'),
+            {"id": payload["usuario_id"]}
+        ).mappings().first()
+    if not user or not user["TOKEN_RECUPERACAO"] or not user["DATA_EXPIRACAO_TOKEN"]:
+        return
+    if user["DATA_EXPIRACAO_TOKEN"] <= datetime.now():
+        return
+    base_url = ctx.secrets["app_config"]["url"]
+    _enviar(ctx, build_recovery_email(user["EMAIL"], user["TOKEN_RECUPERACAO"], base_url, ctx.email_creds["email_address"]))
+
+@job_handler("email_lembrete_vencimento")
+def enviar_lembrete_vencimento(ctx, payload):
+    _enviar(ctx, build_due_date_reminder_email(payload["email"], payload["cobranca"], ctx.email_creds["email_address"]))
+
+@job_handler("email_lembrete_renovacao")
+def enviar_lembrete_renovacao(ctx, payload):
+    _enviar(ctx, build_renewal_reminder_email(payload["email"], payload["membro"], ctx.email_creds["email_address"]))
+
+def executar(ctx, conn, job):
+    """Executa uma tarefa reservada e registra o resultado."""
+    handler = HANDLERS.get(job["TIPO"])
+    try:
+        if handler is None:
+            raise JobPermanenteError(f"Tipo de tarefa desconhecido: {job['TIPO']}")
+        handler(ctx, job["PAYLOAD"])
+    except JobPermanenteError as e:
+        fail_job(conn, job, e, permanente=True)
+        print(f"ERRO: tarefa {job['ID']} ({job['TIPO']}) falhou definitivamente: {e}")
+    except Exception as e:
+        if fail_job(conn, job, e):
+            print(f"AVISO: tarefa {job['ID']} ({job['TIPO']}) falhou na tentativa {job['TENTATIVAS']}, será repetida: {e}")
+        else:
+            print(f"ERRO: tarefa {job['ID']} ({job['TIPO']}) esgotou as tentativas: {e}")
+    else:
+        complete_job(conn, job["ID"])
+
+def main():
+    """Processa continuamente a fila de tarefas. Vários workers podem rodar em paralelo."""
+    parser = argparse.ArgumentParser(description="Worker da fila de tarefas em segundo plano.")
+    parser.add_argument("--lote", type=int, default=10, help="Tarefas reservadas por consulta.")
+    parser.add_argument("--intervalo", type=float, default=INTERVALO_PADRAO,
+                        help="Segundos de espera quando a fila está vazia.")
+    parser.add_argument("--tipos", nargs="*", help="Processa apenas estes tipos de tarefa.")
+    parser.add_argument("--uma-vez", action="store_true", help="Esvazia a fila e termina (para uso em cron).")
+    args = parser.parse_args()
+
+    engine = get_postgres_engine()
+    if engine is None:
+        print("Não foi possível conectar à base de dados. Verifique o seu ficheiro secrets.toml.")
+        return
+
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    ctx = Contexto(engine, toml.load(SECRETS_PATH))
+    ultima_limpeza = 0
+    try:
+        with engine.connect() as conn:
+            with conn.begin():
+                if not conn.execute(sqlalchemy.text("SELECT to_regclass('jobs') IS NOT NULL")).scalar():
+                    print("A tabela jobs não existe. Rode antes: python migracoes.py")
+                    return
+            print(f"Worker {worker_id} iniciado.")
+            while True:
+                if time.monotonic() - ultima_limpeza > LIMPEZA_A_CADA_SEGUNDOS:
+                    removidas = purge_jobs(conn)
+                    if removidas:
+                        print(f"{removidas} tarefa(s) concluída(s) antiga(s) removida(s).")
+                    ultima_limpeza = time.monotonic()
+
+                jobs = claim_jobs(conn, worker_id, args.lote, args.tipos)
+                for job in jobs:
+                    executar(ctx, conn, job)
+                if not jobs:
+                    if args.uma_vez:
+                        break
+                    time.sleep(args.intervalo)
+    except KeyboardInterrupt:
+        print("Worker interrompido.")
+    finally:
+        ctx.close()
+
+if __name__ == "__main__":
+    main()